@@ -241,6 +241,128 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 LOGS_ROOT=os.path.join(BASE_DIR, 'logs')
 
+# Recommendation / vector index
+RECOMMENDATION_EMBEDDING_MODEL = os.getenv('RECOMMENDATION_EMBEDDING_MODEL', "mixedbread-ai/mxbai-embed-large-v1")
+# Token budget of one embedding input, counted with tiktoken like DocumentText.token_count. Kept below the
+# model's 512 token sequence length because its WordPiece tokenizer splits text into more tokens.
+RECOMMENDATION_EMBEDDING_MAX_TOKENS = int(os.getenv('RECOMMENDATION_EMBEDDING_MAX_TOKENS', 400))
+# Matryoshka truncation of the model's 1024-dim vectors, e.g. 512 or 256, 0 keeps them whole.
+# Every collection has to be rebuilt in full after a change, Chroma fixes a collection's dimension.
+RECOMMENDATION_EMBEDDING_DIMENSIONS = int(os.getenv('RECOMMENDATION_EMBEDDING_DIMENSIONS', 0))
+# e.g. 'unix:/tmp/coco-embedding.sock' or '127.0.0.1:8765', empty loads the model in every process
+RECOMMENDATION_EMBEDDING_SERVICE_ADDRESS = os.getenv('RECOMMENDATION_EMBEDDING_SERVICE_ADDRESS', '')
+RECOMMENDATION_CHROMADB_PATHS = {
+    'researcher_user_documents': os.path.join(BASE_DIR, 'chromadb_data/researcher_users_details_mxbai_embed_cosine'),
+    'student_user_documents': os.path.join(BASE_DIR, 'chromadb_data/student_users_details_mxbai_embed_cosine'),
+    'program_documents': os.path.join(BASE_DIR, 'chromadb_data/program_details_mxbai_embed_cosine'),
+    # One vector per profile section, next to the profile collection they belong to
+    'researcher_user_sections': os.path.join(BASE_DIR, 'chromadb_data/researcher_users_details_mxbai_embed_cosine'),
+    'student_user_sections': os.path.join(BASE_DIR, 'chromadb_data/student_users_details_mxbai_embed_cosine'),
+}
+# Profile collection -> collection of its per-section vectors
+RECOMMENDATION_SECTION_COLLECTIONS = {
+    'researcher_user_documents': 'researcher_user_sections',
+    'student_user_documents': 'student_user_sections',
+}
+# Weight of each profile section when section vectors are fused, 0 leaves a section out
+RECOMMENDATION_SECTION_WEIGHTS = {
+    'resume': 1.0,
+    'sop': 1.0,
+    'publications': 0.8,
+    'research_interests': 0.6,
+    'funding': 0.4,
+}
+# 'chroma' queries the collection above, 'numpy' an exact search over a memory-mapped export of it
+RECOMMENDATION_VECTOR_BACKENDS = {
+    'researcher_user_documents': os.getenv('RECOMMENDATION_RESEARCHER_BACKEND', 'chroma'),
+    'student_user_documents': os.getenv('RECOMMENDATION_STUDENT_BACKEND', 'chroma'),
+    'program_documents': os.getenv('RECOMMENDATION_PROGRAM_BACKEND', 'chroma'),
+}
+RECOMMENDATION_NUMPY_INDEX_ROOT = os.path.join(BASE_DIR, 'chromadb_data/numpy_indexes')
+# Incremental writes are patched into a delta next to the exported base, once the delta holds more than this share
+# of the base the export is rewritten in full
+RECOMMENDATION_NUMPY_DELTA_MAX_RATIO = float(os.getenv('RECOMMENDATION_NUMPY_DELTA_MAX_RATIO', 0.05))
+# Precision the NumPy backend searches in: 'float32', 'float16' or 'int8'. A reduced precision index ranks
+# RESCORE_FACTOR times the requested results, then rescores those from the float32 vectors on disk.
+RECOMMENDATION_VECTOR_PRECISION = {
+    'researcher_user_documents': os.getenv('RECOMMENDATION_RESEARCHER_PRECISION', 'float32'),
+    'student_user_documents': os.getenv('RECOMMENDATION_STUDENT_PRECISION', 'float32'),
+    'program_documents': os.getenv('RECOMMENDATION_PROGRAM_PRECISION', 'float32'),
+}
+RECOMMENDATION_VECTOR_RESCORE_FACTOR = int(os.getenv('RECOMMENDATION_VECTOR_RESCORE_FACTOR', 4))
+# HNSW parameters of the Chroma collections, per collection on top of the defaults (Chroma's own defaults).
+# They are fixed when a collection is created, so a change takes effect with the next full rebuild.
+# Compare settings with: manage.py benchmark_hnsw
+RECOMMENDATION_HNSW_DEFAULTS = {'M': 16, 'construction_ef': 100, 'search_ef': 10}
+RECOMMENDATION_HNSW_PARAMS = {
+    'researcher_user_sections': {'search_ef': 50},
+    'program_documents': {'search_ef': 50},
+}
+# Full rebuilds are written to a new versioned collection and switched to once they pass a sanity check.
+# Readers re-check the live version every POINTER_TTL seconds, replaced versions are dropped after GC_GRACE seconds.
+RECOMMENDATION_INDEX_POINTER_TTL = int(os.getenv('RECOMMENDATION_INDEX_POINTER_TTL', 10))
+RECOMMENDATION_INDEX_GC_GRACE = int(os.getenv('RECOMMENDATION_INDEX_GC_GRACE', 3600))
+# A rebuild with fewer documents than this share of the live index is rejected when its expected size is unknown
+RECOMMENDATION_INDEX_MIN_COUNT_RATIO = float(os.getenv('RECOMMENDATION_INDEX_MIN_COUNT_RATIO', 0.5))
+# Queue entries edited during a rebuild are kept for it to catch up on, a build still running after
+# this many seconds counts as abandoned and no longer holds them
+RECOMMENDATION_INDEX_BUILD_MAX_AGE = int(os.getenv('RECOMMENDATION_INDEX_BUILD_MAX_AGE', 24 * 3600))
+RECOMMENDATION_INGEST_BATCH_SIZE = int(os.getenv('RECOMMENDATION_INGEST_BATCH_SIZE', 32))
+# Embeddings of unchanged texts are reused across rebuilds, set the path to '' to disable
+RECOMMENDATION_EMBEDDING_CACHE_PATH = os.getenv('RECOMMENDATION_EMBEDDING_CACHE_PATH', os.path.join(BASE_DIR, 'chromadb_data/embedding_cache.sqlite3'))
+RECOMMENDATION_EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('RECOMMENDATION_EMBEDDING_CACHE_MAX_ENTRIES', 200000))
+# 'persistent' opens the directories above in-process, 'http' talks to a Chroma server
+RECOMMENDATION_CHROMADB_CLIENT = os.getenv('RECOMMENDATION_CHROMADB_CLIENT', 'persistent')
+RECOMMENDATION_CHROMADB_HOST = os.getenv('RECOMMENDATION_CHROMADB_HOST', 'localhost')
+RECOMMENDATION_CHROMADB_PORT = int(os.getenv('RECOMMENDATION_CHROMADB_PORT', 8000))
+
+# Ranked recommendations are computed for RESULTS_CACHE_SIZE items and served page by page from this cache.
+# Point RECOMMENDATION_CACHE_URL at Redis so every worker shares them.
+RECOMMENDATION_CACHE_URL = os.getenv('RECOMMENDATION_CACHE_URL', '')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recommendations': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': RECOMMENDATION_CACHE_URL,
+    } if RECOMMENDATION_CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recommendations',
+    },
+}
+RECOMMENDATION_RESULTS_CACHE_ALIAS = 'recommendations'
+RECOMMENDATION_RESULTS_CACHE_SIZE = int(os.getenv('RECOMMENDATION_RESULTS_CACHE_SIZE', 100))
+RECOMMENDATION_RESULTS_CACHE_TTL = int(os.getenv('RECOMMENDATION_RESULTS_CACHE_TTL', 900))
+# search_type=combined runs the program and researcher queries on a shared pool of this many threads,
+# each branch is given up to its timeout in seconds before the response is sent without it
+RECOMMENDATION_FANOUT_WORKERS = int(os.getenv('RECOMMENDATION_FANOUT_WORKERS', 8))
+RECOMMENDATION_FANOUT_TIMEOUT = float(os.getenv('RECOMMENDATION_FANOUT_TIMEOUT', 10))
+RECOMMENDATION_FANOUT_TIMEOUTS = {
+    'universities': float(os.getenv('RECOMMENDATION_FANOUT_PROGRAM_TIMEOUT', RECOMMENDATION_FANOUT_TIMEOUT)),
+    'professors': float(os.getenv('RECOMMENDATION_FANOUT_RESEARCHER_TIMEOUT', RECOMMENDATION_FANOUT_TIMEOUT)),
+}
+# In-process LRU caches of free-text search query embeddings and results (entries per process, seconds)
+RECOMMENDATION_SEARCH_CACHE_SIZE = int(os.getenv('RECOMMENDATION_SEARCH_CACHE_SIZE', 1000))
+RECOMMENDATION_SEARCH_CACHE_TTL = int(os.getenv('RECOMMENDATION_SEARCH_CACHE_TTL', 900))
+# Students without an up to date vector are embedded when their recommendations are computed. Concurrent
+# requests wait up to RECOMMENDATION_JIT_EMBEDDING_WAIT seconds for the one embedding the user.
+RECOMMENDATION_JIT_EMBEDDING_LOCK_TIMEOUT = int(os.getenv('RECOMMENDATION_JIT_EMBEDDING_LOCK_TIMEOUT', 120))
+RECOMMENDATION_JIT_EMBEDDING_WAIT = int(os.getenv('RECOMMENDATION_JIT_EMBEDDING_WAIT', 60))
+# Rankings written by precompute_recommendations are served for requests without filters until this old (seconds)
+RECOMMENDATION_PRECOMPUTED_MAX_AGE = int(os.getenv('RECOMMENDATION_PRECOMPUTED_MAX_AGE', 7 * 24 * 3600))
+# Background ingestion jobs (run_ingestion_jobs): entities ingested per checkpoint, and seconds without
+# a heartbeat after which a running job is considered crashed and picked up again
+RECOMMENDATION_INGESTION_JOB_BATCH_SIZE = int(os.getenv('RECOMMENDATION_INGESTION_JOB_BATCH_SIZE', 100))
+RECOMMENDATION_INGESTION_JOB_STALE_AFTER = int(os.getenv('RECOMMENDATION_INGESTION_JOB_STALE_AFTER', 900))
+# Seconds between heartbeats written while a batch runs, well below the stale timeout
+RECOMMENDATION_INGESTION_JOB_HEARTBEAT_INTERVAL = int(os.getenv('RECOMMENDATION_INGESTION_JOB_HEARTBEAT_INTERVAL', 60))
+
+# Resume/SOP text extraction ahead of indexing
+DOCUMENT_EXTRACTION_WORKERS = int(os.getenv('DOCUMENT_EXTRACTION_WORKERS', os.cpu_count() or 1))
+# Seconds a single file read or OCR page may take before the file is skipped
+DOCUMENT_EXTRACTION_TIMEOUT = int(os.getenv('DOCUMENT_EXTRACTION_TIMEOUT', 120))
+
 
 # settings.py
 
@@ -0,0 +1,218 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models.functions import Length, Substr
+from .models import DocumentText
+from .text_extraction import count_tokens, extract_text, file_content_hash, ocr_pdf_page_job, read_file_job
+
+# Seconds a stage may run on top of its tasks' timeouts before the stragglers are given up
+STAGE_DEADLINE_SLACK = 30
+
+
+def _copy_values(document_text):
+    return {
+        'text': document_text.text,
+        'page_count': document_text.page_count,
+        'ocr_used': document_text.ocr_used,
+        'token_count': document_text.token_count,
+    }
+
+
+def _save_document_text(document, content_hash, values):
+    stored, _ = DocumentText.objects.update_or_create(
+        document=document,
+        defaults={'content_hash': content_hash, **values},
+    )
+    return stored
+
+
+def get_document_text(document):
+    """Stored extraction for a Document, extracting the file only when its content changed.
+
+    A file whose content was already extracted for another Document is
+    copied instead of parsed again.
+    """
+    file_path = default_storage.path(document.file_name_system)
+    content_hash = file_content_hash(file_path)
+
+    stored = DocumentText.objects.filter(document=document).first()
+    if stored and stored.content_hash == content_hash:
+        return stored
+
+    same_content = DocumentText.objects.filter(content_hash=content_hash).exclude(document=document).first()
+    if same_content:
+        values = _copy_values(same_content)
+    else:
+        values = extract_text(file_path)
+        values['token_count'] = count_tokens(values['text'])
+    return _save_document_text(document, content_hash, values)
+
+
+def get_document_text_prefix(document, max_chars):
+    """(first max_chars characters of a Document's extracted text, length of the whole text).
+
+    Only the prefix is read from the database when the stored extraction is
+    current, long documents are never loaded whole.
+    """
+    content_hash = file_content_hash(default_storage.path(document.file_name_system))
+    stored = (
+        DocumentText.objects.filter(document=document, content_hash=content_hash)
+        .annotate(prefix=Substr('text', 1, max_chars), length=Length('text'))
+        .values_list('prefix', 'length')
+        .first()
+    )
+    if stored:
+        return stored
+    text = get_document_text(document).text
+    return text[:max_chars], len(text)
+
+
+def _stage_deadline(task_count, max_workers, timeout):
+    """When a stage of task_count tasks must be done: every worker running its share to the task timeout"""
+    rounds = -(-task_count // max_workers)
+    return time.monotonic() + rounds * timeout + STAGE_DEADLINE_SLACK
+
+
+def _submit_all(executor, tasks, statuses):
+    """{future: key} for {key: (function, *args)}, keys that cannot be submitted to a broken pool are marked as errors.
+
+    A key is a document id or a (document id, page number) pair.
+    """
+    futures = {}
+    for key, (function, *args) in tasks.items():
+        try:
+            futures[executor.submit(function, *args)] = key
+        except BrokenProcessPool as e:
+            document_id = key[0] if isinstance(key, tuple) else key
+            statuses.setdefault(document_id, _error_status(e))
+    return futures
+
+
+def _collect(futures, deadline):
+    """(key, result, error) of every future as it completes.
+
+    A worker that died (e.g. a parser crash) breaks the pool, every task still
+    running gets that error. Tasks not done by deadline get a TimeoutError.
+    """
+    collected = set()
+    try:
+        for future in as_completed(futures, timeout=max(0, deadline - time.monotonic())):
+            collected.add(future)
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+    except FuturesTimeoutError:
+        for future, key in futures.items():
+            if future not in collected:
+                future.cancel()
+                yield key, None, TimeoutError("Text extraction timed out")
+
+
+def _error_status(error):
+    if isinstance(error, TimeoutError):
+        return 'timeout'
+    if isinstance(error, BrokenProcessPool):
+        return 'error: extraction worker crashed'
+    return f'error: {error}'
+
+
+def extract_documents_parallel(documents, max_workers=None, timeout=None, on_progress=None):
+    """Fill the DocumentText store for many Documents using a process pool.
+
+    Files are read in parallel first; scanned PDFs then have each of their
+    pages OCRed as a separate task so one long scan is spread over all
+    workers. Every task gets at most timeout seconds, and a file with a task
+    that times out or fails is skipped rather than holding up the batch. Each
+    stage also has an overall deadline, so a worker stuck in a C call or a
+    crashed worker cannot stall or fail the other files. on_progress, when
+    given, is called as each task completes, e.g. to keep a job's heartbeat.
+
+    Returns {document id: status} where status is 'stored', 'extracted',
+    'timeout' or 'error: <message>'.
+    """
+    max_workers = max_workers or settings.DOCUMENT_EXTRACTION_WORKERS
+    timeout = timeout or settings.DOCUMENT_EXTRACTION_TIMEOUT
+    statuses = {}
+    pending = {}
+
+    for document in documents:
+        file_path = default_storage.path(document.file_name_system)
+        if not os.path.exists(file_path):
+            statuses[document.id] = 'error: file not found'
+            continue
+        content_hash = file_content_hash(file_path)
+        if DocumentText.objects.filter(document=document, content_hash=content_hash).exists():
+            statuses[document.id] = 'stored'
+            continue
+        same_content = DocumentText.objects.filter(content_hash=content_hash).exclude(document=document).first()
+        if same_content:
+            _save_document_text(document, content_hash, _copy_values(same_content))
+            statuses[document.id] = 'stored'
+            continue
+        pending[document.id] = (document, file_path, content_hash)
+
+    if not pending:
+        return statuses
+
+    results = {}
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    futures, page_futures = {}, {}
+    try:
+        futures = _submit_all(executor, {
+            document_id: (read_file_job, file_path, timeout)
+            for document_id, (_, file_path, _) in pending.items()
+        }, statuses)
+        needs_ocr = {}
+        for document_id, result, error in _collect(futures, _stage_deadline(len(futures), max_workers, timeout)):
+            if on_progress:
+                on_progress()
+            if error is not None:
+                statuses[document_id] = _error_status(error)
+            elif result.pop('needs_ocr'):
+                needs_ocr[document_id] = result
+            else:
+                results[document_id] = result
+
+        page_futures = _submit_all(executor, {
+            (document_id, page_number): (ocr_pdf_page_job, pending[document_id][1], page_number, timeout)
+            for document_id, result in needs_ocr.items()
+            for page_number in range(result['page_count'])
+        }, statuses)
+        pages = defaultdict(dict)
+        deadline = _stage_deadline(len(page_futures), max_workers, timeout)
+        for (document_id, page_number), text, error in _collect(page_futures, deadline):
+            if on_progress:
+                on_progress()
+            if document_id in statuses:
+                continue
+            if error is not None:
+                statuses[document_id] = _error_status(error)
+            else:
+                pages[document_id][page_number] = text
+
+        for document_id, result in needs_ocr.items():
+            if document_id in statuses:
+                continue
+            result['text'] = "".join(pages[document_id][n] for n in range(result['page_count']))
+            result['ocr_used'] = True
+            results[document_id] = result
+    finally:
+        stuck = any(not future.done() for future in [*futures, *page_futures])
+        # A worker stuck in a C call past the deadline would otherwise keep running, and
+        # be joined at interpreter exit. shutdown() forgets the processes, so take them first
+        processes = list((getattr(executor, '_processes', None) or {}).values()) if stuck else []
+        executor.shutdown(wait=not stuck, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    for document_id, values in results.items():
+        document, _, content_hash = pending[document_id]
+        values['token_count'] = count_tokens(values['text'])
+        _save_document_text(document, content_hash, values)
+        statuses[document_id] = 'extracted'
+    return statuses
@@ -116,6 +116,19 @@ class Document(SoftDeleteModel, TimestampedModel):
         return self.file_name
 
 
+class DocumentText(TimestampedModel):
+    """Text extracted once from an uploaded Document, keyed by the file's content hash"""
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='extracted_text')
+    content_hash = models.CharField(max_length=64, db_index=True)
+    text = models.TextField(blank=True, default='')
+    page_count = models.PositiveIntegerField(default=0)
+    ocr_used = models.BooleanField(default=False)
+    token_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Extracted text for {self.document}"
+
+
 class UserDocument(SoftDeleteModel, TimestampedModel):
     IMAGE = 'image'
     ORG_LOGO = 'organization_logo'
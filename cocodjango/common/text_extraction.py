@@ -0,0 +1,132 @@
+# Plain file-to-text helpers. This module must not import Django models so
+# it can be loaded by process pool workers.
+import hashlib
+import io
+import signal
+import fitz  # PyMuPDF
+import pytesseract
+import tiktoken
+from PIL import Image
+from PyPDF2 import PdfReader
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')
+
+_encoding = None
+
+
+def file_content_hash(file_path):
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def get_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+
+def count_tokens(text):
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """(text cut to its first max_tokens tokens, token count of what is kept)"""
+    encoding = get_encoding()
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text, len(tokens)
+    return encoding.decode(tokens[:max_tokens]), max_tokens
+
+
+def get_pdf_page_count(file_path):
+    with fitz.open(file_path) as doc:
+        return len(doc)
+
+
+def ocr_pdf_page(file_path, page_number, dpi=300, timeout=0):
+    """Render one PDF page and run tesseract on it, for scanned documents.
+
+    tesseract is killed after timeout seconds, 0 lets it run.
+    """
+    with fitz.open(file_path) as doc:
+        pixmap = doc.load_page(page_number).get_pixmap(dpi=dpi)
+    image = Image.open(io.BytesIO(pixmap.tobytes("png")))
+    return pytesseract.image_to_string(image, timeout=timeout)
+
+
+def extract_pdf_text_layer(file_path):
+    """Text layer of a PDF: PyPDF2 first, PyMuPDF when PyPDF2 finds nothing"""
+    try:
+        text = "".join(page.extract_text() or "" for page in PdfReader(file_path).pages)
+    except Exception as e:
+        print(f"Error reading PDF: {e}")
+        text = ""
+    if not text.strip():
+        with fitz.open(file_path) as doc:
+            text = "".join(page.get_text("text") for page in doc)
+    return text
+
+
+def read_file(file_path, timeout=0):
+    """Everything that can be extracted without OCRing PDF pages.
+
+    PDFs without a text layer come back with needs_ocr set so the caller can
+    OCR their pages, possibly in parallel.
+    """
+    lower_path = str(file_path).lower()
+    if lower_path.endswith('.pdf'):
+        page_count = get_pdf_page_count(file_path)
+        text = extract_pdf_text_layer(file_path)
+        return {'text': text, 'page_count': page_count, 'ocr_used': False, 'needs_ocr': not text.strip()}
+    elif lower_path.endswith(IMAGE_EXTENSIONS):
+        text = pytesseract.image_to_string(Image.open(file_path), timeout=timeout)
+        return {'text': text, 'page_count': 1, 'ocr_used': True, 'needs_ocr': False}
+    elif lower_path.endswith('.txt'):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return {'text': file.read(), 'page_count': 1, 'ocr_used': False, 'needs_ocr': False}
+    raise ValueError("Unsupported file type. Only PDF and image files are supported.")
+
+
+def extract_text(file_path):
+    """Extract the text of a file.
+
+    Returns a dict with the text, the page count and whether OCR was needed.
+    """
+    result = read_file(file_path)
+    if result.pop('needs_ocr'):
+        result['text'] = "".join(ocr_pdf_page(file_path, page_number) for page_number in range(result['page_count']))
+        result['ocr_used'] = True
+    return result
+
+
+def _raise_timeout(signum, frame):
+    raise TimeoutError("Text extraction timed out")
+
+
+def run_with_timeout(timeout, func, *args):
+    """Run func in this process, raising TimeoutError after timeout seconds (Unix only).
+
+    The alarm is only handled between Python bytecodes, it cannot interrupt
+    a long C call; extract_documents_parallel bounds those with a deadline.
+    """
+    if not timeout or not hasattr(signal, 'setitimer'):
+        return func(*args)
+    previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return func(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def read_file_job(file_path, timeout):
+    return run_with_timeout(timeout, read_file, file_path, timeout)
+
+
+def ocr_pdf_page_job(file_path, page_number, timeout):
+    return run_with_timeout(timeout, ocr_pdf_page, file_path, page_number, 300, timeout)
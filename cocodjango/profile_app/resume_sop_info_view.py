@@ -41,6 +41,7 @@ from .reference_info_serializer import ReferenceInfoSerializer
 from services import UserDataService
 
 from .utils.text_data_extractionv2 import DataExtractor
+from common.document_text import get_document_text
 
 import logging
 import datetime
@@ -90,7 +91,8 @@ class ResumeInfoView(APIView):
                 # json_file_path = JSON_SCHEMA_PATH 
                 json2 = self.generate_json("profile_app", exclude_models=['visa', 'citizenship' , 'researchinterest', "userdetails"])
                 print(json2)  
-                extracted_data = data_extractor.extract_applicant_data(resume_file_path, json2)
+                resume_text = get_document_text(user_document.document).text
+                extracted_data = data_extractor.extract_applicant_data(resume_file_path, json2, text=resume_text)
                 print("extracted data from resumeinfoVIEW:")
                 print(extracted_data)
                 return Response({
@@ -138,8 +138,10 @@ class DataExtractor:
 
         return system_message, tools
 
-    def extract_applicant_data(self, resume_file_path, json_structure):
-        text = TextExtractor.get_text_from_file(resume_file_path)
+    def extract_applicant_data(self, resume_file_path, json_structure, text=None):
+        # Callers holding a Document pass its stored extraction instead of re-parsing the file
+        if text is None:
+            text = TextExtractor.get_text_from_file(resume_file_path)
         print("TEXT:")
         print(text)
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ProgramAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'program_app'
+
+    def ready(self):
+        import program_app.signals
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from program_app.models import Program
+from program_app.requirements import update_program_requirements
+
+
+class Command(BaseCommand):
+    help = 'Parse minimum test scores from the eligibility criteria of existing programs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Parse again even if the eligibility text is unchanged')
+
+    def handle(self, *args, **kwargs):
+        parsed = 0
+        for program in Program.objects.all().iterator():
+            try:
+                update_program_requirements(program, force=kwargs['force'])
+                parsed += 1
+            except Exception as e:
+                self.stderr.write(f'Failed to parse requirements of program {program.id}: {str(e)}')
+        self.stdout.write(self.style.SUCCESS(f'Parsed requirements of {parsed} programs'))
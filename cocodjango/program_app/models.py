@@ -50,6 +50,53 @@ class Program(SoftDeleteModel, TimestampedModel):
         return self.title
 
 
+class ProgramRequirement(TimestampedModel):
+    """Minimum scores parsed once from Program.eligibility_criteria.
+
+    Filled when the program is saved (see program_app.requirements), NULL
+    means the program states no requirement for that test.
+    """
+    REGEX = 'regex'
+    LLM = 'llm'
+    NONE = 'none'
+    SOURCE_CHOICES = [
+        (REGEX, 'Regex'),
+        (LLM, 'LLM'),
+        (NONE, 'Not found'),
+    ]
+
+    program = models.OneToOneField(Program, related_name='requirements', on_delete=models.CASCADE)
+    min_ielts = models.FloatField(null=True, blank=True, db_index=True)
+    min_toefl = models.FloatField(null=True, blank=True, db_index=True)
+    min_gre = models.FloatField(null=True, blank=True, db_index=True)
+    min_duolingo = models.FloatField(null=True, blank=True, db_index=True)
+    min_cgpa = models.FloatField(null=True, blank=True, db_index=True)
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default=NONE)
+    # SHA-256 of the eligibility text the values were parsed from
+    eligibility_hash = models.CharField(max_length=64)
+
+    def __str__(self):
+        return f"Requirements of {self.program_id} ({self.source})"
+
+    @classmethod
+    def for_program(cls, program):
+        """The row of a program, loaded with it by select_related('requirements'), an empty one when never parsed"""
+        try:
+            return program.requirements
+        except cls.DoesNotExist:
+            return cls(program=program)
+
+    def as_criteria(self):
+        """Values keyed like the vector metadata, "" where there is no requirement"""
+        return {
+            "IELTS": "" if self.min_ielts is None else self.min_ielts,
+            "TOEFL": "" if self.min_toefl is None else self.min_toefl,
+            "GRE": "" if self.min_gre is None else self.min_gre,
+            "DUOLINGO": "" if self.min_duolingo is None else self.min_duolingo,
+            "CGPA": "" if self.min_cgpa is None else self.min_cgpa,
+        }
+
+
 
 
 # class ProgramDraft(models.Model):
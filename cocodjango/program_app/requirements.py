@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from bs4 import BeautifulSoup
+from openai import OpenAI
+from .models import ProgramRequirement
+
+logger = logging.getLogger(__name__)
+
+# Metadata key -> ProgramRequirement field
+REQUIREMENT_FIELDS = {
+    "IELTS": "min_ielts",
+    "TOEFL": "min_toefl",
+    "GRE": "min_gre",
+    "DUOLINGO": "min_duolingo",
+    "CGPA": "min_cgpa",
+}
+
+REQUIREMENT_PATTERNS = {
+    "IELTS": r"IELTS\s+(\d+(\.\d+)?)",
+    "TOEFL": r"TOEFL\s+(\d+)",
+    "DUOLINGO": r"DUOLINGO\s+(\d+)",
+    "GRE": r"GRE\s+(\d+)",
+    "CGPA": r"CGPA\s+(\d+(\.\d+)?)"
+}
+
+
+def clean_html_text(input_text):
+    # Remove HTML tags
+    soup = BeautifulSoup(input_text or "", 'html.parser')
+    text = soup.get_text(separator="\n")  # Get plain text with newline separators
+
+    # Remove Unicode private use area characters
+    text = re.sub(r'[\ue200-\ue204]', '', text)
+
+    # Clean up any extra whitespace or newlines
+    text = re.sub(r'\n+', '\n', text).strip()
+
+    return text
+
+
+def parse_requirements(eligibility_text):
+    """Minimum scores found by regex, "" for tests that are not mentioned"""
+    criteria = {key: "" for key in REQUIREMENT_FIELDS}
+    for key, pattern in REQUIREMENT_PATTERNS.items():
+        match = re.search(pattern, eligibility_text, re.IGNORECASE)
+        if match:
+            criteria[key] = float(match.group(1))
+    return criteria
+
+
+def parse_requirements_with_llm(eligibility_text):
+    """Minimum scores extracted by GPT-4o, for eligibility texts the regex cannot read"""
+    client = OpenAI(api_key= os.getenv("OPENAI_API_KEY")) 
+
+    system_message = """
+    You are a data extractor. Given a graduate/ undergraduate program requirement description that includes standardized test and minimum scores, along with CGPA requirements. You will look for the standardized tests like IELTS, TOEFL, DUOLINGO, SAT, GRE, LSAT and other tests and minimum CGPA requirements and extract the score. If a score is not found, keep it None
+    """
+
+
+
+    custom_functions = [{
+        "type": "function",
+        "function": {
+        'name': 'extract_test_scores',
+        'strict': True,
+        'description':
+        'You are an expert data analyst. Based on an open-ended question, you will identify the relevant factors to investigate and generate fields of a dataset with descriptions and explanations for each field.',
+        'parameters': {
+            'type': 'object',
+            'properties': {
+                'fields': {
+                    'type': 'array',
+                    'description': 'You are a data extractor. Given a graduate/ undergraduate program requirement description that includes standardized test and minimum scores, along with CGPA requirements. You will look for the standardized tests like IELTS, TOEFL, DUOLINGO, SAT, GRE, LSAT and other tests and minimum CGPA requirements and extract the score',
+                    'items': {
+                        'type': 'object',
+
+                        "properties": {
+                            "IELTS": {
+                                    "type": "number",
+                                    "description": "English proficiency test often required by non-native speakers"
+                                },
+                                "TOEFL": {
+                                    "type": "number",
+                                    "description": "For non-native English speakers; assesses English proficiency"
+                                },
+                                "SAT": {
+                                    "type": "number",
+                                    "description": "Scholastic Assessment Test"
+                                },
+                            "GRE": {
+                                    "type": "number",
+                                    "description": "Graduate Record Examination"
+                                },
+                                "GMAT": {
+                                    "type": "number",
+                                    "description": "Graduate Management Admission Test"
+                                },
+                                "MAT": {
+                                    "type": "number",
+                                    "description": "Miller Analogies Test"
+                                },
+                            "CGPA": {
+                                    "type": "number",
+                                    "description": "Minimum CGPA required for the program "
+                                },
+                            "DUOLINGO": {
+                                "type": "number",
+                                "description": "English proficiency test"
+                            },
+                            },
+                        "required": ["IELTS", "TOEFL", "SAT", "GRE", "GMAT", "MAT", "CGPA", "DUOLINGO"],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["fields"],
+            "additionalProperties": False,
+        }}
+    }] 
+
+    response = client.chat.completions.create(
+    model="gpt-4o",
+    temperature=0,
+    messages=[
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": eligibility_text}
+    ],
+    tools=custom_functions,
+    tool_choice={"type": "function", "function": {"name": "extract_test_scores"}})
+
+    response_message = response.choices[0].message
+    tool_calls = response_message.tool_calls
+
+    extracted_json = {}
+    for tool_call in tool_calls:
+        # print(f"Function: {tool_call.function.name}")
+        # print(f"Params:{tool_call.function.arguments}")
+
+        arguments = json.loads(tool_call.function.arguments)
+        # print(arguments['fields'][0])
+        # print(type(arguments['fields']))
+        extracted_json = arguments['fields'][0]
+
+    return extracted_json
+
+
+def update_program_requirements(program, force=False):
+    """Parse a program's eligibility criteria into its ProgramRequirement row.
+
+    Nothing is parsed when the eligibility text did not change since the
+    last run. The regex is tried first, the LLM only when it finds nothing.
+    """
+    eligibility_text = clean_html_text(program.eligibility_criteria)
+    eligibility_hash = hashlib.sha256(eligibility_text.encode("utf-8")).hexdigest()
+
+    existing = ProgramRequirement.objects.filter(program=program).first()
+    if existing and existing.eligibility_hash == eligibility_hash and not force:
+        return existing
+
+    criteria = parse_requirements(eligibility_text)
+    source = ProgramRequirement.REGEX
+    if all(value == "" for value in criteria.values()):
+        source = ProgramRequirement.NONE
+        if eligibility_text and os.getenv("OPENAI_API_KEY"):
+            try:
+                extracted = parse_requirements_with_llm(eligibility_text)
+            except Exception as e:
+                logger.error(f"LLM requirement extraction failed for program {program.id}: {e}")
+                extracted = {}
+            # The tool schema forces a number for every test, 0 means it was not found
+            criteria = {key: extracted.get(key) or "" for key in REQUIREMENT_FIELDS}
+            if any(value != "" for value in criteria.values()):
+                source = ProgramRequirement.LLM
+
+    values = {
+        field: (None if criteria[key] == "" else float(criteria[key]))
+        for key, field in REQUIREMENT_FIELDS.items()
+    }
+    requirement, _ = ProgramRequirement.objects.update_or_create(
+        program=program,
+        defaults={'source': source, 'eligibility_hash': eligibility_hash, **values},
+    )
+    return requirement
@@ -0,0 +1,18 @@
+# program_app/signals.py
+import logging
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from .models import Program
+from .requirements import update_program_requirements
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Program)
+def program_saved(sender, instance, **kwargs):
+    # A parsing failure must never break the save that triggered it
+    try:
+        update_program_requirements(instance)
+    except Exception as e:
+        logger.error(f"Failed to parse requirements of program {instance.id}: {e}")
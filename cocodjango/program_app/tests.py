@@ -1,3 +1,96 @@
+import datetime
+from unittest import mock
 from django.test import TestCase
+from campus_app.models import Campus
+from college_app.models import College
+from department_app.models import Department
+from educational_organizations_app.models import EducationalOrganizations
+from funding_app.models import Funding
+from services.program_data_service import ProgramDataService
+from program_app.models import Program
+from recommendation_app.utils.chromadb_ingest_user_data import DjangoToChromaDBIngest
 
-# Create your tests here.
+
+class ProgramSnapshotLoaderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        organization = EducationalOrganizations.objects.create(name="Test University")
+        campus = Campus.objects.create(campus_name="Main Campus", educational_organization=organization, city="Dhaka")
+        college = College.objects.create(name="Science", campus=campus, city="Dhaka", status=True)
+        departments = [
+            Department.objects.create(name=name, college=college, city="Dhaka", status=True)
+            for name in ("Physics", "Chemistry")
+        ]
+        for department in departments:
+            Funding.objects.create(
+                title_of_funding=f"{department.name} assistantship",
+                number_of_positions_opening=2,
+                funding_for=Funding.DEPARTMENT,
+                funding_for_dept=department,
+                funding_opportunity_for=Funding.INTERNATIONAL,
+                funding_type=Funding.RA,
+                amount_type=Funding.MONTHLY,
+                amount=1000,
+                description="Research assistantship",
+                funding_open_date=datetime.date(2025, 1, 1),
+                funding_end_date=datetime.date(2025, 6, 30),
+            )
+        for i in range(4):
+            Program.objects.create(
+                title=f"Program {i}",
+                description="A graduate program",
+                department=departments[i % 2],
+                eligibility_criteria="IELTS 6.5",
+                application_process="Apply online",
+                application_start_date=datetime.date(2025, 1, 1),
+                application_end_date=datetime.date(2025, 6, 30),
+                application_fee=50,
+                contact_email="admissions@example.com",
+                contact_phone="0123456789",
+                contact_office_location="Room 1",
+            )
+
+    def test_query_count_does_not_depend_on_program_count(self):
+        # programs with their hierarchy, required documents, fundings, benefits, end of the programs
+        with self.assertNumQueries(5):
+            snapshots = list(ProgramDataService.get_program_snapshots())
+        self.assertEqual(len(snapshots), 4)
+
+    def test_fundings_are_fetched_once_per_department(self):
+        # first chunk: 4 queries, second chunk only has known departments: 2, end of the programs: 1
+        with self.assertNumQueries(7):
+            snapshots = list(ProgramDataService.get_program_snapshots(chunk_size=3))
+        self.assertEqual(len(snapshots), 4)
+
+    def test_snapshots_match_per_program_data(self):
+        for program, flat_data in ProgramDataService.get_program_snapshots().iter_programs():
+            self.assertEqual(flat_data, ProgramDataService(program.id).get_flat_program_data())
+
+    def test_records_share_the_bulk_queries(self):
+        with self.assertNumQueries(5):
+            records = [record for _, record in ProgramDataService.get_program_snapshots().iter_records()]
+        self.assertEqual([len(record.fundings) for record in records], [1, 1, 1, 1])
+        self.assertEqual(records[0].organization_name, "Test University")
+        self.assertEqual(records[0].city, "Dhaka")
+        self.assertEqual(records[0].requirements['IELTS'], 6.5)
+
+    def ingest(self, **kwargs):
+        """Metadata the program ingest writes, with Chroma left out so only its database queries remain"""
+        ingestor = DjangoToChromaDBIngest(lambda texts: [[0.0] for _ in texts], embedding_cache=False)
+        with mock.patch('recommendation_app.utils.chromadb_ingest_user_data.chroma_registry'), \
+                mock.patch.object(DjangoToChromaDBIngest, 'get_collection'), \
+                mock.patch.object(DjangoToChromaDBIngest, 'sync_documents') as sync_documents:
+            ingestor.ingest_program_documents(**kwargs)
+        return sync_documents.call_args.args[2]
+
+    def test_full_ingest_shares_the_bulk_queries(self):
+        # programs with their hierarchy and requirements, required documents, fundings, benefits, end of the programs
+        with self.assertNumQueries(5):
+            metadatas = self.ingest()
+        self.assertEqual([metadata['IELTS'] for metadata in metadatas], [6.5] * 4)
+
+    def test_incremental_ingest_shares_the_bulk_queries(self):
+        program_ids = list(Program.objects.values_list('id', flat=True)[:2])
+        with self.assertNumQueries(5):
+            metadatas = self.ingest(program_ids=program_ids)
+        self.assertEqual(len(metadatas), 2)
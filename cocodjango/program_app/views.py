@@ -36,6 +36,15 @@ def get_error_response(message, status_code, error_code=None, details=None):
     return Response(response_data, status=status_code)
 
 
+# Listing query parameter -> ProgramRequirement field
+REQUIREMENT_FILTER_PARAMS = {
+    'ielts_score': 'min_ielts',
+    'toefl_score': 'min_toefl',
+    'gre_score': 'min_gre',
+    'duolingo_score': 'min_duolingo',
+    'cgpa': 'min_cgpa',
+}
+
 
 # Views
 
@@ -85,6 +94,23 @@ class ProgramView(APIView):
                             Q(interview_process__icontains=search_term) | Q(financial_aid_details__icontains=search_term)
                 program_data = program_data.filter(q_objects)
 
+            # Eligibility: keep programs whose parsed minimum is at most the given score, or that have none
+            for param, field in REQUIREMENT_FILTER_PARAMS.items():
+                score = request.GET.get(param)
+                if not score:
+                    continue
+                try:
+                    score = float(score)
+                except ValueError:
+                    return get_error_response(
+                        message=f"{param} must be a number.",
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        error_code='BAD_REQUEST'
+                    )
+                program_data = program_data.filter(
+                    Q(**{f'requirements__{field}__lte': score}) | Q(**{f'requirements__{field}__isnull': True})
+                )
+
             try:
                 program_data = program_data.distinct()
                 program_data = program_data.order_by(*sort_columns)
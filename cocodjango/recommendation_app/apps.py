@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class RecommendationAppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "recommendation_app"
+
+    def ready(self):
+        import recommendation_app.signals
@@ -0,0 +1,159 @@
+import itertools
+import json
+import os
+import statistics
+import tempfile
+import time
+import chromadb
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from recommendation_app.utils.chroma_registry import chroma_registry, get_collection_metadata
+from recommendation_app.utils.vector_index import NumpyVectorIndex, build_numpy_index
+
+# Chroma rejects larger add() batches
+ADD_BATCH_SIZE = 5000
+# Synthetic records get a bucket in 0..SYNTHETIC_BUCKETS - 1 to filter on
+SYNTHETIC_BUCKETS = 10
+SYNTHETIC_WHERES = [{"bucket": {"$lt": 3}}, {"bucket": 0}]
+
+
+def get_directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for directory, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare HNSW parameter sets (M, construction_ef, search_ef): builds each one in a scratch '
+        'collection and reports build time, on-disk size, and recall@k and latency of filtered and '
+        'unfiltered queries against an exact search'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', default='',
+                            help='Benchmark the vectors and metadata of this collection, synthetic vectors when empty')
+        parser.add_argument('--count', type=int, default=20000, help='Number of synthetic vectors')
+        parser.add_argument('--dim', type=int, default=1024, help='Dimension of synthetic vectors')
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--top-n', type=int, default=10)
+        parser.add_argument('--where', action='append', default=[],
+                            help='Chroma where clause as JSON, repeat for several; synthetic data has a "bucket" field')
+        parser.add_argument('--params', default='',
+                            help='JSON list of parameter sets, e.g. [{"M": 16, "construction_ef": 100, "search_ef": 50}]')
+        parser.add_argument('--m', type=int, nargs='+', default=[16])
+        parser.add_argument('--construction-ef', type=int, nargs='+', default=[100])
+        parser.add_argument('--search-ef', type=int, nargs='+', default=[10, 50, 100])
+        parser.add_argument('--seed', type=int, default=0)
+
+    def get_synthetic_data(self, count, dim, rng):
+        """Normalized vectors around a few hundred centers, closer to real embeddings than uniform noise"""
+        centers = rng.standard_normal((max(1, count // 100), dim), dtype=np.float32)
+        vectors = centers[rng.integers(len(centers), size=count)]
+        vectors += 0.5 * rng.standard_normal((count, dim), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        ids = [str(i) for i in range(count)]
+        metadatas = [{"bucket": int(bucket)} for bucket in rng.integers(SYNTHETIC_BUCKETS, size=count)]
+        return ids, vectors, metadatas
+
+    def get_collection_data(self, name):
+        data = chroma_registry.get_collection(name).get(include=['embeddings', 'metadatas'])
+        if not data['ids']:
+            raise CommandError(f"Collection {name} is empty")
+        vectors = np.asarray(data['embeddings'], dtype=np.float32)
+        return data['ids'], vectors, [metadata or {} for metadata in data['metadatas']]
+
+    def get_queries(self, vectors, count, rng):
+        """Stored vectors with noise, so queries are near the data without being in it"""
+        queries = vectors[rng.integers(len(vectors), size=count)]
+        queries = queries + 0.1 * rng.standard_normal(queries.shape, dtype=np.float32) / np.sqrt(vectors.shape[1])
+        return [[float(value) for value in query] for query in queries]
+
+    def get_param_sets(self, kwargs):
+        if kwargs['params']:
+            return json.loads(kwargs['params'])
+        return [
+            {'M': m, 'construction_ef': construction_ef, 'search_ef': search_ef}
+            for m, construction_ef, search_ef in itertools.product(
+                kwargs['m'], kwargs['construction_ef'], kwargs['search_ef']
+            )
+        ]
+
+    def run_queries(self, index, queries, top_n, where):
+        latencies, results = [], []
+        index.query(query_embeddings=[queries[0]], n_results=top_n, where=where)  # warm up
+        for query in queries:
+            start = time.perf_counter()
+            result = index.query(query_embeddings=[query], n_results=top_n, where=where)
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append(result['ids'][0])
+        return latencies, results
+
+    def build(self, path, name, params, ids, vectors, metadatas):
+        client = chromadb.PersistentClient(path=path)
+        collection = client.create_collection(name=name, metadata=get_collection_metadata(name, params))
+        start = time.perf_counter()
+        for offset in range(0, len(ids), ADD_BATCH_SIZE):
+            end = offset + ADD_BATCH_SIZE
+            collection.add(
+                ids=ids[offset:end],
+                embeddings=vectors[offset:end].tolist(),
+                # Chroma rejects empty metadata
+                metadatas=[metadata or None for metadata in metadatas[offset:end]],
+            )
+        return collection, time.perf_counter() - start
+
+    def handle(self, *args, **kwargs):
+        rng = np.random.default_rng(kwargs['seed'])
+        top_n = kwargs['top_n']
+        name = kwargs['collection']
+        if name:
+            ids, vectors, metadatas = self.get_collection_data(name)
+            wheres = [None] + [json.loads(where) for where in kwargs['where']]
+        else:
+            name = 'hnsw_benchmark'
+            ids, vectors, metadatas = self.get_synthetic_data(kwargs['count'], kwargs['dim'], rng)
+            wheres = [None] + ([json.loads(where) for where in kwargs['where']] or SYNTHETIC_WHERES)
+        queries = self.get_queries(vectors, kwargs['queries'], rng)
+
+        # The NumPy search is exact, so it is the ground truth for recall
+        exact = {}
+        with tempfile.TemporaryDirectory() as path:
+            build_numpy_index(path, ids, vectors, [""] * len(ids), metadatas)
+            exact_index = NumpyVectorIndex(name, path)
+            for i, where in enumerate(wheres):
+                exact[i] = self.run_queries(exact_index, queries, top_n, where)[1]
+
+        self.stdout.write(f"{len(ids)} vectors of dimension {vectors.shape[1]}, {len(queries)} queries, recall@{top_n}")
+        for i, where in enumerate(wheres):
+            self.stdout.write(f"  filter {i}: {json.dumps(where) if where else 'none'}")
+        self.stdout.write(
+            f"{'M':>4} {'c_ef':>5} {'s_ef':>5} {'build s':>8} {'disk MB':>8} {'filter':>6} "
+            f"{'recall':>7} {'p50 ms':>7} {'p95 ms':>7}"
+        )
+
+        for params in self.get_param_sets(kwargs):
+            metadata = get_collection_metadata(name, params)
+            with tempfile.TemporaryDirectory() as path:
+                collection, build_seconds = self.build(path, name, params, ids, vectors, metadatas)
+                disk_mb = get_directory_size(path) / 2 ** 20
+                for i, where in enumerate(wheres):
+                    latencies, results = self.run_queries(collection, queries, top_n, where)
+                    recalls = [
+                        len(set(approximate) & set(expected)) / len(expected)
+                        for approximate, expected in zip(results, exact[i])
+                        if expected
+                    ]
+                    self.stdout.write(
+                        f"{metadata['hnsw:M']:>4} {metadata['hnsw:construction_ef']:>5} "
+                        f"{metadata['hnsw:search_ef']:>5} {build_seconds:>8.2f} {disk_mb:>8.1f} {i:>6} "
+                        f"{statistics.mean(recalls) if recalls else 1.0:>7.3f} "
+                        f"{percentile(latencies, 0.5):>7.2f} {percentile(latencies, 0.95):>7.2f}"
+                    )
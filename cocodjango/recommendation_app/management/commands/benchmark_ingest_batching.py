@@ -0,0 +1,55 @@
+import tempfile
+import time
+import chromadb
+from django.core.management.base import BaseCommand
+from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+from program_app.models import Program
+from recommendation_app.utils.chromadb_ingest_user_data import DjangoToChromaDBIngest
+
+
+class Command(BaseCommand):
+    help = 'Measure ingestion throughput (encode + collection write) at different batch sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 32, 128])
+        parser.add_argument('--documents', type=int, default=512, help='Number of documents to ingest per run')
+        parser.add_argument('--model-name', default="mixedbread-ai/mxbai-embed-large-v1")
+
+    def get_sample_documents(self, count):
+        """Program descriptions from the DB, padded with synthetic text when the DB is small"""
+        documents = list(
+            Program.objects.values_list('description', flat=True)[:count]
+        )
+        i = 0
+        while len(documents) < count:
+            documents.append(
+                f"Program Description: graduate program {i} in computer science, machine learning "
+                f"and data systems with research and teaching assistantships available."
+            )
+            i += 1
+        return documents
+
+    def handle(self, *args, **kwargs):
+        embedding_function = SentenceTransformerEmbeddingFunction(model_name=kwargs['model_name'])
+        documents = self.get_sample_documents(kwargs['documents'])
+        ids = [f"benchmark_{i}" for i in range(len(documents))]
+
+        # Warm the model up so the first run doesn't pay for lazy initialisation
+        embedding_function(documents[:2])
+
+        self.stdout.write(f"{'batch size':>10} {'seconds':>10} {'docs/sec':>10}")
+        for batch_size in kwargs['batch_sizes']:
+            with tempfile.TemporaryDirectory() as output_path:
+                # The embedding cache would turn every run after the first into a cache read
+                ingestor = DjangoToChromaDBIngest(
+                    embedding_function, output_path=output_path, batch_size=batch_size, embedding_cache=False
+                )
+                client = chromadb.PersistentClient(path=output_path)
+                collection = ingestor.get_collection(client, "benchmark_documents")
+                metadatas = [{"position": i} for i in range(len(documents))]
+
+                start = time.perf_counter()
+                ingestor.sync_documents(collection, documents, metadatas, ids)
+                elapsed = time.perf_counter() - start
+
+            self.stdout.write(f"{batch_size:>10} {elapsed:>10.2f} {len(documents) / elapsed:>10.1f}")
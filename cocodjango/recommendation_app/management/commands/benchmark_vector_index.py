@@ -0,0 +1,78 @@
+import json
+import random
+import statistics
+import tempfile
+import time
+from django.core.management.base import BaseCommand, CommandError
+from recommendation_app.utils.chroma_registry import chroma_registry
+from recommendation_app.utils.vector_index import ChromaVectorIndex, NumpyVectorIndex, build_numpy_index
+
+
+class Command(BaseCommand):
+    help = 'Compare query latency and recall of the Chroma and NumPy vector backends on one collection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', default='program_documents')
+        parser.add_argument('--query-collection', default='student_user_documents',
+                            help='Collection whose vectors are used as queries, falls back to --collection when empty')
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--top-n', type=int, default=10)
+        parser.add_argument('--where', default='', help='Chroma where clause as JSON, applied to both backends')
+
+    def get_query_vectors(self, collection_name, query_collection_name, count):
+        embeddings = []
+        try:
+            embeddings = chroma_registry.get_collection(query_collection_name).get(include=['embeddings'])['embeddings']
+        except Exception:
+            pass
+        if embeddings is None or len(embeddings) == 0:
+            embeddings = chroma_registry.get_collection(collection_name).get(include=['embeddings'])['embeddings']
+        embeddings = [list(embedding) for embedding in embeddings]
+        return [random.choice(embeddings) for _ in range(count)]
+
+    def time_queries(self, index, queries, top_n, where):
+        latencies, results = [], []
+        index.query([queries[0]], n_results=top_n, where=where)  # warm up
+        for query in queries:
+            start = time.perf_counter()
+            result = index.query([query], n_results=top_n, where=where)
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append(result['ids'][0])
+        return latencies, results
+
+    def report(self, label, latencies, recall):
+        latencies = sorted(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f"{label:>8} {statistics.mean(latencies):>10.2f} {statistics.median(latencies):>10.2f} "
+            f"{p95:>10.2f} {recall:>10.3f}"
+        )
+
+    def handle(self, *args, **kwargs):
+        name = kwargs['collection']
+        top_n = kwargs['top_n']
+        where = json.loads(kwargs['where']) if kwargs['where'] else None
+
+        collection = chroma_registry.get_collection(name)
+        data = collection.get(include=['embeddings', 'documents', 'metadatas'])
+        if not data['ids']:
+            raise CommandError(f"Collection {name} is empty")
+        queries = self.get_query_vectors(name, kwargs['query_collection'], kwargs['queries'])
+
+        with tempfile.TemporaryDirectory() as path:
+            build_numpy_index(path, data['ids'], data['embeddings'], data['documents'], data['metadatas'])
+            numpy_latencies, exact_results = self.time_queries(NumpyVectorIndex(name, path), queries, top_n, where)
+            chroma_latencies, chroma_results = self.time_queries(ChromaVectorIndex(name), queries, top_n, where)
+
+        # The NumPy search is exact, so it is the ground truth for recall
+        recalls = [
+            len(set(approximate) & set(exact)) / len(exact)
+            for approximate, exact in zip(chroma_results, exact_results)
+            if exact
+        ]
+        chroma_recall = statistics.mean(recalls) if recalls else 1.0
+
+        self.stdout.write(f"{len(data['ids'])} vectors, {len(queries)} queries, top {top_n}")
+        self.stdout.write(f"{'backend':>8} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'recall':>10}")
+        self.report('chroma', chroma_latencies, chroma_recall)
+        self.report('numpy', numpy_latencies, 1.0)
@@ -0,0 +1,127 @@
+import json
+import os
+import statistics
+import tempfile
+import time
+import chromadb
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from recommendation_app.management.commands.benchmark_hnsw import ADD_BATCH_SIZE, get_directory_size, percentile
+from recommendation_app.utils.chroma_registry import chroma_registry, get_collection_metadata
+from recommendation_app.utils.embedding_service import truncate_embeddings
+from recommendation_app.utils.vector_index import CURRENT_FILE, PRECISIONS, NumpyVectorIndex, build_numpy_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure index size, memory and recall@k of truncated output dimensions and reduced precision '
+        'storage against the full precision vectors of a collection'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', default='program_documents')
+        parser.add_argument('--query-collection', default='student_user_documents',
+                            help='Collection whose vectors are used as queries, falls back to --collection when empty')
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--top-n', type=int, default=10)
+        parser.add_argument('--where', default='', help='Chroma where clause as JSON, applied to every query')
+        parser.add_argument('--dimensions', type=int, nargs='+', default=[0, 512, 256],
+                            help='Output dimensions to compare, 0 keeps the stored vectors whole')
+        parser.add_argument('--precisions', nargs='+', default=list(PRECISIONS), choices=PRECISIONS)
+        parser.add_argument('--chroma', action='store_true',
+                            help='Also build a scratch Chroma collection per dimension and report its size')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def get_query_vectors(self, collection_name, query_collection_name, count, rng):
+        embeddings = []
+        try:
+            embeddings = chroma_registry.get_collection(query_collection_name).get(include=['embeddings'])['embeddings']
+        except Exception:
+            pass
+        if embeddings is None or len(embeddings) == 0:
+            embeddings = chroma_registry.get_collection(collection_name).get(include=['embeddings'])['embeddings']
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        return embeddings[rng.integers(len(embeddings), size=count)]
+
+    def run_queries(self, index, queries, top_n, where):
+        latencies, results = [], []
+        index.query([queries[0]], n_results=top_n, where=where)  # warm up
+        for query in queries:
+            start = time.perf_counter()
+            result = index.query([query], n_results=top_n, where=where)
+            latencies.append((time.perf_counter() - start) * 1000)
+            results.append(result['ids'][0])
+        return latencies, results
+
+    def get_memory_size(self, path):
+        """Bytes of the matrix a query scans: the quantized copy when there is one, else the float32 vectors"""
+        with open(os.path.join(path, CURRENT_FILE)) as file:
+            directory = os.path.join(path, file.read().strip())
+        names = ['quantized.npy', 'scales.npy'] if os.path.exists(os.path.join(directory, 'quantized.npy')) else ['vectors.npy']
+        return sum(os.path.getsize(os.path.join(directory, name)) for name in names if os.path.exists(os.path.join(directory, name)))
+
+    def get_chroma_size(self, name, ids, vectors, metadatas):
+        with tempfile.TemporaryDirectory() as path:
+            client = chromadb.PersistentClient(path=path)
+            collection = client.create_collection(name=name, metadata=get_collection_metadata(name))
+            for offset in range(0, len(ids), ADD_BATCH_SIZE):
+                end = offset + ADD_BATCH_SIZE
+                collection.add(
+                    ids=ids[offset:end],
+                    embeddings=vectors[offset:end],
+                    metadatas=[metadata or None for metadata in metadatas[offset:end]],
+                )
+            return get_directory_size(path)
+
+    def handle(self, *args, **kwargs):
+        rng = np.random.default_rng(kwargs['seed'])
+        name = kwargs['collection']
+        top_n = kwargs['top_n']
+        where = json.loads(kwargs['where']) if kwargs['where'] else None
+
+        data = chroma_registry.get_collection(name).get(include=['embeddings', 'metadatas'])
+        if not data['ids']:
+            raise CommandError(f"Collection {name} is empty")
+        ids = data['ids']
+        metadatas = [metadata or {} for metadata in data['metadatas']]
+        vectors = np.asarray(data['embeddings'], dtype=np.float32)
+        queries = self.get_query_vectors(name, kwargs['query_collection'], kwargs['queries'], rng)
+        full_dimensions = vectors.shape[1]
+        documents = [""] * len(ids)
+
+        # The exact search over the stored vectors is the baseline every setting is compared to
+        with tempfile.TemporaryDirectory() as path:
+            build_numpy_index(path, ids, vectors, documents, metadatas)
+            baseline = self.run_queries(NumpyVectorIndex(name, path), queries.tolist(), top_n, where)[1]
+
+        self.stdout.write(f"{len(ids)} vectors of dimension {full_dimensions}, {len(queries)} queries, recall@{top_n}")
+        self.stdout.write(
+            f"{'dim':>5} {'precision':>9} {'disk MB':>8} {'memory MB':>9} {'chroma MB':>9} "
+            f"{'recall':>7} {'p50 ms':>7} {'p95 ms':>7}"
+        )
+        for dimensions in kwargs['dimensions']:
+            dimensions = min(dimensions or full_dimensions, full_dimensions)
+            if dimensions < full_dimensions:
+                truncated = truncate_embeddings(vectors, dimensions)
+                truncated_queries = truncate_embeddings(queries, dimensions)
+            else:
+                truncated, truncated_queries = vectors.tolist(), queries.tolist()
+            chroma_mb = self.get_chroma_size(name, ids, truncated, metadatas) / 2 ** 20 if kwargs['chroma'] else None
+
+            for precision in kwargs['precisions']:
+                with tempfile.TemporaryDirectory() as path:
+                    build_numpy_index(path, ids, truncated, documents, metadatas, precision=precision)
+                    latencies, results = self.run_queries(NumpyVectorIndex(name, path), truncated_queries, top_n, where)
+                    disk_mb = get_directory_size(path) / 2 ** 20
+                    memory_mb = self.get_memory_size(path) / 2 ** 20
+                recalls = [
+                    len(set(approximate) & set(expected)) / len(expected)
+                    for approximate, expected in zip(results, baseline)
+                    if expected
+                ]
+                self.stdout.write(
+                    f"{dimensions:>5} {precision:>9} {disk_mb:>8.1f} {memory_mb:>9.1f} "
+                    f"{'-' if chroma_mb is None else f'{chroma_mb:.1f}':>9} "
+                    f"{statistics.mean(recalls) if recalls else 1.0:>7.3f} "
+                    f"{percentile(latencies, 0.5):>7.2f} {percentile(latencies, 0.95):>7.2f}"
+                )
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recommendation_app.utils.index_builds import gc_index_builds
+
+
+class Command(BaseCommand):
+    help = 'Drop the vector collections replaced by a blue/green rebuild once their grace period is over'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', help='Only collect old versions of this collection')
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=settings.RECOMMENDATION_INDEX_GC_GRACE,
+            help='Seconds a retired collection is kept for readers still holding it',
+        )
+
+    def handle(self, *args, **kwargs):
+        deleted = gc_index_builds(kwargs['collection'], grace=kwargs['grace'])
+        for physical_name in deleted:
+            self.stdout.write(f'Dropped {physical_name}')
+        self.stdout.write(self.style.SUCCESS(f'{len(deleted)} retired collections dropped'))
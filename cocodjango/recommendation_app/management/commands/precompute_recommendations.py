@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from recommendation_app.utils.batch_recommendations import precompute_program_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Rank programs for every student in one batch and store the results, e.g. for weekly digests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-n', type=int, default=None,
+                            help='Programs stored per student, RECOMMENDATION_RESULTS_CACHE_SIZE by default')
+        parser.add_argument('--block-size', type=int, default=256, help='Students scored per matrix product')
+
+    def handle(self, *args, **kwargs):
+        try:
+            students = precompute_program_recommendations(top_n=kwargs['top_n'], block_size=kwargs['block_size'])
+        except Exception as e:
+            raise CommandError(f'Failed to precompute recommendations with error: {str(e)}')
+        self.stdout.write(self.style.SUCCESS(f'Precomputed recommendations for {students} students'))
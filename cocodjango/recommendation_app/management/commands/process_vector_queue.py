@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from recommendation_app.utils.embedding_service import get_embedding_function
+from recommendation_app.utils.vector_sync import process_vector_sync_queue
+
+
+class Command(BaseCommand):
+    help = 'Re-embed the users and programs that changed since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500, help='Maximum queue entries handled per drain')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting once it is empty')
+        parser.add_argument('--interval', type=int, default=60, help='Seconds to sleep between polls when --loop is set')
+
+    def handle(self, *args, **kwargs):
+        embedding_function = get_embedding_function()
+
+        while True:
+            try:
+                processed = process_vector_sync_queue(embedding_function, limit=kwargs['limit'])
+            except Exception as e:
+                if not kwargs['loop']:
+                    raise CommandError(f'Failed to process vector queue with error: {str(e)}')
+                self.stderr.write(f'Failed to process vector queue with error: {str(e)}')
+                processed = 0
+
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f'Re-embedded {processed} queued entities'))
+                continue
+            if not kwargs['loop']:
+                break
+            time.sleep(kwargs['interval'])
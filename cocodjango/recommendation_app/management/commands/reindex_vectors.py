@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from recommendation_app.utils.embedding_service import get_embedding_function
+from recommendation_app.utils.chromadb_ingest_user_data import DjangoToChromaDBIngest
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the researcher, student and program vector collections'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only upsert new or changed records and delete removed ones instead of rebuilding from scratch',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.RECOMMENDATION_INGEST_BATCH_SIZE,
+            help='Number of documents encoded and written per batch',
+        )
+
+    def handle(self, *args, **kwargs):
+        incremental = kwargs['incremental']
+        embedding_function = get_embedding_function()
+
+        ingestors = [
+            ('researcher_user_documents', 'ingest_researcher_user_documents'),
+            ('student_user_documents', 'ingest_student_user_documents'),
+            ('program_documents', 'ingest_program_documents'),
+        ]
+
+        for collection_name, method_name in ingestors:
+            ingestor = DjangoToChromaDBIngest(
+                embedding_function,
+                output_path=settings.RECOMMENDATION_CHROMADB_PATHS[collection_name],
+                batch_size=kwargs['batch_size'],
+            )
+            try:
+                getattr(ingestor, method_name)(incremental=incremental)
+            except Exception as e:
+                raise CommandError(f'{method_name} failed with error: {str(e)}')
+            self.stdout.write(self.style.SUCCESS(f'{method_name} done'))
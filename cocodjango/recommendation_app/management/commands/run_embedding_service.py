@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from recommendation_app.utils.embedding_service import create_embedding_server
+
+
+class Command(BaseCommand):
+    help = 'Serve sentence-transformer embeddings to the Django workers from a single preloaded model'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--address',
+            default=settings.RECOMMENDATION_EMBEDDING_SERVICE_ADDRESS or 'unix:/tmp/coco-embedding.sock',
+            help="'unix:/path/to.sock' or 'host:port'",
+        )
+        parser.add_argument('--max-batch-size', type=int, default=64, help='Maximum texts encoded in one model call')
+        parser.add_argument('--batch-window-ms', type=float, default=10, help='How long to wait for more requests before encoding')
+
+    def handle(self, *args, **kwargs):
+        server = create_embedding_server(
+            kwargs['address'],
+            settings.RECOMMENDATION_EMBEDDING_MODEL,
+            max_batch_size=kwargs['max_batch_size'],
+            batch_window=kwargs['batch_window_ms'] / 1000,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Embedding service listening on {kwargs['address']}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
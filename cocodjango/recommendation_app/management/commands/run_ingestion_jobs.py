@@ -0,0 +1,39 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from recommendation_app.models import IngestionJob
+from recommendation_app.utils.embedding_service import get_embedding_function
+from recommendation_app.utils.ingestion_jobs import process_ingestion_job
+
+
+class Command(BaseCommand):
+    help = 'Run queued ingestion jobs, resuming jobs whose worker stopped from their last checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.RECOMMENDATION_INGESTION_JOB_BATCH_SIZE,
+            help='Entities ingested between two checkpoints',
+        )
+        parser.add_argument('--loop', action='store_true', help='Keep polling for jobs instead of exiting once none is left')
+        parser.add_argument('--interval', type=int, default=30, help='Seconds to sleep between polls when --loop is set')
+
+    def handle(self, *args, **kwargs):
+        embedding_function = get_embedding_function()
+
+        while True:
+            job = process_ingestion_job(embedding_function, batch_size=kwargs['batch_size'])
+            if job is not None:
+                if job.status == IngestionJob.DONE:
+                    self.stdout.write(self.style.SUCCESS(
+                        f'Ingestion job {job.id} done: {job.processed}/{job.total} entities, {len(job.errors)} errors'
+                    ))
+                elif job.status == IngestionJob.RUNNING:
+                    self.stderr.write(f'Ingestion job {job.id} was taken over by another worker, stopped')
+                else:
+                    self.stderr.write(f'Ingestion job {job.id} failed with error: {job.message}')
+                continue
+            if not kwargs['loop']:
+                break
+            time.sleep(kwargs['interval'])
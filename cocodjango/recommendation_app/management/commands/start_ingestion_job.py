@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from recommendation_app.utils.ingestion_jobs import INGESTION_COLLECTIONS, create_ingestion_job
+
+
+class Command(BaseCommand):
+    help = 'Queue an ingestion job for the run_ingestion_jobs worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only upsert new or changed records and delete removed ones instead of rebuilding from scratch',
+        )
+        parser.add_argument(
+            '--collection',
+            action='append',
+            choices=INGESTION_COLLECTIONS,
+            help='Collection to ingest, can be repeated. Defaults to all of them',
+        )
+
+    def handle(self, *args, **kwargs):
+        try:
+            job = create_ingestion_job(incremental=kwargs['incremental'], collections=kwargs['collection'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Queued ingestion job {job.id} for {", ".join(job.collections)}'))
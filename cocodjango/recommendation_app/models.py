@@ -1,4 +1,6 @@
 from django.db import models
+from django.contrib.auth.models import User
+from django.utils import timezone
 
 class Funding(models.Model):
     university = models.CharField(max_length=200)
@@ -9,4 +11,212 @@ class Funding(models.Model):
     funding_document_path = models.TextField()
 
     def __str__(self):
-        return f"{self.university} -- {self.department}"
\ No newline at end of file
+        return f"{self.university} -- {self.department}"
+
+
+class VectorSyncQueue(models.Model):
+    """Entities whose vectors are out of date and need to be re-embedded.
+
+    There is at most one row per entity, repeated edits only move dirty_at
+    forward, so the worker re-embeds each entity once per drain. While a full
+    rebuild is in progress a drained row is kept with synced_at set instead of
+    deleted, so the rebuild can catch up on it before it goes live.
+    """
+    USER = 'user'
+    PROGRAM = 'program'
+    ENTITY_TYPE_CHOICES = [
+        (USER, 'User'),
+        (PROGRAM, 'Program'),
+    ]
+
+    entity_type = models.CharField(max_length=20, choices=ENTITY_TYPE_CHOICES)
+    entity_id = models.PositiveBigIntegerField()
+    dirty_at = models.DateTimeField(default=timezone.now)
+    synced_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('entity_type', 'entity_id')
+        indexes = [
+            models.Index(fields=['dirty_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.entity_type} {self.entity_id} dirty since {self.dirty_at}"
+
+    @classmethod
+    def pending(cls):
+        """Rows edited since they were last written to the live collections"""
+        return cls.objects.filter(models.Q(synced_at__isnull=True) | models.Q(dirty_at__gt=models.F('synced_at')))
+
+    @classmethod
+    def mark_dirty(cls, entity_type, entity_ids):
+        now = timezone.now()
+        for entity_id in set(entity_ids):
+            if entity_id is None:
+                continue
+            cls.objects.update_or_create(
+                entity_type=entity_type,
+                entity_id=entity_id,
+                defaults={'dirty_at': now},
+            )
+
+
+class VectorIndexVersion(models.Model):
+    """Change counter for a vector collection, or for one vector in it.
+
+    Cached recommendation results carry the versions they were computed
+    against in their key, so bumping a version retires them. entity_id is
+    empty for the collection as a whole.
+    """
+    collection_name = models.CharField(max_length=255)
+    entity_id = models.CharField(max_length=255, blank=True, default='')
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('collection_name', 'entity_id')
+
+    def __str__(self):
+        return f"{self.collection_name} {self.entity_id} v{self.version}".strip()
+
+    @classmethod
+    def bump(cls, collection_name, entity_ids=None):
+        """Increase the collection version, or the versions of the given entities only"""
+        for entity_id in (entity_ids if entity_ids is not None else ['']):
+            # A missing row counts as version 0
+            row, created = cls.objects.get_or_create(
+                collection_name=collection_name, entity_id=str(entity_id), defaults={'version': 1}
+            )
+            if not created:
+                cls.objects.filter(pk=row.pk).update(version=models.F('version') + 1, updated_at=timezone.now())
+
+
+class PrecomputedRecommendation(models.Model):
+    """One ranked item of a student's recommendations, computed offline for every student.
+
+    index_signature records the index versions the ranking was computed
+    against, so a row is only served while those versions are unchanged.
+    """
+    user = models.ForeignKey(User, related_name='precomputed_recommendations', on_delete=models.CASCADE)
+    collection_name = models.CharField(max_length=255)
+    rank = models.PositiveIntegerField()
+    item_id = models.CharField(max_length=255)
+    distance = models.FloatField()
+    metadata = models.JSONField(default=dict)
+    index_signature = models.CharField(max_length=64)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('user', 'collection_name', 'rank')
+        ordering = ['rank']
+
+    def __str__(self):
+        return f"{self.user_id} #{self.rank}: {self.item_id}"
+
+
+class VectorIndexBuild(models.Model):
+    """A versioned Chroma collection built for one of the served collections.
+
+    Full rebuilds write to a new collection named <collection>__v<version>
+    while the live one keeps serving. Once the build passes its sanity check
+    it becomes the LIVE row and the previous one is RETIRED, in one
+    transaction, and retired collections are dropped after a grace period.
+    """
+    BUILDING = 'building'
+    LIVE = 'live'
+    RETIRED = 'retired'
+    FAILED = 'failed'
+    DELETED = 'deleted'
+    STATUS_CHOICES = [
+        (BUILDING, 'Building'),
+        (LIVE, 'Live'),
+        (RETIRED, 'Retired'),
+        (FAILED, 'Failed'),
+        (DELETED, 'Deleted'),
+    ]
+
+    collection_name = models.CharField(max_length=255, db_index=True)
+    physical_name = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=BUILDING)
+    document_count = models.PositiveIntegerField(null=True, blank=True)
+    message = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    switched_at = models.DateTimeField(null=True, blank=True)
+    retired_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.physical_name} ({self.status})"
+
+    @classmethod
+    def get_live_name(cls, collection_name):
+        """Physical name of the collection serving collection_name, the name itself before the first build"""
+        physical_name = (
+            cls.objects.filter(collection_name=collection_name, status=cls.LIVE)
+            .values_list('physical_name', flat=True)
+            .first()
+        )
+        return physical_name or collection_name
+
+
+class IngestionJob(models.Model):
+    """A run of the vector ingestion, executed by the run_ingestion_jobs worker.
+
+    Collections are ingested one after the other, in batches of entities
+    ordered by id. After every batch the job records the last id written,
+    so a job whose worker died resumes from there instead of from zero.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    incremental = models.BooleanField(default=False)
+    collections = models.JSONField(default=list)
+    # Checkpoint: collections finished, the one in progress and the last entity id written to it
+    completed_collections = models.JSONField(default=list)
+    current_collection = models.CharField(max_length=255, blank=True, default='')
+    # Versioned collection a full rebuild of current_collection writes to, see VectorIndexBuild
+    build_collection = models.CharField(max_length=255, blank=True, default='')
+    last_entity_id = models.PositiveBigIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    # [{'collection': ..., 'entity_id': ..., 'error': ...}] for records that could not be ingested
+    errors = models.JSONField(default=list)
+    message = models.TextField(blank=True, default='')
+    # Time spent ingesting, excluding the time a crashed job waited to be picked up again
+    active_seconds = models.FloatField(default=0)
+    worker = models.CharField(max_length=255, blank=True, default='')
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Ingestion job {self.id} ({self.status}) {self.processed}/{self.total}"
+
+    def throughput(self):
+        """Entities ingested per second"""
+        return self.processed / self.active_seconds if self.active_seconds else None
+
+    def eta_seconds(self):
+        throughput = self.throughput()
+        if self.status == self.DONE:
+            return 0
+        if not throughput:
+            return None
+        return max(self.total - self.processed, 0) / throughput
@@ -0,0 +1,69 @@
+# recommendation_app/signals.py
+import logging
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from common.models import UserDocument
+from funding_app.models import Funding
+from program_app.models import Program
+from profile_app.models import (
+    UserDetails, Citizenship, Visa, ResearchInterest, EducationalBackground, Dissertation,
+    ResearchExperience, Publication, WorkExperience, Skill, TrainingWorkshop,
+    AwardGrantScholarship, TestScore, VolunteerActivity, ReferenceInfo
+)
+from .models import VectorSyncQueue
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SECTION_MODELS = [
+    Citizenship, Visa, ResearchInterest, EducationalBackground, Dissertation,
+    ResearchExperience, Publication, WorkExperience, Skill, TrainingWorkshop,
+    AwardGrantScholarship, TestScore, VolunteerActivity, ReferenceInfo,
+]
+
+EMBEDDED_DOCUMENT_USES = [UserDocument.RESUME, UserDocument.SOP]
+
+
+def mark_dirty(entity_type, entity_ids):
+    # A failure to enqueue must never break the save that triggered it
+    try:
+        VectorSyncQueue.mark_dirty(entity_type, entity_ids)
+    except Exception as e:
+        logger.error(f"Failed to enqueue {entity_type} {entity_ids} for re-embedding: {e}")
+
+
+@receiver([post_save, post_delete], sender=UserDetails)
+def user_details_changed(sender, instance, **kwargs):
+    mark_dirty(VectorSyncQueue.USER, [instance.user_id])
+
+
+def profile_section_changed(sender, instance, **kwargs):
+    user_ids = UserDetails.all_objects.filter(id=instance.user_details_id).values_list('user_id', flat=True)
+    mark_dirty(VectorSyncQueue.USER, list(user_ids))
+
+
+for section_model in PROFILE_SECTION_MODELS:
+    post_save.connect(profile_section_changed, sender=section_model, dispatch_uid=f"vector_sync_{section_model.__name__}_save")
+    post_delete.connect(profile_section_changed, sender=section_model, dispatch_uid=f"vector_sync_{section_model.__name__}_delete")
+
+
+@receiver([post_save, post_delete], sender=UserDocument)
+def user_document_changed(sender, instance, **kwargs):
+    if instance.use in EMBEDDED_DOCUMENT_USES:
+        mark_dirty(VectorSyncQueue.USER, [instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=Program)
+def program_changed(sender, instance, **kwargs):
+    mark_dirty(VectorSyncQueue.PROGRAM, [instance.id])
+
+
+@receiver([post_save, post_delete], sender=Funding)
+def funding_changed(sender, instance, **kwargs):
+    # Department fundings are embedded into every program of the department,
+    # faculty fundings into the researcher's own document
+    if instance.funding_for_dept_id:
+        program_ids = Program.all_objects.filter(department_id=instance.funding_for_dept_id).values_list('id', flat=True)
+        mark_dirty(VectorSyncQueue.PROGRAM, list(program_ids))
+    if instance.funding_for_faculty_member_id:
+        mark_dirty(VectorSyncQueue.USER, [instance.funding_for_faculty_member_id])
@@ -1,10 +1,14 @@
 from django.urls import path
 from .views import EmbedUserDataView
 from .views import RecommendUniversitiesView
+from .views import IngestionJobView
+from .views import SemanticSearchView
 
 urlpatterns = [
     path('embed_user_data/', EmbedUserDataView.as_view(), name='embed_user_data'),
+    path('ingestion_jobs/<int:job_id>/', IngestionJobView.as_view(), name='ingestion_job'),
      path('recommend/', RecommendUniversitiesView.as_view(), name='recommend_view'),
+    path('search/', SemanticSearchView.as_view(), name='semantic_search'),
     # other paths...
 ]
  
\ No newline at end of file
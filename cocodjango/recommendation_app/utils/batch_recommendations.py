@@ -0,0 +1,143 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from profile_app.models import TestScore
+from ..models import PrecomputedRecommendation
+from .recommendation_cache import get_index_signature, get_index_versions_for_users
+from .vector_index import get_vector_index
+
+# Program requirement keys that a student's best score for the same test is checked against
+ELIGIBILITY_TESTS = ['IELTS', 'TOEFL', 'GRE', 'DUOLINGO']
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def get_requirement_matrix(metadatas):
+    """(programs, tests) minimum scores, NaN where a program has no requirement"""
+    requirements = np.full((len(metadatas), len(ELIGIBILITY_TESTS)), np.nan, dtype=np.float32)
+    for row, metadata in enumerate(metadatas):
+        for column, test in enumerate(ELIGIBILITY_TESTS):
+            value = (metadata or {}).get(test)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                requirements[row, column] = value
+    return requirements
+
+
+def get_score_matrix(user_ids):
+    """(students, tests) best scores, NaN where a student has not taken the test"""
+    positions = {user_id: row for row, user_id in enumerate(user_ids)}
+    scores = np.full((len(user_ids), len(ELIGIBILITY_TESTS)), np.nan, dtype=np.float32)
+    best_scores = (
+        TestScore.objects
+        .filter(user_details__user_id__in=user_ids, test_name__in=ELIGIBILITY_TESTS)
+        .values('user_details__user_id', 'test_name')
+        .annotate(best_score=Max('score'))
+    )
+    for row in best_scores:
+        scores[positions[row['user_details__user_id']], ELIGIBILITY_TESTS.index(row['test_name'])] = row['best_score']
+    return scores
+
+
+def get_eligibility_filters(user_id):
+    """{test: best score} of a student, the program filters get_eligibility_mask applies in batch"""
+    scores = get_score_matrix([user_id])[0]
+    return {test: float(score) for test, score in zip(ELIGIBILITY_TESTS, scores) if not np.isnan(score)}
+
+
+def get_eligibility_mask(scores, requirements):
+    """(students, programs) True where every requirement is met.
+
+    A requirement counts as met when the program has none or the student has
+    no score for that test, the same as leaving that filter empty online.
+    """
+    student_scores = scores[:, None, :]
+    program_requirements = requirements[None, :, :]
+    met = np.isnan(student_scores) | np.isnan(program_requirements) | (program_requirements <= student_scores)
+    return met.all(axis=2)
+
+
+def precompute_program_recommendations(top_n=None, block_size=256):
+    """Rank programs for every student and store the top_n in PrecomputedRecommendation.
+
+    top_n defaults to RECOMMENDATION_RESULTS_CACHE_SIZE, as many as an online
+    ranking serves, so every page can come from the table. Students are processed block_size at a time: one matrix product scores
+    the block against every program, ineligible programs are masked out and
+    argpartition picks each student's top_n. Returns the number of students.
+    """
+    collection_name = "program_documents"
+    top_n = top_n or settings.RECOMMENDATION_RESULTS_CACHE_SIZE
+    students = get_vector_index("student_user_documents").get(include=["embeddings"])
+    programs = get_vector_index(collection_name).get(include=["embeddings", "metadatas"])
+    if not students["ids"] or not programs["ids"]:
+        return 0
+
+    student_ids = [int(embedding_id) for embedding_id in students["ids"]]
+    student_vectors = normalize_rows(students["embeddings"])
+    program_vectors = normalize_rows(programs["embeddings"])
+    requirements = get_requirement_matrix(programs["metadatas"])
+    scores = get_score_matrix(student_ids)
+    signatures = {
+        user_id: get_index_signature(versions)
+        for user_id, versions in get_index_versions_for_users(student_ids, collection_name).items()
+    }
+    k = min(top_n, len(programs["ids"]))
+    computed_at = timezone.now()
+
+    for start in range(0, len(student_ids), block_size):
+        end = start + block_size
+        similarities = student_vectors[start:end] @ program_vectors.T
+        similarities[~get_eligibility_mask(scores[start:end], requirements)] = -np.inf
+
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_similarities = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_similarities, axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        top_similarities = np.take_along_axis(top_similarities, order, axis=1)
+
+        block_user_ids = student_ids[start:end]
+        rows = []
+        for user_id, program_rows, program_similarities in zip(block_user_ids, top, top_similarities):
+            rank = 0
+            for program_row, similarity in zip(program_rows, program_similarities):
+                if not np.isfinite(similarity):
+                    break
+                rows.append(PrecomputedRecommendation(
+                    user_id=user_id,
+                    collection_name=collection_name,
+                    rank=rank,
+                    item_id=programs["ids"][program_row],
+                    distance=float(1.0 - similarity),
+                    metadata=programs["metadatas"][program_row] or {},
+                    index_signature=signatures[str(user_id)],
+                    computed_at=computed_at,
+                ))
+                rank += 1
+
+        with transaction.atomic():
+            PrecomputedRecommendation.objects.filter(
+                user_id__in=block_user_ids, collection_name=collection_name
+            ).delete()
+            PrecomputedRecommendation.objects.bulk_create(rows)
+        print(f"precomputed recommendations for {min(end, len(student_ids))}/{len(student_ids)} students")
+
+    return len(student_ids)
+
+
+def get_fresh_precomputed(user, collection_name, max_age):
+    """Stored ranking for a user if it is younger than max_age seconds and the indexes are unchanged, else None"""
+    rows = list(PrecomputedRecommendation.objects.filter(user=user, collection_name=collection_name))
+    if not rows:
+        return None
+    if (timezone.now() - rows[0].computed_at).total_seconds() > max_age:
+        return None
+    versions = get_index_versions_for_users([user.id], collection_name)[str(user.id)]
+    if rows[0].index_signature != get_index_signature(versions):
+        return None
+    return rows
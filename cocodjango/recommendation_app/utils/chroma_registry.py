@@ -0,0 +1,107 @@
+import threading
+import time
+import chromadb
+from django.conf import settings
+from ..models import VectorIndexBuild
+
+
+class ChromaRegistry:
+    """Process-wide cache of Chroma clients and collections.
+
+    Opening a PersistentClient and loading a collection reopens the SQLite
+    file and the HNSW segments, so both are created once per process and
+    shared by every request. With RECOMMENDATION_CHROMADB_CLIENT = 'http' all
+    collections are served by one Chroma server instead of local directories.
+
+    Collections are asked for by their logical name. Full rebuilds go live
+    under a versioned name (see index_builds), the live one is looked up in
+    VectorIndexBuild and re-checked every RECOMMENDATION_INDEX_POINTER_TTL
+    seconds, so other processes follow a switch without a restart. The
+    process doing the switch calls reload() to follow it immediately.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clients = {}
+        self._collections = {}
+        self._pointers = {}
+
+    def _client_key(self, path):
+        if settings.RECOMMENDATION_CHROMADB_CLIENT == 'http':
+            return 'http'
+        if path is None:
+            # str(None) would open a 'None' store in the working directory
+            raise ValueError("A path is required for a persistent Chroma client, see RECOMMENDATION_CHROMADB_PATHS.")
+        return str(path)
+
+    def get_client(self, path=None):
+        key = self._client_key(path)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                if key == 'http':
+                    client = chromadb.HttpClient(
+                        host=settings.RECOMMENDATION_CHROMADB_HOST,
+                        port=settings.RECOMMENDATION_CHROMADB_PORT,
+                    )
+                else:
+                    client = chromadb.PersistentClient(path=str(path))
+                self._clients[key] = client
+            return client
+
+    def resolve(self, name):
+        """Physical name of the collection currently serving name"""
+        pointer = self._pointers.get(name)
+        if pointer is not None and time.monotonic() - pointer[1] < settings.RECOMMENDATION_INDEX_POINTER_TTL:
+            return pointer[0]
+
+        physical_name = VectorIndexBuild.get_live_name(name)
+        with self._lock:
+            self._pointers[name] = (physical_name, time.monotonic())
+        return physical_name
+
+    def get_collection(self, name):
+        physical_name = self.resolve(name)
+        collection = self._collections.get(physical_name)
+        if collection is not None:
+            return collection
+
+        with self._lock:
+            collection = self._collections.get(physical_name)
+            if collection is None:
+                path = settings.RECOMMENDATION_CHROMADB_PATHS[name]
+                collection = self.get_client(path).get_collection(name=physical_name)
+                self._collections[physical_name] = collection
+            return collection
+
+    def reload(self, name=None):
+        """Forget cached handles for one collection, or for everything when name is None"""
+        with self._lock:
+            if name is None:
+                self._collections.clear()
+                self._clients.clear()
+                self._pointers.clear()
+            else:
+                self._collections.pop(name, None)
+                pointer = self._pointers.pop(name, None)
+                if pointer is not None:
+                    self._collections.pop(pointer[0], None)
+
+
+chroma_registry = ChromaRegistry()
+
+
+def get_collection_metadata(name, params=None):
+    """Metadata to create collection name with: cosine space and its HNSW parameters.
+
+    params overrides RECOMMENDATION_HNSW_DEFAULTS and the collection's own
+    RECOMMENDATION_HNSW_PARAMS entry.
+    """
+    hnsw = {**settings.RECOMMENDATION_HNSW_DEFAULTS, **settings.RECOMMENDATION_HNSW_PARAMS.get(name, {}), **(params or {})}
+    metadata = {"hnsw:space": "cosine"}
+    metadata.update({f"hnsw:{key}": value for key, value in hnsw.items()})
+    return metadata
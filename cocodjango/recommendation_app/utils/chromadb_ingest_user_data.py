@@ -6,11 +6,26 @@ import copy
 import time
 import re
 from datetime import datetime
-from bs4 import BeautifulSoup
 from .text_loader_from_file import TextLoader
+from .document_batcher import DocumentBatcher
+from .document_builder import DocumentBuilder
+from .chroma_registry import chroma_registry, get_collection_metadata
+from .index_builds import (
+    finish_index_build, is_build_collection, is_served_collection, logical_collection_name, start_index_build
+)
+from .embedding_cache import get_embedding_cache
+from .embedding_service import get_embedding_model_key
+from .recommendation_cache import bump_index_versions
+from .vector_index import refresh_numpy_index
+from .metadata_schema import PROGRAM_SCHEMA, RESEARCHER_SCHEMA
+from .profile_sections import (
+    fuse_section_vectors, get_profile_sections, get_section_collection_name, get_section_id, get_section_scope_ids,
+    get_section_vectors
+)
 from django.conf import settings
 # from ..utils import UserDataService
-from common.models import SoftDeleteModel
+from common.models import SoftDeleteModel, Document
+from common.document_text import extract_documents_parallel, get_document_text_prefix
 from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
 from profile_app.models import UserDetails
 from faculty_members_app.models import FacultyMembers
@@ -19,297 +34,390 @@ from services.researcher_data_service import ResearcherDataService
 from services.college_data_service import  CollegeDataService
 from services.department_data_service import  DepartmentDataService
 from services.program_data_service import ProgramDataService
-from ..models import Funding
+from ..models import Funding, VectorIndexBuild
 from college_app.models import College
 from department_app.models import Department
-from educational_organizations_app.models import EducationalOrganizations
-from campus_app.models import Campus
 from program_app.models import Program
-from openai import OpenAI
+from program_app.requirements import clean_html_text, parse_requirements, parse_requirements_with_llm
 import json
+import hashlib
 
+# user_type values of the users indexed in researcher_user_documents
+RESEARCH_ROLES = [
+    'Professor', 'Researcher', 'Lecturer', 'Assistant Professor',
+    'Associate Professor',
+    'Postdoctoral Researcher', 'Visiting Scholar',  'Clinical Faculty',
+    'Adjunct Faculty', 'Faculty Emeritus']
 
 
 
 class DjangoToChromaDBIngest:
-    def __init__(self, embedding_function, output_path=None):
+    def __init__(self, embedding_function, output_path=None, batch_size=None, model_name=None, embedding_cache=None):
         self.embedding_function = embedding_function
         if output_path:
             if not os.path.exists(output_path):
                 os.makedirs(output_path)
         self.output_path = output_path
+        self.batch_size = batch_size or settings.RECOMMENDATION_INGEST_BATCH_SIZE
+        # Cache key of the vectors, a truncated output dimension gets its own entries
+        self.model_name = model_name or get_embedding_model_key()
+        # Pass embedding_cache=False to always run the model
+        self.embedding_cache = embedding_cache if embedding_cache is not None else get_embedding_cache()
+        # Documents whose extraction timed out or failed in the parallel stage
+        self.failed_document_ids = set()
+        # Set by ingestion jobs, which refresh the NumPy export and bump versions once per collection
+        self.defer_index_refresh = False
+        # Collection name -> build collection to write into instead, set by ingestion jobs resuming a rebuild
+        self.collection_overrides = {}
+        # Cuts section texts to the model's token budget and counts what was truncated
+        self.document_builder = DocumentBuilder()
+        # Called while a batch runs (per model call, extracted file and profile chunk), set by ingestion jobs
+        self.heartbeat = None
+
+    def beat(self):
+        if self.heartbeat:
+            self.heartbeat()
 
     def get_embedding(self, text):
-        return self.embedding_function.encode(text).tolist()
+        return self.get_embeddings([text])[0]
 
-    def ingest_researcher_user_documents(self):
-        # users = UserDetails.objects.all()
-        
-        client = chromadb.PersistentClient(path=self.output_path)
+    def get_embeddings(self, texts):
+        """Encode a whole batch of texts with one call to the model.
+
+        Texts already in the embedding cache are not sent to the model at all.
+        """
+        texts = list(texts)
+        self.beat()
+        if not self.embedding_cache:
+            return [list(map(float, embedding)) for embedding in self.embedding_function(texts)]
+
+        embeddings = self.embedding_cache.get_many(self.model_name, texts)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            encoded = [list(map(float, embedding)) for embedding in self.embedding_function(missing_texts)]
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = embedding
+            self.embedding_cache.set_many(self.model_name, missing_texts, encoded)
+        return embeddings
+
+    def get_collection(self, client, name, incremental=False):
+        """Return the collection to write into.
+
+        An incremental run writes into the live collection and keeps whatever
+        is already indexed so it can be diffed against the DB. A full rebuild
+        of a served collection goes into a new build collection, which
+        sync_documents() switches to once it is complete (see index_builds).
+        Other collections are dropped and recreated.
+        """
+        if name in self.collection_overrides:
+            return client.get_collection(name=self.collection_overrides[name])
+        if incremental:
+            return client.get_or_create_collection(
+                name=VectorIndexBuild.get_live_name(name), metadata=get_collection_metadata(name)
+            )
+        if is_served_collection(name):
+            return start_index_build(client, name, metadata=get_collection_metadata(name))
         try:
-            client.delete_collection(name="researcher_user_documents")
+            client.delete_collection(name=name)
         except Exception as e:
             print("Collection doesn't exist or failed to delete:", e)
+        # Cached handles point at the dropped collection from here on
+        chroma_registry.reload(name)
+        return client.create_collection(name=name, metadata=get_collection_metadata(name))
+
+    def get_content_hash(self, document, metadata):
+        """Fingerprint of everything that ends up in the index for one record"""
+        metadata = {k: v for k, v in metadata.items() if k not in ("content_hash", "embedded_at")}
+        payload = json.dumps({"document": document, "metadata": metadata}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def sync_documents(self, collection, documents, metadatas, ids, incremental=False, scope_ids=None, embeddings=None):
+        """Write the current DB rows into the collection.
+
+        In incremental mode only new or changed records (by id and content
+        hash) are upserted and ids that are no longer in the DB are deleted.
+        When scope_ids is given only those ids are diffed, so a partial
+        refresh never deletes records outside of it. embeddings maps ids to
+        vectors that are written as they are instead of encoding the document.
+        """
+        embeddings = embeddings or {}
+        # Only records that are written keep this stamp, see jit_embedding
+        embedded_at = time.time()
+        for document, metadata in zip(documents, metadatas):
+            metadata["content_hash"] = self.get_content_hash(document, metadata)
+            metadata["embedded_at"] = embedded_at
+
+        if not incremental:
+            with DocumentBatcher(collection, self.get_embeddings, self.batch_size, method="add") as batcher:
+                for document, metadata, embedding_id in zip(documents, metadatas, ids):
+                    batcher.add(embedding_id, document, metadata, embeddings.get(embedding_id))
+            print(f"{collection.name}: {batcher.written} added")
+            if self.defer_index_refresh:
+                return
+            if is_build_collection(collection.name):
+                finish_index_build(collection, expected_count=len(set(ids)), embedding_function=self.embedding_function)
+            refresh_numpy_index(collection)
+            bump_index_versions(logical_collection_name(collection.name), ids, incremental=False)
+            return
+
+        if scope_ids is None:
+            existing = collection.get(include=["metadatas"])
+        else:
+            existing = collection.get(ids=list(scope_ids), include=["metadatas"])
+        indexed_hashes = {
+            embedding_id: (metadata or {}).get("content_hash")
+            for embedding_id, metadata in zip(existing["ids"], existing["metadatas"])
+        }
+
+        changed_ids = []
+        with DocumentBatcher(collection, self.get_embeddings, self.batch_size, method="upsert") as batcher:
+            for document, metadata, embedding_id in zip(documents, metadatas, ids):
+                if indexed_hashes.get(embedding_id) != metadata["content_hash"]:
+                    batcher.add(embedding_id, document, metadata, embeddings.get(embedding_id))
+                    changed_ids.append(embedding_id)
+
+        current_ids = set(ids)
+        removed_ids = [embedding_id for embedding_id in indexed_hashes if embedding_id not in current_ids]
+        if removed_ids:
+            collection.delete(ids=removed_ids)
+        if (changed_ids or removed_ids) and not self.defer_index_refresh:
+            refresh_numpy_index(collection, changed_ids, removed_ids)
+            bump_index_versions(logical_collection_name(collection.name), changed_ids + removed_ids, incremental=True)
+
+        print(f"{collection.name}: {batcher.written} upserted, {len(removed_ids)} deleted, {len(ids) - batcher.written} unchanged")
+
+    def sync_profile_sections(self, client, collection_name, sections, metadatas, incremental=False, scope_ids=None):
+        """Write {entity id: {section: BudgetedText}} into the section collection of collection_name.
+
+        Sections are diffed by content hash like any other record, so only
+        changed sections are encoded. Their metadata records the token count
+        and how many characters the token budget cut off. Returns {entity id: fused vector} for
+        the profile vectors, entities without sections are left out and get
+        their document encoded as before.
+        """
+        section_collection = self.get_collection(client, get_section_collection_name(collection_name), incremental)
+        documents, section_metadatas, ids = [], [], []
+        for entity_id, entity_sections in sections.items():
+            for section, budgeted in entity_sections.items():
+                documents.append(budgeted.text)
+                section_metadatas.append({
+                    **metadatas.get(entity_id, {}),
+                    "user_id": int(entity_id),
+                    "section": section,
+                    "tokens": budgeted.tokens,
+                    "truncated_chars": budgeted.truncated_chars,
+                })
+                ids.append(get_section_id(entity_id, section))
+
+        section_scope_ids = None if scope_ids is None else get_section_scope_ids(scope_ids)
+        self.sync_documents(section_collection, documents, section_metadatas, ids, incremental, scope_ids=section_scope_ids)
+
+        vectors = get_section_vectors(collection_name, list(sections), index=section_collection)
+        embeddings = {}
+        for entity_id in sections:
+            fused = fuse_section_vectors(vectors.get(entity_id, {}))
+            if fused is not None:
+                embeddings[entity_id] = fused
+        return embeddings
+
+    def extract_user_documents(self, user_list):
+        """Extract every resume/SOP of user_list in parallel before anything is embedded"""
+        document_ids = [
+            document_list[0]['document_id']
+            for record in user_list
+            for document_list in (record.resume, record.sop)
+            if document_list and document_list[0].get('document_id')
+        ]
+        if not document_ids:
+            return
+        statuses = extract_documents_parallel(Document.objects.filter(id__in=document_ids), on_progress=self.beat)
+        failed_ids = {
+            document_id for document_id, status in statuses.items() if status not in ('stored', 'extracted')
+        }
+        if failed_ids:
+            print(f"Skipping {len(failed_ids)} documents that could not be extracted")
+        self.failed_document_ids |= failed_ids
+
+    def iter_users_with_documents(self, snapshots):
+        """UserProfileRecords of a ProfileSnapshotLoader, each chunk's documents extracted before it is yielded"""
+        for chunk in snapshots.iter_chunks():
+            self.beat()
+            # A single user (on-demand embedding) is extracted inline by load_document_text,
+            # starting a process pool would cost more than it saves
+            if len(chunk) > 1:
+                self.extract_user_documents(chunk)
+            yield from chunk
+
+    def load_document_text(self, document_list):
+        """(text, length of the whole text) of the latest resume/SOP entry, read from the extracted-text store.
+
+        Only as much text as the document builder can use is read.
+        """
+        if not document_list:
+            return "", 0
+        entry = document_list[0]
+        if entry.get('document_id') in self.failed_document_ids:
+            return "", 0
+        if entry.get('document_id'):
+            document = Document.objects.filter(id=entry['document_id']).first()
+            if document:
+                try:
+                    return get_document_text_prefix(document, self.document_builder.max_chars)
+                except Exception as e:
+                    # Documents not extracted up front (single user) fail here instead
+                    print(f"Skipping document {document.id} that could not be extracted:", e)
+                    return "", 0
+        if "url" in entry:
+            file_path = str(settings.MEDIA_ROOT) + "/" + os.path.basename(entry['url'])
+            text = TextLoader.get_text_from_file(file_path)
+            return text[:self.document_builder.max_chars], len(text)
+        return "", 0
+
+    def ingest_researcher_user_documents(self, incremental=False, user_ids=None):
+        # users = UserDetails.objects.all()
         
-        collection = client.create_collection(name="researcher_user_documents", metadata={"hnsw:space": "cosine"})
+        # Refreshing a subset of users only makes sense on top of the existing index
+        incremental = incremental or user_ids is not None
+        client = chroma_registry.get_client(self.output_path)
+        collection = self.get_collection(client, "researcher_user_documents", incremental)
 
         # user_list = UserDataService.get_all_flat_users_data(group_name='Student')
-        research_roles = [
-        'Professor', 'Researcher', 'Lecturer', 'Assistant Professor',
-        'Associate Professor',
-        'Postdoctoral Researcher', 'Visiting Scholar',  'Clinical Faculty',
-        'Adjunct Faculty', 'Faculty Emeritus']
-
-        user_list = ResearcherDataService.get_all_flat_users_data(user_types=research_roles)
+        self.document_builder = DocumentBuilder()
+        snapshots = ResearcherDataService.get_profile_snapshots(user_types=RESEARCH_ROLES, user_ids=user_ids)
+        user_list = self.iter_users_with_documents(snapshots)
  
         # print("user_list:", user_list)
+        documents, metadatas, ids = [], [], []
+        sections = {}
 
-        for user_data in user_list:
-            user_info =  user_data['user_main'][0]
-            user_details = user_data['user_details']
-            del user_data['user_details']
-            del user_data['user_main']
-            user_data.update(user_details)
-            user_data.update(user_info) 
-        
-            user_id = user_info['user_id']
-            # sop_path = user['sop'][0]['url']
-            # resume_path = user['resume'][0]['url']
-
-            # print("user_info:", user_info)
-            # print("user_sop path:", sop_path)
-
-            embedding_id = f"{user_id}"
-            metadata = user_data
-            # for k, v in metadata.items():
-            #     if v is None:
-                    # print("None type:")
-                    # print(k)
-
-            resume_text = "" 
-            if len(user_data['resume']) > 0:
-                if "url" in user_data['resume'][0]:
-                    resume_file_path = str(settings.MEDIA_ROOT )+ "/" +os.path.basename(user_data['resume'][0]['url'])
-                    resume_text = TextLoader.get_text_from_file(resume_file_path)
-            sop_text = ""
-            if len(user_data['sop']) > 0:
-                if "url"  in user_data['sop'][0]:
-                    
-            
-                    sop_file_path = str(settings.MEDIA_ROOT ) + "/" +os.path.basename(user_data['sop'][0]['url'])
-                    sop_text = TextLoader.get_text_from_file(sop_file_path)
-            
-            if user_data['department'] is not None:
-                department_name = Department.objects.get(id=user_data['department'] ).name
-                user_data['department_name']  = department_name
-            
-            if user_data['college'] is not None:
-                college_name = College.objects.get(id=user_data['college'] ).name
-                user_data['college_name']  = college_name
-
-            if user_data['campus'] is not None:
-                campus_name = Campus.objects.get(id=user_data['campus'] ).campus_name
-                user_data['campus_name'] = campus_name
+        for record in user_list:
+            embedding_id = f"{record.user_id}"
+            details = record.details
 
-            if user_data['organization'] is not None:
-                organization_name = EducationalOrganizations.objects.get(id=user_data['organization'] ).name
-                user_data['organization_name'] = organization_name
+            resume = self.load_document_text(record.resume)
+            sop = self.load_document_text(record.sop)
 
-
-            # print(flat_data["resume_0_url"])
-            # print(os.path.realpath(os.path.join(os.getcwd(), "../..", flat_data["resume_0_url"])))
-           
-            # resume_text = TextLoader.get_text_from_file(flat_data["resume_0_url"])
-            
-            # sop_text = TextLoader.get_text_from_file( flat_data["sop_0_url"])
-            # print(sop_text[:100]) 
-            # print("resume text:")
-            # print(resume_text[:100])
-                
             # Extract funding details
-            funding_metadata = self.extract_funding_data(user_data)
-            # print("funding_metadata:", funding_metadata) 
-
-            # Initialize an empty list to store formatted strings
-            publication_strings = []
-
-            # Iterate over the data keys
-            i = 0
-            while f"publication_{i}_title" in user_data and f"publication_{i}_abstract" in user_data:
-                title = user_data[f"publication_{i}_title"]
-                abstract = user_data[f"publication_{i}_abstract"]
-                publication_strings.append(f'publication title: "{title}", publication abstract: "{abstract}"')
-                i += 1
+            funding_metadata = self.extract_funding_data(record.fundings)
 
-            funding_text_to_embed = ""
-            for i, desc in enumerate(funding_metadata['description']):
-                funding_text_to_embed= "Funding Details: \nTitle: " +  funding_metadata['title_of_funding'][i] + " \n Description " + desc + "\n"
+            funding_texts = [
+                "Funding Details: \nTitle: " + title + " \n Description " + desc + "\n"
+                for title, desc in zip(funding_metadata['title_of_funding'], funding_metadata['description'])
+            ]
 
             del funding_metadata['description']
             del funding_metadata['title_of_funding']
 
-            # Join all publication strings into one string
-            result_string = ", ".join(publication_strings)
-
-            total_text = ""
-
-            if resume_text != "":
-                total_text += "Resume: " + resume_text
-            if sop_text != "":
-                total_text += "Statement of purpose: " + sop_text
-            
-            total_text =funding_text_to_embed +  total_text + result_string
-            # print(total_text)
-
-
-            del metadata['sop']
-            del metadata['resume']
-            # filtered_metadata = self.metadata_filtering(metadata)
-
-        
+            profile_sections = get_profile_sections(
+                record, self.document_builder, resume, sop, funding_texts
+            )
+            total_text = "".join(
+                profile_sections[section].text
+                for section in ('funding', 'resume', 'sop', 'publications', 'research_interests')
+                if section in profile_sections
+            )
 
             vector_metadata = {
-                "user_id": metadata['user_id'],
-                "name": metadata['first_name'] + " " + metadata['last_name'],
-                "type": metadata['user_type'],
-                "college_id": "" if metadata['college'] is None else metadata['college'],
-                # "college_web_address": metadata['college_web_address'],
-                "college_name": "" if "college_name" not in  metadata else metadata['college_name'],
-                "campus_id": "" if metadata['campus'] is None else metadata['campus'],
-                "campus_name":"" if "campus_name" not in  metadata else metadata['campus_name'],
-                "organization_id": metadata['organization'],
-                "department_name":""  if "department_name" not in  metadata else metadata['department_name'],
-                "department_id": "" if metadata['department'] is None else metadata['department'], 
-                # "organization_web_address": metadata['organization_web_address'],
-                # "under_category_name": metadata['under_category_name'],
-                "organization_name": metadata['organization_name'],
-                # "country_name": metadata['country_name'],
-                # "country_code": metadata['country_code'],
-                # "state_province_name": metadata['state_province_name'],
-                "city": "" if metadata['current_city'] is None else metadata['current_city'],
-                "funding_available": "True" if len(funding_metadata['funding_id']) > 0 else "False",
-                "funding_for": "|".join(funding_metadata['funding_for']),  # 'International|International'
-                "funding_type": "|".join(funding_metadata['funding_type']),  # 'RA|TA'
-                "funding_opportunity_for": "|".join(funding_metadata['funding_opportunity_for']),# 'International|International'
+                "user_id": record.user_id,
+                "name": record.first_name + " " + record.last_name,
+                "type": details['user_type'],
+                "college_id": "" if details['college'] is None else details['college'],
+                "college_name": details['college_name'],
+                "campus_id": "" if details['campus'] is None else details['campus'],
+                "campus_name": details['campus_name'],
+                "organization_id": details['organization'],
+                "department_name": details['department_name'],
+                "department_id": "" if details['department'] is None else details['department'], 
+                "organization_name": details['organization_name'],
+                "city": "" if details['current_city'] is None else details['current_city'],
+                "funding_available": len(funding_metadata['funding_id']) > 0,
+                # Expanded into one flag per choice by the schema, e.g. funding_type_RA
+                "funding_for": funding_metadata['funding_for'],
+                "funding_type": funding_metadata['funding_type'],
+                "funding_opportunity_for": funding_metadata['funding_opportunity_for'],
               
             }
+            vector_metadata = RESEARCHER_SCHEMA.encode(vector_metadata)
             print("vector_metadata:", vector_metadata)
             
-            collection.add(
-                documents=[total_text],
-                metadatas=[vector_metadata],
-                ids=[embedding_id]
-            )
+            documents.append(total_text)
+            metadatas.append(vector_metadata)
+            ids.append(embedding_id)
+            sections[embedding_id] = profile_sections
+
+        scope_ids = None if user_ids is None else [f"{user_id}" for user_id in user_ids]
+        # Sections carry the researcher metadata so they can be searched with the same filters
+        embeddings = self.sync_profile_sections(
+            client, "researcher_user_documents", sections, dict(zip(ids, metadatas)), incremental, scope_ids
+        )
+        self.sync_documents(
+            collection, documents, metadatas, ids, incremental, scope_ids=scope_ids, embeddings=embeddings
+        )
+        print(self.document_builder.report())
         print("researcher injesting done")
         
        
-    def ingest_student_user_documents(self):
+    def ingest_student_user_documents(self, incremental=False, user_ids=None):
             # users = UserDetails.objects.all()
             
-            client = chromadb.PersistentClient(path=self.output_path)
-            try:
-                client.delete_collection(name="student_user_documents")
-            except Exception as e:
-                print("Collection doesn't exist or failed to delete:", e)
-            
-            collection = client.create_collection(name="student_user_documents", metadata={"hnsw:space": "cosine"})
+            incremental = incremental or user_ids is not None
+            client = chroma_registry.get_client(self.output_path)
+            collection = self.get_collection(client, "student_user_documents", incremental)
 
-            user_list = UserDataService.get_all_flat_users_data(group_name='Student')
+            self.document_builder = DocumentBuilder()
+            snapshots = UserDataService.get_profile_snapshots(group_name='Student', user_ids=user_ids)
+            user_list = self.iter_users_with_documents(snapshots)
         
     
             # print("user_list:", user_list)
+            documents, metadatas, ids = [], [], []
+            sections = {}
 
-            for user in user_list:
-                user_info =  user['user_main'][0]
-                user_details = user['user_details']
-                del user['user_details']
-                del user['user_main']
-                user.update(user_details)
-                user.update(user_info)
-             
-                user_id = user_info['user_id']
-                # sop_path = user['sop'][0]['url']
-                # resume_path = user['resume'][0]['url']
-
-                print("user_info:", user_info)
-                # print("user_sop path:", sop_path)
-
-                embedding_id = f"{user_id}"
-                metadata = user
-                # for k, v in metadata.items():
-                #     if v is None:
-                #         print("None type:")
-                #         print(k)
-
-                resume_text = "" 
-                if len(user['resume']) > 0:
-                    if "url" in user['resume'][0]:
-                        resume_file_path = str(settings.MEDIA_ROOT )+ "/" +os.path.basename(user['resume'][0]['url'])
-                        resume_text = TextLoader.get_text_from_file(resume_file_path)
-                sop_text = ""
-                if len(user['sop']) > 0:
-                    if "url"  in user['sop'][0]:
-                        
-                
-                        sop_file_path = str(settings.MEDIA_ROOT ) + "/" +os.path.basename(user['sop'][0]['url'])
-                        sop_text = TextLoader.get_text_from_file(sop_file_path)
-                
+            for record in user_list:
+                print("user_info:", record.user_main())
+                embedding_id = f"{record.user_id}"
 
-                # print(flat_data["resume_0_url"])
-                # print(os.path.realpath(os.path.join(os.getcwd(), "../..", flat_data["resume_0_url"])))
-            
-                # resume_text = TextLoader.get_text_from_file(flat_data["resume_0_url"])
-                
-                # sop_text = TextLoader.get_text_from_file( flat_data["sop_0_url"])
-                print(sop_text[:100]) 
+                resume = self.load_document_text(record.resume)
+                sop = self.load_document_text(record.sop)
+                print(sop[0][:100]) 
                 print("resume text:")
-                print(resume_text[:100])
-
-                # Initialize an empty list to store formatted strings
-                publication_strings = []
-
-                # Iterate over the data keys
-                i = 0
-                while f"publication_{i}_title" in user and f"publication_{i}_abstract" in user:
-                    title = user[f"publication_{i}_title"]
-                    abstract = user[f"publication_{i}_abstract"]
-                    publication_strings.append(f'publication title: "{title}", publication abstract: "{abstract}"')
-                    i += 1
-    
+                print(resume[0][:100])
 
-                # Join all publication strings into one string
-                result_string = ", ".join(publication_strings)
-
-                total_text = ""
-
-                if resume_text != "":
-                    total_text += "Resume: " + resume_text
-                if sop_text != "":
-                    total_text += "Statement of purpose: " + sop_text
-                
-                total_text = total_text + result_string
+                profile_sections = get_profile_sections(record, self.document_builder, resume, sop)
+                total_text = "".join(
+                    profile_sections[section].text
+                    for section in ('resume', 'sop', 'publications', 'research_interests')
+                    if section in profile_sections
+                )
                 print(total_text)
 
-
-                del metadata['sop']
-                del metadata['resume']
+                # Profile sections, details and user fields, in the order they were merged before
+                metadata = {**record.sections, **record.details, **record.user_main()}
                 filtered_metadata = self.metadata_filtering(metadata)
 
                 print("metadata:")
                 print(filtered_metadata)
 
-                
-                collection.add(
-                    documents=[total_text],
-                    metadatas=[filtered_metadata],
-                    ids=[embedding_id]
-                )
+                documents.append(total_text)
+                metadatas.append(filtered_metadata)
+                ids.append(embedding_id)
+                sections[embedding_id] = profile_sections
+
+            scope_ids = None if user_ids is None else [f"{user_id}" for user_id in user_ids]
+            embeddings = self.sync_profile_sections(
+                client, "student_user_documents", sections, {}, incremental, scope_ids
+            )
+            self.sync_documents(
+                collection, documents, metadatas, ids, incremental, scope_ids=scope_ids, embeddings=embeddings
+            )
+            print(self.document_builder.report())
             print("student ingesting done")
 
     # def ingest_faculty_documents(self):
     #     faculty_members = Funding.objects.all()
         
-    #     client = chromadb.PersistentClient(path=self.output_path)
+    #     client = chroma_registry.get_client(self.output_path)
     #     try:
     #         client.delete_collection(name="faculty_documents")
     #     except Exception as e:
@@ -348,16 +456,12 @@ class DjangoToChromaDBIngest:
 
     #     return 0
     
-    def ingest_college_documents(self):
+    def ingest_college_documents(self, incremental=False):
         colleges = College.objects.all()
         
-        client = chromadb.PersistentClient(path=self.output_path)
-        try:
-            client.delete_collection(name="college_documents")
-        except Exception as e:
-            print("Collection doesn't exist or failed to delete:", e)
-        
-        collection = client.create_collection(name="college_documents", metadata={"hnsw:space": "cosine"})
+        client = chroma_registry.get_client(self.output_path)
+        collection = self.get_collection(client, "college_documents", incremental)
+        documents, metadatas, ids = [], [], []
         
         # college_flat_data = CollegeDataService.get_all_flat_colleges_data()
         # print("college flat data: ")
@@ -404,26 +508,21 @@ class DjangoToChromaDBIngest:
             }
             
             
-            collection.add(
-                documents = [metadata['statement']],
-                metadatas = [vector_metadata],
-                ids = [embedding_id]
-            )
+            documents.append(metadata['statement'])
+            metadatas.append(vector_metadata)
+            ids.append(embedding_id)
 
+        self.sync_documents(collection, documents, metadatas, ids, incremental)
         print("college data ingest done")
 
         return 0
 
-    def ingest_dept_documents(self):
+    def ingest_dept_documents(self, incremental=False):
             depts = Department.objects.all()
             
-            client = chromadb.PersistentClient(path=self.output_path)
-            try:
-                client.delete_collection(name="dept_documents")
-            except Exception as e:
-                print("Collection doesn't exist or failed to delete:", e)
-            
-            collection = client.create_collection(name="dept_documents", metadata={"hnsw:space": "cosine"})
+            client = chroma_registry.get_client(self.output_path)
+            collection = self.get_collection(client, "dept_documents", incremental)
+            documents, metadatas, ids = [], [], []
             
             # college_flat_data = CollegeDataService.get_all_flat_colleges_data()
             # print("college flat data: ")
@@ -471,41 +570,33 @@ class DjangoToChromaDBIngest:
                 }
                 
                 
-                collection.add(
-                    documents = [metadata['statement']],
-                    metadatas = [vector_metadata],
-                    ids = [embedding_id]
-                )
+                documents.append(metadata['statement'])
+                metadatas.append(vector_metadata)
+                ids.append(embedding_id)
 
+            self.sync_documents(collection, documents, metadatas, ids, incremental)
             print("dept data ingest done")
 
             return 0
     
-    def ingest_program_documents(self):
-        programs = Program.objects.all()
-        
-        client = chromadb.PersistentClient(path=self.output_path)
-        try:
-            client.delete_collection(name="program_documents")
-        except Exception as e:
-            print("Collection doesn't exist or failed to delete:", e)
+    def ingest_program_documents(self, incremental=False, program_ids=None):
+        if program_ids is not None:
+            incremental = True
         
-        collection = client.create_collection(name="program_documents", metadata={"hnsw:space": "cosine"})
+        client = chroma_registry.get_client(self.output_path)
+        collection = self.get_collection(client, "program_documents", incremental)
+        documents, metadatas, ids = [], [], []
         
-        for program in programs:
+        # Programs with their hierarchy, requirements and fundings, loaded in bulk
+        for program, record in ProgramDataService.get_program_snapshots(program_ids).iter_records():
             program_id = program.id
             print("program_id:", program_id)
             
-            # Initialize ProgramDataService to get flattened program data
-            program_data_service = ProgramDataService(program.id)
-            flat_data = program_data_service.get_flat_program_data()
-            print(flat_data)
-            
             # Extract relevant metadata for the program
-            metadata = self.extract_metadata_program(flat_data)
+            metadata = self.extract_metadata_program(record)
 
             # Extract funding details
-            funding_metadata = self.extract_funding_data(flat_data)
+            funding_metadata = self.extract_funding_data(record.fundings)
             print("extracted metadata:", metadata)
 
             # Create unique embedding ID for each program
@@ -524,16 +615,16 @@ class DjangoToChromaDBIngest:
                 "program_id": metadata['program_id'],
                 "program_title": metadata['program_title'],
                 # "program_description": metadata['program_description'],
-                "funding_available": "True" if len(funding_metadata['funding_id']) > 0 else "False",
-                "funding_for": "|".join(funding_metadata['funding_for']),  # 'International|International'
-                "funding_type": "|".join(funding_metadata['funding_type']),  # 'RA|TA'
-                "funding_opportunity_for": "|".join(funding_metadata['funding_opportunity_for']),# 'International|International'
+                "funding_available": len(funding_metadata['funding_id']) > 0,
+                # Expanded into one flag per choice by the schema, e.g. funding_type_RA
+                "funding_for": funding_metadata['funding_for'],
+                "funding_type": funding_metadata['funding_type'],
+                "funding_opportunity_for": funding_metadata['funding_opportunity_for'],
                 "IELTS": metadata['IELTS'],
                 "TOEFL": metadata['TOEFL'], 
                 "GRE": metadata['GRE'],
                 "DUOLINGO": metadata['DUOLINGO'],
                 "CGPA": metadata['CGPA'],
-                "application_process": metadata['application_process'],
                 "application_fee": metadata['application_fee'],
                 "application_end_date": metadata['application_end_date'] ,
                 "department_name": metadata['department_name'],
@@ -547,17 +638,18 @@ class DjangoToChromaDBIngest:
             }
 
             # vector_metadata.update(funding_metadata)
+            vector_metadata = PROGRAM_SCHEMA.encode(vector_metadata)
 
             print("Metadata: ", vector_metadata)
             # print("Text: ", program_text_to_embed)
             
-            # Insert embedding into ChromaDB
-            collection.add( 
-                documents=[program_text_to_embed],
-                metadatas=[vector_metadata],
-                ids=[embedding_id]
-            )
+            documents.append(program_text_to_embed)
+            metadatas.append(vector_metadata)
+            ids.append(embedding_id)
 
+        # Insert embeddings into ChromaDB
+        scope_ids = None if program_ids is None else [f"program_{program_id}" for program_id in program_ids]
+        self.sync_documents(collection, documents, metadatas, ids, incremental, scope_ids=scope_ids)
         print("program data ingest done")
 
         return 0
@@ -730,281 +822,50 @@ class DjangoToChromaDBIngest:
     
 
     def extract_clean_text(self,input_text):
-        # Remove HTML tags
-        soup = BeautifulSoup(input_text, 'html.parser')
-        text = soup.get_text(separator="\n")  # Get plain text with newline separators
-        
-        # Remove Unicode private use area characters
-        text = re.sub(r'[\ue200-\ue204]', '', text)
-        
-        # Clean up any extra whitespace or newlines
-        text = re.sub(r'\n+', '\n', text).strip()
-        
-        return text
+        return clean_html_text(input_text)
     
     def extract_criteria(self, eligibility_text):
-        # Initialize the result dictionary with None values
-        criteria = {
-            "IELTS": "",
-            "TOEFL": "",
-            "DUOLINGO": "",
-            "GRE": "",
-            "CGPA": ""
-        }
-        
-        # Patterns to extract each criterion
-        patterns = {
-            "IELTS": r"IELTS\s+(\d+(\.\d+)?)",
-            "TOEFL": r"TOEFL\s+(\d+)",
-            "DUOLINGO": r"DUOLINGO\s+(\d+)",
-            "GRE": r"GRE\s+(\d+)",
-            "CGPA": r"CGPA\s+(\d+(\.\d+)?)"
-        }
-        
-        # Search each pattern in the eligibility text and update criteria if found
-        for key, pattern in patterns.items():
-            match = re.search(pattern, eligibility_text, re.IGNORECASE)
-            if match:
-                criteria[key] = float(match.group(1))  # Extracted value
-        
-        return criteria
+        return parse_requirements(eligibility_text)
     
     def extract_criteria_with_llm(self, eligibility_text):
-
-        client = OpenAI(api_key= os.getenv("OPENAI_API_KEY")) 
-        # Initialize the result dictionary with None values
-        criteria = {
-            "IELTS": "",
-            "TOEFL": "",
-            "DUOLINGO": "",
-            "GRE": "",
-            "CGPA": ""
+        return parse_requirements_with_llm(eligibility_text)
+
+    def extract_funding_data(self, fundings):
+        """Funding attributes of FundingRecords as one list per attribute"""
+        return {
+            "funding_id": [funding.funding_id for funding in fundings],
+            "funding_for": [funding.funding_for for funding in fundings],
+            "funding_type": [funding.funding_type for funding in fundings],
+            "funding_opportunity_for": [funding.funding_opportunity_for for funding in fundings],
+            "title_of_funding": [funding.title_of_funding for funding in fundings],
+            "description": [funding.description for funding in fundings],
         }
-        
-        system_message = """
-        You are a data extractor. Given a graduate/ undergraduate program requirement description that includes standardized test and minimum scores, along with CGPA requirements. You will look for the standardized tests like IELTS, TOEFL, DUOLINGO, SAT, GRE, LSAT and other tests and minimum CGPA requirements and extract the score. If a score is not found, keep it None
-        """
-
-
-
-        custom_functions = [{
-            "type": "function",
-            "function": {
-            'name': 'extract_test_scores',
-            'strict': True,
-            'description':
-            'You are an expert data analyst. Based on an open-ended question, you will identify the relevant factors to investigate and generate fields of a dataset with descriptions and explanations for each field.',
-            'parameters': {
-                'type': 'object',
-                'properties': {
-                    'fields': {
-                        'type': 'array',
-                        'description': 'You are a data extractor. Given a graduate/ undergraduate program requirement description that includes standardized test and minimum scores, along with CGPA requirements. You will look for the standardized tests like IELTS, TOEFL, DUOLINGO, SAT, GRE, LSAT and other tests and minimum CGPA requirements and extract the score',
-                        'items': {
-                            'type': 'object',
-
-                            "properties": {
-                                "IELTS": {
-                                        "type": "number",
-                                        "description": "English proficiency test often required by non-native speakers"
-                                    },
-                                    "TOEFL": {
-                                        "type": "number",
-                                        "description": "For non-native English speakers; assesses English proficiency"
-                                    },
-                                    "SAT": {
-                                        "type": "number",
-                                        "description": "Scholastic Assessment Test"
-                                    },
-                                "GRE": {
-                                        "type": "number",
-                                        "description": "Graduate Record Examination"
-                                    },
-                                    "GMAT": {
-                                        "type": "number",
-                                        "description": "Graduate Management Admission Test"
-                                    },
-                                    "MAT": {
-                                        "type": "number",
-                                        "description": "Miller Analogies Test"
-                                    },
-                                "CGPA": {
-                                        "type": "number",
-                                        "description": "Minimum CGPA required for the program "
-                                    },
-                                "DUOLINGO": {
-                                    "type": "number",
-                                    "description": "English proficiency test"
-                                },
-                                },
-                            "required": ["IELTS", "TOEFL", "SAT", "GRE", "GMAT", "MAT", "CGPA", "DUOLINGO"],
-                            "additionalProperties": False,
-                        },
-                    },
-                },
-                "required": ["fields"],
-                "additionalProperties": False,
-            }}
-        }] 
-
-        response = client.chat.completions.create(
-        model="gpt-4o",
-        temperature=0,
-        messages=[
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": eligibility_text}
-        ],
-        tools=custom_functions,
-        tool_choice={"type": "function", "function": {"name": "extract_test_scores"}})
-
-        response_message = response.choices[0].message
-        tool_calls = response_message.tool_calls
-
-        extracted_json = {}
-        for tool_call in tool_calls:
-            # print(f"Function: {tool_call.function.name}")
-            # print(f"Params:{tool_call.function.arguments}")
-
-            arguments = json.loads(tool_call.function.arguments)
-            # print(arguments['fields'][0])
-            # print(type(arguments['fields']))
-            extracted_json = arguments['fields'][0]
-        
-        return extracted_json
-
-    def extract_funding_data(self, data):
-            # Initialize empty lists for each funding attribute
-            funding_data = {
-                "funding_id": [],
-                "funding_for": [],
-                "funding_type": [],
-                "funding_opportunity_for": [],
-                "title_of_funding": [],
-                "description": []
-            }
-
-            # Loop over the data to find funding keys
-            for key, value in data.items():
-                # print(key)
-                # Check for funding_id and add it to the list
-                if key.startswith("funding_") and "_id" in key and isinstance(value, int):
-                    funding_data["funding_id"].append(value)
-                
-                # Check for funding_for and add it to the list
-                elif key.startswith("funding_") and key.endswith("funding_for") and value is not None:
-                    funding_data["funding_for"].append(value)
-                
-                # Check for funding_type and add it to the list
-                elif key.startswith("funding_") and "_funding_type" in key and value is not None:
-                    funding_data["funding_type"].append(value)
-                
-                # Check for funding_opportunity_for and add it to the list
-                elif key.startswith("funding_") and "_funding_opportunity_for" in key and value is not None:
-                    funding_data["funding_opportunity_for"].append(value)
-                
-                # Check for title_of_funding and add it to the list
-                elif key.startswith("funding_") and "_title_of_funding" in key and value is not None:
-                    funding_data["title_of_funding"].append(value)
-                
-                # Check for funding description (assuming a description field exists)
-                elif key.startswith("funding_") and "_description" in key and value is not None:
-                    funding_data["description"].append(value)
-
-            return funding_data
-
-
-    def extract_metadata_program(self, flat_data):
-        metadata = {}
- 
-        # Helper function to safely get keys
-        def safe_get_key(prefix, suffix):
-            try:
-                return next(key for key in flat_data if key.startswith(prefix) and key.endswith(suffix))
-            except StopIteration:
-                return None
-            
-        
-        # Extract program details
-        program_id_key = safe_get_key("program_", "_id")
-        if program_id_key:
-            program_id = flat_data[program_id_key]
-            metadata['program_id'] = program_id
-
-            program_title_key = safe_get_key(f"program_{program_id}_", "_title")
-            metadata['program_title'] = flat_data.get(program_title_key)
 
-            program_description_key = safe_get_key(f"program_{program_id}_", "_description")
-            metadata['program_description'] = self.extract_clean_text(flat_data.get(program_description_key))
 
-            eligibility_criteria_key = safe_get_key(f"program_{program_id}_", "_eligibility_criteria")
-            eligibility_criteria_dict = self.extract_criteria_with_llm(self.extract_clean_text(flat_data.get(eligibility_criteria_key)))
-            metadata.update(eligibility_criteria_dict)
-            
-
-            application_process_key = safe_get_key(f"program_{program_id}_", "_application_process")
-            metadata['application_process'] = flat_data.get(application_process_key)
-
-            application_fee_key = safe_get_key(f"program_{program_id}_", "_application_fee")
-            metadata['application_fee'] = float(flat_data.get(application_fee_key))
-
-            application_end_date_key = safe_get_key(f"program_{program_id}_", "_application_end_date")
-            date_string = flat_data.get(application_end_date_key)
+    def extract_metadata_program(self, record):
+        """Metadata of a ProgramRecord"""
+        metadata = {
+            'program_id': record.program_id,
+            'program_title': record.title,
+            'program_description': self.extract_clean_text(record.description),
+            # Parsed once when the program is saved, see program_app.requirements
+            **record.requirements,
+            'application_fee': record.application_fee,
             # convert in timestamp
-            timestamp = int(time.mktime(datetime.strptime(date_string, "%Y-%m-%d").timetuple()))
-            metadata['application_end_date'] =  timestamp
-
-       
-            
-
-        # Extract department details
-        department_id_key = safe_get_key("department_", "_id")
-        if department_id_key:
-            department_id = flat_data[department_id_key]
-            metadata['department_id'] = department_id
-
-            department_name_key = safe_get_key(f"department_{department_id}_", "_name")
-            metadata['department_name'] = flat_data.get(department_name_key)
-
-        # Extract college details
-        college_id_key = safe_get_key("college_", "_id")
-        if college_id_key:
-            college_id = flat_data[college_id_key]
-            metadata['college_id'] = college_id
-
-            college_name_key = safe_get_key(f"college_{college_id}_", "_name")
-            metadata['college_name'] = flat_data.get(college_name_key)
-
-        # Extract campus details
-        campus_id_key = safe_get_key("campus_", "_id")
-        if campus_id_key:
-            campus_id = flat_data[campus_id_key]
-            metadata['campus_id'] = campus_id
-
-            campus_name_key = safe_get_key(f"campus_{campus_id}_", "_name")
-            metadata['campus_name'] = flat_data.get(campus_name_key)
-
-        # Extract organization details
-        organization_id_key = safe_get_key("organization_", "_id")
-        if organization_id_key:
-            organization_id = flat_data[organization_id_key]
-            metadata['organization_id'] = organization_id
-
-            organization_name_key = safe_get_key(f"organization_{organization_id}_", "_name")
-            metadata['organization_name'] = flat_data.get(organization_name_key)
-
-        # Extract common details
-        country_name_key = safe_get_key("", "_country_name")
-        metadata['country_name'] = flat_data.get(country_name_key)
-
-        country_code_key = safe_get_key("", "_country_code")
-        metadata['country_code'] = flat_data.get(country_code_key)
-
-        state_province_name_key = safe_get_key("", "_state_province_name")
-        metadata['state_province_name'] = flat_data.get(state_province_name_key)
-
-        city_key = safe_get_key("", "_city")
-        metadata['city'] = flat_data.get(city_key)
-
+            'application_end_date': int(time.mktime(record.application_end_date.timetuple())),
+            'department_id': record.department_id,
+            'department_name': record.department_name,
+            'college_id': record.college_id,
+            'college_name': record.college_name,
+            'campus_id': record.campus_id,
+            'campus_name': record.campus_name,
+            'organization_id': record.organization_id,
+            'organization_name': record.organization_name,
+            'country_name': record.country_name,
+            'country_code': record.country_code,
+            'state_province_name': record.state_province_name,
+            'city': record.city,
+        }
         return metadata
 
 
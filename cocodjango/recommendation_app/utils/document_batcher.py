@@ -0,0 +1,52 @@
+class DocumentBatcher:
+    """Buffers ids, documents and metadata and writes them to a collection in batches.
+
+    Every flush encodes the buffered documents with a single call to the
+    embedding function and writes them with a single add/upsert, instead of
+    one encode and one SQLite transaction per record. Records added with an
+    embedding of their own are written as they are, not encoded.
+    """
+
+    def __init__(self, collection, embed_documents, batch_size=32, method="add"):
+        self.collection = collection
+        self.embed_documents = embed_documents
+        self.batch_size = max(1, int(batch_size))
+        self.write = getattr(collection, method)
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        self.embeddings = []
+        self.written = 0
+
+    def add(self, embedding_id, document, metadata, embedding=None):
+        self.ids.append(embedding_id)
+        self.documents.append(document)
+        self.metadatas.append(metadata)
+        self.embeddings.append(embedding)
+        if len(self.ids) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.ids:
+            return
+        missing = [i for i, embedding in enumerate(self.embeddings) if embedding is None]
+        if missing:
+            encoded = self.embed_documents([self.documents[i] for i in missing])
+            for i, embedding in zip(missing, encoded):
+                self.embeddings[i] = embedding
+        self.write(
+            ids=self.ids,
+            documents=self.documents,
+            metadatas=self.metadatas,
+            embeddings=self.embeddings,
+        )
+        self.written += len(self.ids)
+        self.ids, self.documents, self.metadatas, self.embeddings = [], [], [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+        return False
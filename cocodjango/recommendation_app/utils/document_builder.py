@@ -0,0 +1,74 @@
+"""
+Embedding inputs cut to the model's token budget.
+
+The encoder truncates its input at its maximum sequence length anyway, so
+tokenizing whole multi-page résumés only costs time and silently drops the
+tail. DocumentBuilder cuts every input to RECOMMENDATION_EMBEDDING_MAX_TOKENS
+before it is encoded: only the first max_tokens * CHARS_PER_TOKEN characters
+of a text are ever read and tokenized, which bounds the encode time of one
+document, and how much was cut is reported with the result.
+"""
+from dataclasses import dataclass
+from django.conf import settings
+from common.text_extraction import truncate_to_tokens
+
+# Text averages about 4 characters per token, reading twice that always fills the budget
+CHARS_PER_TOKEN = 8
+
+
+@dataclass(slots=True)
+class BudgetedText:
+    text: str
+    tokens: int
+    # Characters of the source text left out
+    truncated_chars: int = 0
+
+    @property
+    def truncated(self):
+        return self.truncated_chars > 0
+
+
+class DocumentBuilder:
+    """Cuts texts to the token budget and keeps count of what was truncated"""
+
+    def __init__(self, max_tokens=None):
+        self.max_tokens = max_tokens or settings.RECOMMENDATION_EMBEDDING_MAX_TOKENS
+        self.max_chars = self.max_tokens * CHARS_PER_TOKEN
+        self.built = 0
+        self.truncated = 0
+        self.truncated_chars = 0
+
+    def _record(self, budgeted):
+        self.built += 1
+        if budgeted.truncated:
+            self.truncated += 1
+            self.truncated_chars += budgeted.truncated_chars
+        return budgeted
+
+    def fit(self, text, source_length=None):
+        """text cut to the budget. When text is already a prefix of a longer source, source_length is its length"""
+        source_length = len(text) if source_length is None else source_length
+        kept, tokens = truncate_to_tokens(text[:self.max_chars], self.max_tokens)
+        return self._record(BudgetedText(kept, tokens, max(0, source_length - len(kept))))
+
+    def fit_parts(self, parts, separator=", "):
+        """As many whole parts as fit the budget, in the order given (most important first).
+
+        Parts that no longer fit are left out whole rather than cut, except
+        a first part that is larger than the budget on its own.
+        """
+        parts = [part for part in parts if part]
+        source_length = len(separator.join(parts))
+        text, tokens = "", 0
+        for part in parts:
+            candidate = text + separator + part if text else part
+            kept, kept_tokens = truncate_to_tokens(candidate[:self.max_chars], self.max_tokens)
+            if kept != candidate:
+                if not text:
+                    text, tokens = kept, kept_tokens
+                break
+            text, tokens = candidate, kept_tokens
+        return self._record(BudgetedText(text, tokens, max(0, source_length - len(text))))
+
+    def report(self):
+        return f"{self.truncated} of {self.built} embedding inputs truncated to {self.max_tokens} tokens, {self.truncated_chars} characters left out"
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from django.conf import settings
+
+
+def normalize_text(text):
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by (model name, SHA-256 of the normalized text).
+
+    Vectors are stored as float32 blobs in a local SQLite file. Once the cache
+    holds more than max_entries vectors the least recently used ones are evicted.
+    """
+
+    def __init__(self, path, max_entries=200000):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache ("
+            " model_name TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " embedding BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model_name, text_hash))"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS embedding_cache_last_used ON embedding_cache (last_used)"
+        )
+        self._connection.commit()
+
+    def get_many(self, model_name, texts):
+        """Cached embeddings in the order of texts, None where there is no entry"""
+        hashes = [text_hash(text) for text in texts]
+        found = {}
+        with self._lock:
+            unique_hashes = list(set(hashes))
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique_hashes), 500):
+                chunk = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT text_hash, embedding FROM embedding_cache"
+                    f" WHERE model_name = ? AND text_hash IN ({placeholders})",
+                    [model_name, *chunk],
+                ).fetchall()
+                for row_hash, blob in rows:
+                    found[row_hash] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._connection.executemany(
+                    "UPDATE embedding_cache SET last_used = ? WHERE model_name = ? AND text_hash = ?",
+                    [(now, model_name, row_hash) for row_hash in found],
+                )
+                self._connection.commit()
+        return [found.get(h) for h in hashes]
+
+    def set_many(self, model_name, texts, embeddings):
+        now = time.time()
+        rows = [
+            (model_name, text_hash(text), array("f", embedding).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (model_name, text_hash, embedding, last_used)"
+                " VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        (count,) = self._connection.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._connection.execute(
+                "DELETE FROM embedding_cache WHERE rowid IN"
+                " (SELECT rowid FROM embedding_cache ORDER BY last_used LIMIT ?)",
+                (overflow,),
+            )
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Process-wide cache, or None when RECOMMENDATION_EMBEDDING_CACHE_PATH is empty"""
+    global _embedding_cache
+    if not settings.RECOMMENDATION_EMBEDDING_CACHE_PATH:
+        return None
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache(
+                    settings.RECOMMENDATION_EMBEDDING_CACHE_PATH,
+                    max_entries=settings.RECOMMENDATION_EMBEDDING_CACHE_MAX_ENTRIES,
+                )
+    return _embedding_cache
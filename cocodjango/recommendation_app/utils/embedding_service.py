@@ -0,0 +1,252 @@
+"""
+Local embedding service.
+
+One process (``manage.py run_embedding_service``) loads the sentence
+transformer once and serves encode requests over a Unix socket or localhost
+TCP. Requests arriving within a short window are merged into one model call.
+Django workers talk to it through EmbeddingServiceClient, which implements
+Chroma's embedding function interface, so nothing else has to change.
+
+Wire format: every message is a 4-byte big-endian length followed by a UTF-8
+JSON body. Requests are ``{"texts": [...]}``, responses are
+``{"embeddings": [[...], ...]}`` or ``{"error": "..."}``.
+
+The service always returns the model's full vectors. With
+RECOMMENDATION_EMBEDDING_DIMENSIONS set, get_embedding_function() cuts them
+to that many leading dimensions and re-normalizes them (Matryoshka
+truncation), so ingestion and queries get vectors of the same size.
+"""
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+from django.conf import settings
+
+HEADER = struct.Struct(">I")
+
+
+def parse_address(address):
+    """'unix:/path/to.sock' -> (AF_UNIX, path), 'host:port' -> (AF_INET, (host, port))"""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, port = address.rsplit(":", 1)
+    return socket.AF_INET, (host, int(port))
+
+
+def send_message(sock, payload):
+    body = json.dumps(payload).encode("utf-8")
+    sock.sendall(HEADER.pack(len(body)) + body)
+
+
+def receive_message(sock):
+    header = _receive_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    (length,) = HEADER.unpack(header)
+    body = _receive_exactly(sock, length)
+    if body is None:
+        return None
+    return json.loads(body.decode("utf-8"))
+
+
+def _receive_exactly(sock, size):
+    chunks = []
+    while size > 0:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+class _PendingRequest:
+    __slots__ = ("texts", "done", "embeddings", "error")
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.done = threading.Event()
+        self.embeddings = None
+        self.error = None
+
+
+class DynamicBatcher:
+    """Merges concurrent encode requests into one model call.
+
+    The first request opens a window of batch_window seconds; everything that
+    arrives before it closes (up to max_batch_size texts) is encoded together.
+    """
+
+    def __init__(self, encode, max_batch_size=64, batch_window=0.01):
+        self.encode = encode
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.requests = queue.Queue()
+        self.worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self.worker.start()
+
+    def submit(self, texts):
+        request = _PendingRequest(list(texts))
+        self.requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise RuntimeError(request.error)
+        return request.embeddings
+
+    def _collect_batch(self):
+        batch = [self.requests.get()]
+        size = len(batch[0].texts)
+        deadline = time.monotonic() + self.batch_window
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                embeddings = [list(map(float, embedding)) for embedding in self.encode(texts)]
+                offset = 0
+                for request in batch:
+                    request.embeddings = embeddings[offset:offset + len(request.texts)]
+                    offset += len(request.texts)
+            except Exception as e:
+                for request in batch:
+                    request.error = str(e)
+            for request in batch:
+                request.done.set()
+
+
+class _EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # A connection may carry any number of requests
+        while True:
+            try:
+                message = receive_message(self.request)
+            except (OSError, ValueError):
+                return
+            if message is None:
+                return
+            try:
+                response = {"embeddings": self.server.batcher.submit(message.get("texts", []))}
+            except Exception as e:
+                response = {"error": str(e)}
+            send_message(self.request, response)
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def create_embedding_server(address, model_name, max_batch_size=64, batch_window=0.01):
+    family, bind_address = parse_address(address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(bind_address):
+            os.remove(bind_address)
+        server = _ThreadingUnixServer(bind_address, _EmbeddingRequestHandler)
+    else:
+        server = _ThreadingTCPServer(bind_address, _EmbeddingRequestHandler)
+
+    embedding_function = SentenceTransformerEmbeddingFunction(model_name=model_name)
+    server.batcher = DynamicBatcher(embedding_function, max_batch_size=max_batch_size, batch_window=batch_window)
+    return server
+
+
+class EmbeddingServiceClient(EmbeddingFunction[Documents]):
+    """Chroma embedding function backed by the local embedding service"""
+
+    def __init__(self, address, timeout=60):
+        self.address = address
+        self.timeout = timeout
+
+    def __call__(self, input: Documents) -> Embeddings:
+        family, connect_address = parse_address(self.address)
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(connect_address)
+            send_message(sock, {"texts": list(input)})
+            response = receive_message(sock)
+        if response is None:
+            raise ConnectionError(f"Embedding service at {self.address} closed the connection")
+        if "error" in response:
+            raise RuntimeError(f"Embedding service error: {response['error']}")
+        return response["embeddings"]
+
+
+def truncate_embeddings(embeddings, dimensions):
+    """Leading dimensions of each embedding, L2-normalized again"""
+    vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)[:, :dimensions]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).tolist()
+
+
+class TruncatedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Wraps an embedding function to return Matryoshka-truncated vectors"""
+
+    def __init__(self, embedding_function, dimensions):
+        self.embedding_function = embedding_function
+        self.dimensions = dimensions
+
+    def __call__(self, input: Documents) -> Embeddings:
+        embeddings = self.embedding_function(input)
+        if len(embeddings) == 0:
+            return []
+        return truncate_embeddings(embeddings, self.dimensions)
+
+
+def get_embedding_model_key():
+    """Model name the embedding cache keys vectors by, with the output dimension when it is truncated"""
+    dimensions = settings.RECOMMENDATION_EMBEDDING_DIMENSIONS
+    model_name = settings.RECOMMENDATION_EMBEDDING_MODEL
+    return f"{model_name}@{dimensions}" if dimensions else model_name
+
+
+_embedding_function = None
+_embedding_function_lock = threading.Lock()
+
+
+def get_embedding_function():
+    """Embedding function shared by the whole process.
+
+    Uses the embedding service when RECOMMENDATION_EMBEDDING_SERVICE_ADDRESS is
+    set, otherwise loads the model in-process once. Vectors are truncated to
+    RECOMMENDATION_EMBEDDING_DIMENSIONS when it is set.
+    """
+    global _embedding_function
+    if _embedding_function is None:
+        with _embedding_function_lock:
+            if _embedding_function is None:
+                address = settings.RECOMMENDATION_EMBEDDING_SERVICE_ADDRESS
+                if address:
+                    embedding_function = EmbeddingServiceClient(address)
+                else:
+                    embedding_function = SentenceTransformerEmbeddingFunction(
+                        model_name=settings.RECOMMENDATION_EMBEDDING_MODEL
+                    )
+                dimensions = settings.RECOMMENDATION_EMBEDDING_DIMENSIONS
+                if dimensions:
+                    embedding_function = TruncatedEmbeddingFunction(embedding_function, dimensions)
+                _embedding_function = embedding_function
+    return _embedding_function
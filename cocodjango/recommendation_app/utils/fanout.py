@@ -0,0 +1,78 @@
+"""
+Concurrent branches of one request.
+
+fan_out() runs independent lookups (e.g. the program and the researcher
+query of a combined recommendation) on a bounded, process-wide thread pool
+and waits for each one only until its own deadline, so a slow collection
+cannot hold up the others. A branch that misses its deadline is reported
+as timed out; it still finishes in the background, the pool bounds how
+many of those can pile up.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from django.conf import settings
+from django.db import connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.RECOMMENDATION_FANOUT_WORKERS,
+                    thread_name_prefix="recommendation-fanout",
+                )
+    return _executor
+
+
+def _run_branch(function):
+    started = time.perf_counter()
+    try:
+        return function(), None, time.perf_counter() - started
+    except Exception as e:
+        return None, e, time.perf_counter() - started
+    finally:
+        # Connections are per thread, pool threads must not keep theirs open between requests
+        connections.close_all()
+
+
+def fan_out(branches, timeouts=None, default_timeout=None):
+    """Run {name: callable} concurrently.
+
+    Each branch gets timeouts[name] seconds (default_timeout otherwise),
+    counted from the start of the fan-out. Returns {name: outcome} where
+    outcome has the status ('ok', 'timeout' or 'error'), the result (None
+    unless ok), elapsed_ms and, for errors, the error message.
+    """
+    timeouts = timeouts or {}
+    default_timeout = default_timeout or settings.RECOMMENDATION_FANOUT_TIMEOUT
+    started = time.perf_counter()
+    futures = {name: get_executor().submit(_run_branch, function) for name, function in branches.items()}
+
+    outcomes = {}
+    for name, future in futures.items():
+        deadline = started + timeouts.get(name, default_timeout)
+        try:
+            result, error, elapsed = future.result(timeout=max(0.0, deadline - time.perf_counter()))
+        except FutureTimeoutError:
+            future.cancel()
+            outcomes[name] = {
+                'status': 'timeout',
+                'result': None,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+            }
+            continue
+        outcomes[name] = {
+            'status': 'ok' if error is None else 'error',
+            'result': result,
+            'elapsed_ms': round(elapsed * 1000, 1),
+        }
+        if error is not None:
+            print(f"Fan-out branch {name} failed:", error)
+            outcomes[name]['error'] = str(error)
+    return outcomes
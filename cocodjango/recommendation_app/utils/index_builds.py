@@ -0,0 +1,151 @@
+"""
+Blue/green rebuilds of the served Chroma collections.
+
+A full rebuild of e.g. program_documents is written to a new collection
+program_documents__v<version> next to the live one, which keeps serving
+queries meanwhile. finish_index_build() sanity-checks the new collection
+(document count, a sample query) and only then makes it the live version
+by switching the VectorIndexBuild pointer in one transaction. Readers
+resolve the pointer through chroma_registry, which re-checks it every
+RECOMMENDATION_INDEX_POINTER_TTL seconds, so no restart is needed. The
+replaced collection is dropped RECOMMENDATION_INDEX_GC_GRACE seconds later,
+once no reader can still hold it.
+
+Incremental writes made while a build runs only reach the live collection.
+Before the switch the build re-ingests every entity changed since it
+started, and whatever changes between that catch-up and the switch is
+queued again for the new live collection (see vector_sync).
+"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from ..models import VectorIndexBuild
+from .chroma_registry import chroma_registry
+
+VERSION_SEPARATOR = "__v"
+
+
+def logical_collection_name(name):
+    """program_documents for program_documents__v<version>"""
+    return name.split(VERSION_SEPARATOR, 1)[0]
+
+
+def is_build_collection(name):
+    return VERSION_SEPARATOR in name
+
+
+def is_served_collection(name):
+    return name in settings.RECOMMENDATION_CHROMADB_PATHS
+
+
+def get_client(name):
+    return chroma_registry.get_client(settings.RECOMMENDATION_CHROMADB_PATHS[name])
+
+
+def start_index_build(client, name, metadata=None):
+    """Create an empty versioned collection for a full rebuild of name"""
+    physical_name = f"{name}{VERSION_SEPARATOR}{time.time_ns()}"
+    collection = client.create_collection(name=physical_name, metadata=metadata)
+    VectorIndexBuild.objects.create(collection_name=name, physical_name=physical_name)
+    return collection
+
+
+def check_index_build(collection, expected_count=None):
+    """What is wrong with a finished build, None when it can go live"""
+    count = collection.count()
+    if expected_count is not None:
+        if count != expected_count:
+            return f"has {count} documents, expected {expected_count}"
+    else:
+        if count == 0:
+            return "is empty"
+        name = logical_collection_name(collection.name)
+        try:
+            live_count = get_client(name).get_collection(name=VectorIndexBuild.get_live_name(name)).count()
+        except Exception:
+            live_count = 0
+        if count < live_count * settings.RECOMMENDATION_INDEX_MIN_COUNT_RATIO:
+            return f"has {count} documents, the live index has {live_count}"
+
+    if count:
+        sample = collection.get(limit=1, include=["embeddings"])
+        result = collection.query(query_embeddings=[sample["embeddings"][0]], n_results=min(10, count))
+        if sample["ids"][0] not in result["ids"][0]:
+            return f"sample query for {sample['ids'][0]} did not return it"
+    return None
+
+
+def finish_index_build(collection, expected_count=None, embedding_function=None):
+    """Make a build the live version of its collection if it passes check_index_build, ValueError otherwise"""
+    # vector_sync imports the ingestor, which imports this module
+    from .vector_sync import catch_up_index_build, requeue_changed_since
+
+    name = logical_collection_name(collection.name)
+    client = get_client(name)
+    build = VectorIndexBuild.objects.get(physical_name=collection.name)
+
+    problem = check_index_build(collection, expected_count)
+    if problem:
+        build.status = VectorIndexBuild.FAILED
+        build.message = problem
+        build.save(update_fields=['status', 'message'])
+        try:
+            client.delete_collection(name=collection.name)
+        except Exception as e:
+            print(f"Failed to delete rejected build {collection.name}:", e)
+        raise ValueError(f"Index build {collection.name} {problem}, {name} was not switched")
+
+    caught_up_at = catch_up_index_build(collection, build.created_at, embedding_function)
+
+    # The collection served before the first build has the plain name and no row yet
+    legacy_exists = False
+    if not VectorIndexBuild.objects.filter(physical_name=name).exists():
+        try:
+            client.get_collection(name=name)
+            legacy_exists = True
+        except Exception:
+            pass
+
+    now = timezone.now()
+    with transaction.atomic():
+        VectorIndexBuild.objects.filter(collection_name=name, status=VectorIndexBuild.LIVE).update(
+            status=VectorIndexBuild.RETIRED, retired_at=now
+        )
+        if legacy_exists:
+            VectorIndexBuild.objects.create(
+                collection_name=name, physical_name=name, status=VectorIndexBuild.RETIRED, retired_at=now
+            )
+        build.status = VectorIndexBuild.LIVE
+        build.document_count = collection.count()
+        build.switched_at = now
+        build.save(update_fields=['status', 'document_count', 'switched_at'])
+
+    chroma_registry.reload(name)
+    requeue_changed_since(caught_up_at)
+    print(f"{name}: switched to {collection.name} ({build.document_count} documents)")
+    gc_index_builds(name)
+    return build
+
+
+def gc_index_builds(name=None, grace=None):
+    """Drop collections retired more than grace seconds ago. Returns their names"""
+    grace = settings.RECOMMENDATION_INDEX_GC_GRACE if grace is None else grace
+    builds = VectorIndexBuild.objects.filter(
+        status=VectorIndexBuild.RETIRED, retired_at__lt=timezone.now() - timedelta(seconds=grace)
+    )
+    if name is not None:
+        builds = builds.filter(collection_name=name)
+
+    deleted = []
+    for build in builds:
+        try:
+            get_client(build.collection_name).delete_collection(name=build.physical_name)
+        except Exception as e:
+            # Already gone, nothing left to free
+            print(f"Failed to delete retired collection {build.physical_name}:", e)
+        build.status = VectorIndexBuild.DELETED
+        build.save(update_fields=['status'])
+        deleted.append(build.physical_name)
+    return deleted
@@ -0,0 +1,302 @@
+import os
+import socket
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from program_app.models import Program
+from ..models import IngestionJob
+from .chroma_registry import chroma_registry, get_collection_metadata
+from .chromadb_ingest_user_data import DjangoToChromaDBIngest, RESEARCH_ROLES
+from .index_builds import finish_index_build, start_index_build
+from .profile_sections import get_entity_id, get_section_collection_name
+from .recommendation_cache import bump_index_versions
+from .vector_index import refresh_numpy_index
+
+
+class IngestionJobTakenOver(Exception):
+    """The job was reclaimed by another worker, this one must stop without touching it"""
+
+
+class IngestionStage:
+    """How one collection is ingested by id batches"""
+
+    def __init__(self, collection_name, method_name, ids_argument, embedding_id_prefix, get_queryset):
+        self.collection_name = collection_name
+        self.method_name = method_name
+        self.ids_argument = ids_argument
+        self.embedding_id_prefix = embedding_id_prefix
+        self.get_queryset = get_queryset
+
+    def entity_ids(self, after_id=0):
+        return self.get_queryset().filter(id__gt=after_id).order_by('id').values_list('id', flat=True).distinct()
+
+    def embedding_id(self, entity_id):
+        return f"{self.embedding_id_prefix}{entity_id}"
+
+
+INGESTION_STAGES = [
+    IngestionStage(
+        'researcher_user_documents', 'ingest_researcher_user_documents', 'user_ids', '',
+        lambda: User.objects.filter(userdetails__user_type__in=RESEARCH_ROLES),
+    ),
+    IngestionStage(
+        'student_user_documents', 'ingest_student_user_documents', 'user_ids', '',
+        lambda: User.objects.filter(groups__name='Student'),
+    ),
+    IngestionStage(
+        'program_documents', 'ingest_program_documents', 'program_ids', 'program_',
+        lambda: Program.objects.all(),
+    ),
+]
+
+INGESTION_COLLECTIONS = [stage.collection_name for stage in INGESTION_STAGES]
+
+
+def create_ingestion_job(incremental=False, collections=None, created_by=None):
+    collections = collections or INGESTION_COLLECTIONS
+    unknown = set(collections) - set(INGESTION_COLLECTIONS)
+    if unknown:
+        raise ValueError(f"Unknown collections: {', '.join(sorted(unknown))}")
+    return IngestionJob.objects.create(
+        incremental=incremental,
+        collections=[name for name in INGESTION_COLLECTIONS if name in collections],
+        created_by=created_by,
+    )
+
+
+def requeue_ingestion_job(job):
+    """Queue a failed job again, it resumes from its last checkpoint"""
+    if job.status != IngestionJob.FAILED:
+        raise ValueError(f"Only failed jobs can be resumed, job {job.id} is {job.status}.")
+    job.status = IngestionJob.QUEUED
+    job.message = ''
+    job.finished_at = None
+    job.save(update_fields=['status', 'message', 'finished_at'])
+    return job
+
+
+def get_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_ingestion_job(worker=None, stale_after=None):
+    """Take the oldest queued job, or a running job whose worker stopped checkpointing"""
+    stale_after = stale_after or settings.RECOMMENDATION_INGESTION_JOB_STALE_AFTER
+    stale_before = timezone.now() - timedelta(seconds=stale_after)
+    with transaction.atomic():
+        job = (
+            IngestionJob.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=IngestionJob.QUEUED) | Q(status=IngestionJob.RUNNING, heartbeat_at__lt=stale_before))
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        now = timezone.now()
+        job.status = IngestionJob.RUNNING
+        job.worker = worker or get_worker_name()
+        job.heartbeat_at = now
+        job.started_at = job.started_at or now
+        job.save(update_fields=['status', 'worker', 'heartbeat_at', 'started_at'])
+    return job
+
+
+def checkpoint_ingestion_job(job, *fields):
+    """Save fields of a job this worker still holds, refreshing its heartbeat.
+
+    The update only matches while the job is running under job.worker, so a
+    worker whose job was reclaimed as stale cannot overwrite the progress of
+    the worker that took it over, it gets IngestionJobTakenOver instead.
+    """
+    job.heartbeat_at = timezone.now()
+    values = {field: getattr(job, field) for field in (*fields, 'heartbeat_at')}
+    updated = IngestionJob.objects.filter(
+        id=job.id, worker=job.worker, status=IngestionJob.RUNNING
+    ).update(**values)
+    if not updated:
+        raise IngestionJobTakenOver(f"Ingestion job {job.id} was taken over by another worker.")
+
+
+def heartbeat_ingestion_job(job, interval=None):
+    """Refresh the heartbeat of a running job from inside a batch, at most every interval seconds"""
+    interval = interval or settings.RECOMMENDATION_INGESTION_JOB_HEARTBEAT_INTERVAL
+    if job.heartbeat_at and (timezone.now() - job.heartbeat_at).total_seconds() < interval:
+        return
+    checkpoint_ingestion_job(job)
+
+
+def ingest_batch(ingestor, stage, entity_ids):
+    """Ingest a batch, falling back to one entity at a time to isolate the records that fail.
+
+    Returns the per-record errors. When every record of a multi-record batch
+    fails the problem is not the records (embedding service down, ...), so the
+    error is raised and the job stops at its last checkpoint.
+    """
+    ingest = getattr(ingestor, stage.method_name)
+    try:
+        ingest(**{stage.ids_argument: entity_ids})
+        return []
+    except IngestionJobTakenOver:
+        raise
+    except Exception as e:
+        if len(entity_ids) == 1:
+            return [{'collection': stage.collection_name, 'entity_id': entity_ids[0], 'error': str(e)}]
+        batch_error = e
+
+    errors = []
+    for entity_id in entity_ids:
+        try:
+            ingest(**{stage.ids_argument: [entity_id]})
+        except IngestionJobTakenOver:
+            raise
+        except Exception as e:
+            errors.append({'collection': stage.collection_name, 'entity_id': entity_id, 'error': str(e)})
+    if len(errors) == len(entity_ids):
+        raise batch_error
+    return errors
+
+
+def prune_collection(collection, stage, get_embedding_id=None):
+    """Delete the vectors of entities that no longer exist, incremental batches only diff their own ids.
+
+    get_embedding_id maps a stored id to the entity's embedding id, for
+    collections holding several records per entity.
+    """
+    current_ids = {stage.embedding_id(entity_id) for entity_id in stage.entity_ids()}
+    removed_ids = [
+        stored_id for stored_id in collection.get(include=[])["ids"]
+        if (get_embedding_id(stored_id) if get_embedding_id else stored_id) not in current_ids
+    ]
+    if removed_ids:
+        collection.delete(ids=removed_ids)
+    return removed_ids
+
+
+def run_ingestion_job(job, embedding_function, batch_size=None):
+    """Run a claimed job from its last checkpoint to the end"""
+    batch_size = batch_size or settings.RECOMMENDATION_INGESTION_JOB_BATCH_SIZE
+    paths = settings.RECOMMENDATION_CHROMADB_PATHS
+
+    if not job.total:
+        job.total = sum(
+            stage.entity_ids().count() for stage in INGESTION_STAGES if stage.collection_name in job.collections
+        )
+        checkpoint_ingestion_job(job, 'total')
+
+    for stage in INGESTION_STAGES:
+        if stage.collection_name not in job.collections or stage.collection_name in job.completed_collections:
+            continue
+
+        ingestor = DjangoToChromaDBIngest(embedding_function, output_path=paths[stage.collection_name])
+        ingestor.defer_index_refresh = True
+        # Batches can outlast the stale timeout, the heartbeat must not wait for their checkpoint
+        ingestor.heartbeat = lambda: heartbeat_ingestion_job(job)
+        client = chroma_registry.get_client(ingestor.output_path)
+
+        if job.current_collection != stage.collection_name:
+            # A full rebuild fills a new build collection while the live one keeps serving
+            job.build_collection = '' if job.incremental else start_index_build(
+                client, stage.collection_name, metadata=get_collection_metadata(stage.collection_name)
+            ).name
+            job.current_collection = stage.collection_name
+            job.last_entity_id = 0
+            checkpoint_ingestion_job(job, 'build_collection', 'current_collection', 'last_entity_id')
+        if job.build_collection:
+            ingestor.collection_overrides[stage.collection_name] = job.build_collection
+
+        while True:
+            entity_ids = list(stage.entity_ids(job.last_entity_id)[:batch_size])
+            if not entity_ids:
+                break
+            started = time.monotonic()
+            errors = ingest_batch(ingestor, stage, entity_ids)
+
+            job.last_entity_id = entity_ids[-1]
+            job.processed += len(entity_ids)
+            job.errors = job.errors + errors
+            job.active_seconds += time.monotonic() - started
+            checkpoint_ingestion_job(job, 'last_entity_id', 'processed', 'errors', 'active_seconds')
+
+        collection = ingestor.get_collection(client, stage.collection_name, incremental=True)
+        if job.incremental:
+            prune_collection(collection, stage)
+        else:
+            try:
+                finish_index_build(collection, embedding_function=embedding_function)
+            except ValueError:
+                # The build was dropped and the live collection left as it was, a requeue rebuilds the stage
+                job.current_collection = ''
+                job.build_collection = ''
+                checkpoint_ingestion_job(job, 'current_collection', 'build_collection')
+                raise
+        refresh_numpy_index(collection)
+        bump_index_versions(stage.collection_name, [], incremental=False)
+
+        section_collection_name = get_section_collection_name(stage.collection_name)
+        if section_collection_name:
+            # Batches always write sections into the live section collection
+            section_collection = ingestor.get_collection(client, section_collection_name, incremental=True)
+            prune_collection(section_collection, stage, get_entity_id)
+            refresh_numpy_index(section_collection)
+
+        job.completed_collections = job.completed_collections + [stage.collection_name]
+        job.current_collection = ''
+        job.build_collection = ''
+        job.last_entity_id = 0
+        checkpoint_ingestion_job(
+            job, 'completed_collections', 'current_collection', 'build_collection', 'last_entity_id'
+        )
+
+    job.status = IngestionJob.DONE
+    job.finished_at = timezone.now()
+    checkpoint_ingestion_job(job, 'status', 'finished_at')
+    return job
+
+
+def process_ingestion_job(embedding_function, worker=None, batch_size=None):
+    """Claim and run one job. Returns the job, or None when there was nothing to do"""
+    job = claim_ingestion_job(worker)
+    if job is None:
+        return None
+    try:
+        run_ingestion_job(job, embedding_function, batch_size=batch_size)
+    except IngestionJobTakenOver:
+        # The worker that reclaimed the job owns its status now, job is left RUNNING
+        pass
+    except Exception as e:
+        job.status = IngestionJob.FAILED
+        job.message = str(e)
+        job.finished_at = timezone.now()
+        try:
+            checkpoint_ingestion_job(job, 'status', 'message', 'finished_at')
+        except IngestionJobTakenOver:
+            job.status = IngestionJob.RUNNING
+    return job
+
+
+def get_job_status(job):
+    throughput = job.throughput()
+    eta_seconds = job.eta_seconds()
+    return {
+        'id': job.id,
+        'status': job.status,
+        'incremental': job.incremental,
+        'collections': job.collections,
+        'completed_collections': job.completed_collections,
+        'current_collection': job.current_collection,
+        'processed': job.processed,
+        'total': job.total,
+        'throughput_per_second': round(throughput, 3) if throughput is not None else None,
+        'eta_seconds': round(eta_seconds) if eta_seconds is not None else None,
+        'error_count': len(job.errors),
+        'errors': job.errors,
+        'message': job.message,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'heartbeat_at': job.heartbeat_at,
+        'finished_at': job.finished_at,
+    }
@@ -0,0 +1,110 @@
+"""
+Just-in-time embedding of a student's profile vector.
+
+A student who registered or edited their profile after the last ingestion
+has no vector, or an outdated one, in student_user_documents. When a
+recommendation has to be computed for them, get_student_vector_record()
+embeds just that user synchronously (ingest_student_user_documents for one
+id, which diffs and upserts only their records) before the query runs.
+
+A vector is stale when UserDetails.updated_at or a pending VectorSyncQueue
+entry for the user is newer than the embedded_at stamp of the vector, or
+than the last on-demand sync of the user if that found nothing to re-embed.
+Concurrent requests for the same user wait on a lock in the recommendations
+cache, so with a shared cache the user is embedded once across all workers.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import caches
+from profile_app.models import UserDetails
+from ..models import VectorSyncQueue
+from .chromadb_ingest_user_data import DjangoToChromaDBIngest
+from .embedding_service import get_embedding_function
+from .vector_index import get_vector_index
+
+COLLECTION_NAME = "student_user_documents"
+# How long an on-demand sync that found the vector current is remembered
+SYNC_MARK_TTL = 24 * 3600
+
+
+def get_cache():
+    return caches[settings.RECOMMENDATION_RESULTS_CACHE_ALIAS]
+
+
+@contextmanager
+def user_embedding_lock(user_id, timeout=None, wait=None):
+    """Held by the one request embedding user_id, TimeoutError after waiting wait seconds for it"""
+    timeout = timeout or settings.RECOMMENDATION_JIT_EMBEDDING_LOCK_TIMEOUT
+    wait = settings.RECOMMENDATION_JIT_EMBEDDING_WAIT if wait is None else wait
+    cache = get_cache()
+    key = f"embedding-lock:{user_id}"
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    while not cache.add(key, token, timeout):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Timed out waiting for the profile of user {user_id} to be embedded.")
+        time.sleep(0.1)
+    try:
+        yield
+    finally:
+        # The lock may have expired and been taken by another request meanwhile
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+def is_vector_stale(user_id, metadata):
+    """Whether the profile changed after the user's vector was embedded"""
+    pending = VectorSyncQueue.pending().filter(entity_type=VectorSyncQueue.USER, entity_id=user_id)
+    # An unchanged profile is not rewritten, so its vector keeps the stamp of the run that embedded it
+    stamps = [(metadata or {}).get("embedded_at"), get_cache().get(f"embedding-synced:{user_id}")]
+    embedded_at = max([stamp for stamp in stamps if stamp], default=None)
+    if embedded_at is None:
+        # Embedded before vectors were stamped, only a queued edit tells it is outdated
+        return pending.exists()
+    embedded_at = datetime.fromtimestamp(embedded_at, tz=dt_timezone.utc)
+    return (
+        pending.filter(dirty_at__gt=embedded_at).exists()
+        or UserDetails.objects.filter(user_id=user_id, updated_at__gt=embedded_at).exists()
+    )
+
+
+def _get_record(index, user_id):
+    record = index.get(f"{user_id}", include=['embeddings', 'documents', 'metadatas'])
+    if not record['ids']:
+        return None
+    if is_vector_stale(user_id, record['metadatas'][0]):
+        return None
+    return record
+
+
+def get_student_vector_record(user, embedding_function=None):
+    """The user's record in student_user_documents, embedded on the spot when missing or stale.
+
+    Returns the get() result of the collection, ValueError when the user has
+    no profile that can be embedded.
+    """
+    index = get_vector_index(COLLECTION_NAME)
+    record = _get_record(index, user.id)
+    if record is not None:
+        return record
+
+    with user_embedding_lock(user.id):
+        # Another request may have embedded the user while this one waited
+        record = _get_record(index, user.id)
+        if record is not None:
+            return record
+        print(f"Embedding the profile of user {user.id} on demand")
+        synced_at = time.time()
+        DjangoToChromaDBIngest(
+            embedding_function or get_embedding_function(),
+            output_path=settings.RECOMMENDATION_CHROMADB_PATHS[COLLECTION_NAME],
+        ).ingest_student_user_documents(user_ids=[user.id])
+        get_cache().set(f"embedding-synced:{user.id}", synced_at, SYNC_MARK_TTL)
+
+    record = index.get(f"{user.id}", include=['embeddings', 'documents', 'metadatas'])
+    if not record['ids']:
+        raise ValueError("Your profile has nothing to recommend from yet, please complete it first.")
+    return record
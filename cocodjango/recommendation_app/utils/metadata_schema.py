@@ -0,0 +1,169 @@
+"""
+Declared metadata layout of the searchable collections.
+
+Every field that is filtered on has one type in the index:
+
+- numeric fields always hold a float. A missing value is stored as a
+  sentinel that passes the field's filter, e.g. -1 for a minimum score
+  compared with $lte, so filters need no `$or {field: ""}` branch.
+- multi-valued fields (funding types, ...) become one boolean key per
+  choice, e.g. funding_type_RA, so they can be matched with a plain $eq.
+- booleans are stored as bools.
+
+Bulky free text (application_process) stays out of the metadata, it is not
+filtered on and only makes the index larger. decode() turns stored metadata
+back into the shape the API has always returned.
+"""
+import re
+import time
+from datetime import datetime
+from funding_app.models import Funding
+
+# Lower than any real minimum, so a program without a requirement passes `$lte score`
+NO_MINIMUM = -1.0
+# 9999-12-31, so a program without a deadline passes `$gt date`
+NO_DEADLINE = 253402300799.0
+
+TRUE_VALUES = ('true', '1', 'yes')
+
+
+def parse_number(value):
+    return float(value)
+
+
+def parse_date(value):
+    return float(time.mktime(datetime.strptime(value, "%Y-%m-%d").timetuple()))
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def flag_key(name, choice):
+    return f"{name}_{re.sub(r'[^0-9A-Za-z]+', '_', str(choice))}"
+
+
+class NumericField:
+    """A number compared with operator, missing stands in for "no value" """
+
+    def __init__(self, name, operator, missing, parse=parse_number):
+        self.name = name
+        self.operator = operator
+        self.missing = missing
+        self.parse = parse
+
+
+class FlagsField:
+    """A multi-valued field stored as one boolean key per choice"""
+
+    def __init__(self, name, choices):
+        self.name = name
+        self.choices = list(choices)
+
+
+class MetadataSchema:
+    def __init__(self, numeric=(), flags=(), booleans=(), exact=(), excluded=()):
+        self.numeric = {field.name: field for field in numeric}
+        self.flags = {field.name: field for field in flags}
+        self.booleans = set(booleans)
+        self.exact = set(exact)
+        self.excluded = set(excluded)
+
+    def encode(self, metadata):
+        """Metadata as it is written to the index. Flag fields take a list of values"""
+        encoded = {}
+        for key, value in metadata.items():
+            if key in self.excluded:
+                continue
+            if key in self.numeric:
+                field = self.numeric[key]
+                encoded[key] = field.missing if value in (None, "") else float(value)
+            elif key in self.flags:
+                values = value.split("|") if isinstance(value, str) else (value or [])
+                for choice in self.flags[key].choices:
+                    encoded[flag_key(key, choice)] = choice in values
+            elif key in self.booleans:
+                encoded[key] = parse_bool(value)
+            else:
+                # Chroma does not accept None
+                encoded[key] = "" if value is None else value
+        return encoded
+
+    def decode(self, metadata):
+        """Stored metadata in the shape returned by the API"""
+        decoded = dict(metadata)
+        for key, field in self.numeric.items():
+            if decoded.get(key) == field.missing:
+                decoded[key] = ""
+        for key, field in self.flags.items():
+            keys = [flag_key(key, choice) for choice in field.choices]
+            if any(k in decoded for k in keys):
+                decoded[key] = "|".join(
+                    choice for choice, k in zip(field.choices, keys) if decoded.pop(k, False)
+                )
+        for key in self.booleans:
+            if isinstance(decoded.get(key), bool):
+                decoded[key] = "True" if decoded[key] else "False"
+        return decoded
+
+    def compile_filters(self, filters):
+        """The simplest Chroma where clause for request filters, None when nothing is filtered.
+
+        Empty values are ignored, list values match any of their items.
+        Keys that are not in the schema are ignored.
+        """
+        clauses = []
+        for key, value in filters.items():
+            if value in (None, "", "null") or value == []:
+                continue
+            values = value if isinstance(value, (list, tuple)) else [value]
+            if key in self.numeric:
+                field = self.numeric[key]
+                clauses.append({key: {field.operator: field.parse(value)}})
+            elif key in self.flags:
+                flag_clauses = [{flag_key(key, item): True} for item in values]
+                clauses.append(flag_clauses[0] if len(flag_clauses) == 1 else {"$or": flag_clauses})
+            elif key in self.booleans:
+                clauses.append({key: parse_bool(value)})
+            elif key in self.exact:
+                clauses.append({key: values[0]} if len(values) == 1 else {key: {"$in": list(values)}})
+
+        if not clauses:
+            return None
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"$and": clauses}
+
+
+FUNDING_FLAGS = [
+    FlagsField("funding_for", [choice for choice, _ in Funding.FUNDING_FOR_CHOICES]),
+    FlagsField("funding_type", [choice for choice, _ in Funding.FUNDING_TYPE_CHOICES]),
+    FlagsField("funding_opportunity_for", [choice for choice, _ in Funding.FUNDING_OPPORTUNITY]),
+]
+
+PROGRAM_SCHEMA = MetadataSchema(
+    numeric=[
+        NumericField("CGPA", "$lte", NO_MINIMUM),
+        NumericField("IELTS", "$lte", NO_MINIMUM),
+        NumericField("TOEFL", "$lte", NO_MINIMUM),
+        NumericField("GRE", "$lte", NO_MINIMUM),
+        NumericField("DUOLINGO", "$lte", NO_MINIMUM),
+        NumericField("application_fee", "$lte", NO_MINIMUM),
+        NumericField("application_end_date", "$gt", NO_DEADLINE, parse=parse_date),
+    ],
+    flags=FUNDING_FLAGS,
+    booleans=["funding_available"],
+    exact=[
+        "organization_name", "department_name", "college_name", "country_name",
+        "state_province_name", "city",
+    ],
+    excluded=["application_process"],
+)
+
+RESEARCHER_SCHEMA = MetadataSchema(
+    flags=FUNDING_FLAGS,
+    booleans=["funding_available"],
+    exact=["organization_name", "department_name", "college_name", "city"],
+)
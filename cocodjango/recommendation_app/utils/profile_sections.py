@@ -0,0 +1,149 @@
+"""
+Per-section embeddings of student and researcher profiles.
+
+Each profile section (resume, SOP, publications, research interests,
+funding) is embedded on its own into the section collection of its profile
+collection (RECOMMENDATION_SECTION_COLLECTIONS), under the id
+<user id>:<section>. Because sections are diffed by content hash like any
+other record, editing one publication re-encodes the publications section
+only. Each section is cut to the embedding token budget by
+DocumentBuilder. The profile vector itself is the fusion of the section vectors, so it
+costs no model call at all.
+
+At query time the sections are fused again with RECOMMENDATION_SECTION_WEIGHTS:
+the student's query vector is the weighted sum of their section vectors,
+and researchers are ranked by the weighted mean of the similarity of each
+of their sections to it.
+"""
+import numpy as np
+from django.conf import settings
+from .vector_index import get_vector_index
+
+SECTION_NAMES = ('resume', 'sop', 'publications', 'research_interests', 'funding')
+
+
+def get_section_collection_name(collection_name):
+    """Section collection of a profile collection, None when it has none"""
+    return settings.RECOMMENDATION_SECTION_COLLECTIONS.get(collection_name)
+
+
+def get_section_weights(weights=None):
+    weights = settings.RECOMMENDATION_SECTION_WEIGHTS if weights is None else weights
+    return {section: float(weight) for section, weight in weights.items() if weight and section in SECTION_NAMES}
+
+
+def get_section_id(entity_id, section):
+    return f"{entity_id}:{section}"
+
+
+def get_entity_id(section_id):
+    return section_id.rsplit(":", 1)[0]
+
+
+def get_section_scope_ids(entity_ids):
+    """Every section id the given entities can have, to diff a partial refresh against"""
+    return [get_section_id(entity_id, section) for entity_id in entity_ids for section in SECTION_NAMES]
+
+
+def _fit_document(builder, label, document):
+    """A (text prefix, full length) pair from load_document_text, labelled and cut to the budget"""
+    text, length = document
+    if not text.strip():
+        return None
+    return builder.fit(label + text, source_length=len(label) + length)
+
+
+def get_profile_sections(record, builder, resume=("", 0), sop=("", 0), funding_texts=()):
+    """{section: BudgetedText} for the non-empty sections of a UserProfileRecord.
+
+    Every section is one embedding input and is cut to the builder's token
+    budget. Publications and fundings keep as many whole entries as fit, in
+    the order they are listed.
+    """
+    publications = [
+        f'publication title: "{publication.title}", publication abstract: "{publication.abstract}"'
+        for publication in record.publications
+    ]
+    sections = {
+        'resume': _fit_document(builder, "Resume: ", resume),
+        'sop': _fit_document(builder, "Statement of purpose: ", sop),
+        'publications': builder.fit_parts(publications) if publications else None,
+        'research_interests': builder.fit(
+            "Research interests: " + ", ".join(record.research_interests)
+        ) if record.research_interests else None,
+        'funding': builder.fit_parts(funding_texts, separator="") if funding_texts else None,
+    }
+    return {section: budgeted for section, budgeted in sections.items() if budgeted and budgeted.text.strip()}
+
+
+def normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def fuse_section_vectors(vectors_by_section, weights=None):
+    """Normalized weighted sum of section vectors, None when no weighted section is present"""
+    weights = get_section_weights(weights)
+    present = [section for section in vectors_by_section if section in weights]
+    if not present:
+        return None
+    fused = sum(weights[section] * normalize(vectors_by_section[section]) for section in present)
+    return [float(value) for value in normalize(fused)]
+
+
+def get_section_vectors(collection_name, entity_ids, index=None):
+    """{entity id: {section: vector}} for the given entities of a profile collection"""
+    if not entity_ids:
+        return {}
+    index = index or get_vector_index(get_section_collection_name(collection_name))
+    records = index.get(get_section_scope_ids(entity_ids), include=["embeddings"])
+    vectors = {}
+    for section_id, embedding in zip(records["ids"], records["embeddings"]):
+        entity_id, section = section_id.rsplit(":", 1)
+        vectors.setdefault(entity_id, {})[section] = embedding
+    return vectors
+
+
+def get_fused_query_vector(collection_name, entity_id, weights=None):
+    """The entity's section vectors fused with the current weights, None when it has no sections indexed"""
+    if get_section_collection_name(collection_name) is None:
+        return None
+    try:
+        vectors = get_section_vectors(collection_name, [entity_id]).get(str(entity_id), {})
+    except Exception as e:
+        # Section collection not built yet, callers use the profile vector
+        print(f"Section vectors of {collection_name} unavailable:", e)
+        return None
+    return fuse_section_vectors(vectors, weights)
+
+
+def rank_by_sections(collection_name, query_vector, top_n=10, where=None, weights=None):
+    """Entities of a profile collection ranked by the weighted mean similarity of their sections.
+
+    Candidates are the top_n of each weighted section (with the where
+    filter applied), then every candidate is scored on all of its sections,
+    sections it does not have are left out of its mean. Returns
+    [(entity id, similarity)] best first.
+    """
+    weights = get_section_weights(weights)
+    index = get_vector_index(get_section_collection_name(collection_name))
+
+    candidates = set()
+    for section in weights:
+        section_where = {"section": section}
+        if where:
+            section_where = {"$and": [where, section_where]}
+        results = index.query(query_embeddings=[query_vector], n_results=top_n, where=section_where)
+        candidates.update(get_entity_id(section_id) for section_id in results["ids"][0])
+    if not candidates:
+        return []
+
+    query = normalize(query_vector)
+    scores = []
+    for entity_id, vectors in get_section_vectors(collection_name, candidates, index).items():
+        sections = [section for section in vectors if section in weights]
+        total_weight = sum(weights[section] for section in sections)
+        similarity = sum(weights[section] * float(normalize(vectors[section]) @ query) for section in sections)
+        scores.append((entity_id, similarity / total_weight))
+    scores.sort(key=lambda score: -score[1])
+    return scores[:top_n]
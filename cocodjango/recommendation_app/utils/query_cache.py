@@ -0,0 +1,112 @@
+"""
+Caches for free-text semantic search.
+
+Popular searches repeat the same few phrasings, so both the query
+embedding and the ranked results are kept in bounded in-process LRU caches
+with a TTL, keyed by the normalized query text (and, for results, the
+normalized filters and the version of the searched collection). A repeated
+query skips the encoder and the vector store.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from .embedding_cache import normalize_text
+from .recommendation_cache import decode_cursor, encode_cursor, normalize_filters
+from ..models import VectorIndexVersion
+
+
+class LRUCache:
+    """Thread-safe mapping holding at most max_entries values, each for at most ttl seconds"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+query_embeddings = LRUCache(settings.RECOMMENDATION_SEARCH_CACHE_SIZE, settings.RECOMMENDATION_SEARCH_CACHE_TTL)
+search_results = LRUCache(settings.RECOMMENDATION_SEARCH_CACHE_SIZE, settings.RECOMMENDATION_SEARCH_CACHE_TTL)
+
+
+def normalize_query(text):
+    """Case and whitespace insensitive form of a search query"""
+    return normalize_text(text).lower()
+
+
+def get_query_embedding(text, embedding_function):
+    query = normalize_query(text)
+    embedding = query_embeddings.get(query)
+    if embedding is None:
+        embedding = [float(value) for value in embedding_function([query])[0]]
+        query_embeddings.set(query, embedding)
+    return embedding
+
+
+def get_collection_version(collection_name):
+    version = (
+        VectorIndexVersion.objects.filter(collection_name=collection_name, entity_id='')
+        .values_list('version', flat=True)
+        .first()
+    )
+    return version or 0
+
+
+def get_search_key(collection_name, text, filters):
+    """Results key, a new version of the searched collection retires every cached result for it"""
+    payload = json.dumps({
+        'collection': collection_name,
+        'query': normalize_query(text),
+        'filters': normalize_filters(filters),
+        'version': get_collection_version(collection_name),
+    }, sort_keys=True)
+    return "search:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_search_page(collection_name, text, filters, compute, embedding_function, cursor=None, page_size=10):
+    """One page of the results of a free-text search, see get_recommendation_page.
+
+    compute(query_embedding, top_n) ranks RECOMMENDATION_RESULTS_CACHE_SIZE
+    results once per (query, filters, collection version). Returns
+    (results, next_cursor), next_cursor is None on the last page.
+    """
+    key = get_search_key(collection_name, text, filters)
+    offset = decode_cursor(cursor, key) if cursor else 0
+
+    results = search_results.get(key)
+    if results is None:
+        results = compute(get_query_embedding(text, embedding_function), settings.RECOMMENDATION_RESULTS_CACHE_SIZE)
+        search_results.set(key, results)
+
+    end = offset + page_size
+    next_cursor = encode_cursor(key, end) if end < len(results) else None
+    return results[offset:end], next_cursor
@@ -0,0 +1,112 @@
+import base64
+import binascii
+import hashlib
+import json
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+from ..models import VectorIndexVersion
+
+QUERY_COLLECTION = "student_user_documents"
+
+
+def bump_index_versions(collection_name, changed_ids, incremental):
+    """Retire cached results that depend on the vectors just written.
+
+    A student vector is only ever the query of its own user's recommendations,
+    so incremental changes there bump per-user versions. Any change to a
+    collection that is searched bumps the collection version.
+    """
+    if incremental and collection_name == QUERY_COLLECTION:
+        VectorIndexVersion.bump(collection_name, changed_ids)
+    else:
+        VectorIndexVersion.bump(collection_name)
+
+
+def get_index_versions_for_users(user_ids, collection_name):
+    """{user id: versions} for many users with one query, see get_index_versions"""
+    user_ids = [str(user_id) for user_id in user_ids]
+    rows = VectorIndexVersion.objects.filter(
+        Q(collection_name__in=[collection_name, QUERY_COLLECTION], entity_id='')
+        | Q(collection_name=QUERY_COLLECTION, entity_id__in=user_ids)
+    ).values_list('collection_name', 'entity_id', 'version')
+    shared = [row for row in rows if row[1] == '']
+    own = {row[1]: row for row in rows if row[1] != ''}
+    return {
+        user_id: sorted(shared + ([own[user_id]] if user_id in own else []))
+        for user_id in user_ids
+    }
+
+
+def get_index_versions(user_id, collection_name):
+    """Versions of the searched collection, the student collection and the user's own vector"""
+    return get_index_versions_for_users([user_id], collection_name)[str(user_id)]
+
+
+def get_index_signature(versions):
+    return hashlib.sha256(json.dumps(versions).encode("utf-8")).hexdigest()
+
+
+def normalize_filters(filters):
+    """Drop empty filters and put the rest in a stable form, so equivalent requests share a key"""
+    normalized = {}
+    for key, value in filters.items():
+        if value in (None, '', 'null') or value == []:
+            continue
+        if isinstance(value, (list, tuple)):
+            normalized[key] = sorted(str(item) for item in value)
+        else:
+            normalized[key] = str(value).strip()
+    return normalized
+
+
+def get_ranking_key(user_id, collection_name, filters):
+    payload = json.dumps({
+        'user': user_id,
+        'collection': collection_name,
+        'filters': normalize_filters(filters),
+        'versions': get_index_versions(user_id, collection_name),
+    }, sort_keys=True)
+    return "recommendations:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def encode_cursor(key, offset):
+    payload = json.dumps({'k': key[-16:], 'o': offset}).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def decode_cursor(cursor, key):
+    """Offset stored in a cursor, ValueError if the cursor belongs to another (or outdated) ranking"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError("Invalid cursor.")
+    if payload.get('k') != key[-16:]:
+        raise ValueError("Cursor has expired, recommendations have changed since it was issued.")
+    return int(payload.get('o', 0))
+
+
+def get_recommendation_page(user, collection_name, filters, compute, cursor=None, page_size=10):
+    """One page of a user's ranked recommendations.
+
+    The ranking for (user, normalized filters, index versions) is computed
+    once with compute(top_n) for RECOMMENDATION_RESULTS_CACHE_SIZE results
+    and kept for RECOMMENDATION_RESULTS_CACHE_TTL seconds; following pages
+    are read from the cache without touching the vector store.
+
+    Returns (user_documents, results, next_cursor), next_cursor is None on
+    the last page.
+    """
+    cache = caches[settings.RECOMMENDATION_RESULTS_CACHE_ALIAS]
+    key = get_ranking_key(user.id, collection_name, filters)
+    offset = decode_cursor(cursor, key) if cursor else 0
+
+    ranking = cache.get(key)
+    if ranking is None:
+        _, user_documents, results = compute(settings.RECOMMENDATION_RESULTS_CACHE_SIZE)
+        ranking = {'user_documents': user_documents, 'results': results}
+        cache.set(key, ranking, settings.RECOMMENDATION_RESULTS_CACHE_TTL)
+
+    end = offset + page_size
+    next_cursor = encode_cursor(key, end) if end < len(ranking['results']) else None
+    return ranking['user_documents'], ranking['results'][offset:end], next_cursor
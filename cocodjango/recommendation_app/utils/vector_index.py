@@ -0,0 +1,533 @@
+"""
+Vector index backends for the recommendation queries.
+
+recommend_programs/recommend_researchers only need to read one stored
+vector and run a filtered top-K query, so VectorIndex exposes just the
+get()/query() subset of Chroma's collection API, with the same argument and
+result shapes. Which backend serves a collection is set per collection in
+RECOMMENDATION_VECTOR_BACKENDS:
+
+- 'chroma': the Chroma collection itself (HNSW, approximate).
+- 'numpy': an exact cosine search over a memory-mapped float32 matrix. It is
+  exported from the Chroma collection after every ingestion, Chroma stays
+  the source of truth.
+
+A NumPy index directory holds one sub-directory per export (vectors.npy
+plus a records.json sidecar with ids, documents and metadata stored column
+by column) and a CURRENT file naming the live one. Readers re-check CURRENT
+on every call, so a new export is picked up without a restart.
+
+Incremental writes do not re-export the collection: patch_numpy_index()
+writes a version holding hard links to the current base files plus a
+delta (delta_vectors.npy, delta_records.json with the upserted records and
+the deleted ids). Readers search the base, minus the rows the delta
+replaces or deletes, and the delta. Once the delta outgrows
+RECOMMENDATION_NUMPY_DELTA_MAX_RATIO of the base the next write exports
+the collection in full again.
+
+An export can also be searched at reduced precision
+(RECOMMENDATION_VECTOR_PRECISION): quantized.npy holds the vectors as
+float16, or as int8 with one scale per row in scales.npy, and is loaded into
+memory. A query ranks RECOMMENDATION_VECTOR_RESCORE_FACTOR times the
+requested number of rows on it, then rescores only those rows from the
+memory-mapped float32 vectors, which stay on disk otherwise.
+"""
+import abc
+import fcntl
+import json
+import operator
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from django.conf import settings
+from .chroma_registry import chroma_registry
+from .index_builds import logical_collection_name
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = "LOCK"
+BASE_FILES = ("vectors.npy", "records.json", "quantized.npy", "scales.npy")
+DELTA_VECTORS_FILE = "delta_vectors.npy"
+DELTA_RECORDS_FILE = "delta_records.json"
+RANGE_OPERATORS = {"$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le}
+PRECISIONS = ("float32", "float16", "int8")
+# Rows scored at a time on a reduced precision index, bounds the float32 copy made to score them
+SCORE_CHUNK_ROWS = 65536
+
+
+class VectorIndex(abc.ABC):
+    """The subset of a Chroma collection used for recommendations"""
+
+    @abc.abstractmethod
+    def get(self, ids=None, include=None):
+        """Stored records by id, or every record when ids is None"""
+
+    @abc.abstractmethod
+    def query(self, query_embeddings, n_results=10, where=None):
+        """Nearest records of each query embedding, in the shape of a Chroma query result"""
+
+
+class ChromaVectorIndex(VectorIndex):
+    def __init__(self, name):
+        self.name = name
+
+    def get(self, ids=None, include=None):
+        return chroma_registry.get_collection(self.name).get(ids, include=include or ["documents", "metadatas"])
+
+    def query(self, query_embeddings, n_results=10, where=None):
+        return chroma_registry.get_collection(self.name).query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=where or None,
+        )
+
+
+class _LoadedIndex:
+    __slots__ = ("vectors", "quantized", "scales", "ids", "positions", "documents", "columns", "numeric_columns")
+
+    def __init__(self, vectors, ids, documents, columns, quantized=None, scales=None):
+        self.vectors = vectors
+        self.quantized = quantized
+        self.scales = scales
+        self.ids = ids
+        self.positions = {embedding_id: i for i, embedding_id in enumerate(ids)}
+        self.documents = documents
+        self.columns = {key: np.array(values, dtype=object) for key, values in columns.items()}
+        # Numbers only, NaN elsewhere, so range comparisons skip "" and missing values like Chroma does
+        self.numeric_columns = {
+            key: np.array([
+                float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+                for value in values
+            ], dtype=np.float64)
+            for key, values in columns.items()
+        }
+
+    def metadata(self, row):
+        return {
+            key: column[row]
+            for key, column in self.columns.items()
+            if column[row] is not None
+        }
+
+
+def _top_k(similarities, k):
+    """Positions of the k largest similarities, best first"""
+    top = np.argpartition(-similarities, k - 1)[:k]
+    return top[np.argsort(-similarities[top])]
+
+
+class NumpyVectorIndex(VectorIndex):
+    """Cosine search over normalized vectors with vectorized metadata filtering.
+
+    Exact on float32 exports, approximate and rescored on reduced precision ones.
+    """
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._version = None
+        self._segments = None
+        # (device, inode) of the base vectors.npy and its _LoadedIndex, patches hard-link the same base
+        self._base = (None, None)
+
+    def _load(self):
+        """[(_LoadedIndex, rows still served or None for all)]: the base export, then its delta if it has one"""
+        with open(os.path.join(self.path, CURRENT_FILE)) as file:
+            version = file.read().strip()
+        if version == self._version:
+            return self._segments
+        with self._lock:
+            if version != self._version:
+                self._segments = self._load_version(os.path.join(self.path, version))
+                self._version = version
+        return self._segments
+
+    def _load_version(self, directory):
+        stat = os.stat(os.path.join(directory, "vectors.npy"))
+        base_key, base = self._base
+        if base_key != (stat.st_dev, stat.st_ino):
+            vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+            quantized = scales = None
+            if os.path.exists(os.path.join(directory, "quantized.npy")):
+                quantized = np.load(os.path.join(directory, "quantized.npy"))
+                if os.path.exists(os.path.join(directory, "scales.npy")):
+                    scales = np.load(os.path.join(directory, "scales.npy"))
+            records = _read_json(os.path.join(directory, "records.json"))
+            base = _LoadedIndex(vectors, records["ids"], records["documents"], records["columns"], quantized, scales)
+            self._base = ((stat.st_dev, stat.st_ino), base)
+
+        delta_records = _read_delta_records(directory)
+        if delta_records is None:
+            return [(base, None)]
+        delta = _LoadedIndex(
+            np.load(os.path.join(directory, DELTA_VECTORS_FILE)), delta_records["ids"],
+            delta_records["documents"], get_columns(delta_records["metadatas"]),
+        )
+        # Base rows that were deleted or replaced by a delta row
+        alive = np.ones(len(base.ids), dtype=bool)
+        for embedding_id in [*delta_records["deleted"], *delta.ids]:
+            row = base.positions.get(embedding_id)
+            if row is not None:
+                alive[row] = False
+        return [(base, alive), (delta, None)]
+
+    def get(self, ids=None, include=None):
+        segments = self._load()
+        include = include or ["documents", "metadatas"]
+        if ids is None:
+            rows = [
+                (data, row)
+                for data, alive in segments
+                for row in (range(len(data.ids)) if alive is None else np.flatnonzero(alive))
+            ]
+        else:
+            if isinstance(ids, str):
+                ids = [ids]
+            rows = []
+            for embedding_id in ids:
+                # The delta holds the newest version of a record
+                for data, alive in reversed(segments):
+                    row = data.positions.get(embedding_id)
+                    if row is not None and (alive is None or alive[row]):
+                        rows.append((data, row))
+                        break
+        result = {"ids": [data.ids[row] for data, row in rows]}
+        if "embeddings" in include:
+            result["embeddings"] = [data.vectors[row].tolist() for data, row in rows]
+        if "documents" in include:
+            result["documents"] = [data.documents[row] for data, row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [data.metadata(row) for data, row in rows]
+        return result
+
+    def query(self, query_embeddings, n_results=10, where=None):
+        segments = self._load()
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        candidates = [self._candidates(data, alive, where) for data, alive in segments]
+
+        for embedding in query_embeddings:
+            query_vector = np.asarray(embedding, dtype=np.float32)
+            query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+            hits = []
+            for (data, _), rows in zip(segments, candidates):
+                k = min(n_results, len(data.ids) if rows is None else len(rows))
+                if k > 0:
+                    top_rows, scores = self._top_k_rows(data, rows, query_vector, k)
+                    hits.extend((float(score), data, row) for row, score in zip(top_rows, scores))
+            hits.sort(key=lambda hit: -hit[0])
+            hits = hits[:n_results]
+            results["ids"].append([data.ids[row] for _, data, row in hits])
+            results["documents"].append([data.documents[row] for _, data, row in hits])
+            results["metadatas"].append([data.metadata(row) for _, data, row in hits])
+            # Chroma's cosine distance
+            results["distances"].append([1.0 - score for score, _, _ in hits])
+        return results
+
+    def _candidates(self, data, alive, where):
+        """Rows of a segment that can match, None for all of them"""
+        if where:
+            mask = self._mask(data, where)
+            return np.flatnonzero(mask if alive is None else mask & alive)
+        return None if alive is None else np.flatnonzero(alive)
+
+    def _top_k_rows(self, data, candidates, query_vector, k):
+        """(rows, similarities) of the k candidate rows closest to query_vector, best first"""
+        if data.quantized is not None:
+            return self._rescored_top_k(data, candidates, query_vector, k)
+        vectors = data.vectors if candidates is None else data.vectors[candidates]
+        similarities = vectors @ query_vector
+        top = _top_k(similarities, k)
+        return (top if candidates is None else candidates[top]), similarities[top]
+
+    def _approximate_scores(self, data, candidates, query_vector):
+        """Similarities on the reduced precision vectors of the candidate rows, all rows when None"""
+        count = len(data.ids) if candidates is None else len(candidates)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCORE_CHUNK_ROWS):
+            chunk = slice(start, start + SCORE_CHUNK_ROWS)
+            rows = chunk if candidates is None else candidates[chunk]
+            scores[chunk] = data.quantized[rows].astype(np.float32) @ query_vector
+            if data.scales is not None:
+                scores[chunk] *= data.scales[rows]
+        return scores
+
+    def _rescored_top_k(self, data, candidates, query_vector, k):
+        """Top k rows of a reduced precision index, shortlisted on it and rescored in float32"""
+        similarities = self._approximate_scores(data, candidates, query_vector)
+        shortlist_size = min(len(similarities), k * max(1, settings.RECOMMENDATION_VECTOR_RESCORE_FACTOR))
+        shortlist = _top_k(similarities, shortlist_size)
+        # Sorted, so the memory-mapped float32 rows are read in file order
+        rows = np.sort(shortlist if candidates is None else candidates[shortlist])
+        exact = data.vectors[rows] @ query_vector
+        top = _top_k(exact, k)
+        return rows[top], exact[top]
+
+    def _mask(self, data, where):
+        """Boolean row mask for a Chroma style where clause"""
+        masks = []
+        for key, condition in where.items():
+            if key == "$and":
+                masks.append(np.logical_and.reduce([self._mask(data, clause) for clause in condition]))
+            elif key == "$or":
+                masks.append(np.logical_or.reduce([self._mask(data, clause) for clause in condition]))
+            else:
+                masks.append(self._field_mask(data, key, condition))
+        return np.logical_and.reduce(masks)
+
+    def _field_mask(self, data, field, condition):
+        count = len(data.ids)
+        if field not in data.columns:
+            return np.zeros(count, dtype=bool)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        mask = np.ones(count, dtype=bool)
+        for op, value in condition.items():
+            if op in RANGE_OPERATORS:
+                with np.errstate(invalid="ignore"):
+                    mask &= RANGE_OPERATORS[op](data.numeric_columns[field], float(value))
+            elif op == "$eq":
+                mask &= self._equals(data, field, value)
+            elif op == "$ne":
+                mask &= ~self._equals(data, field, value)
+            elif op == "$in":
+                mask &= np.logical_or.reduce([self._equals(data, field, item) for item in value])
+            elif op == "$nin":
+                mask &= ~np.logical_or.reduce([self._equals(data, field, item) for item in value])
+            else:
+                raise ValueError(f"Unsupported where operator: {op}")
+        return mask
+
+    def _equals(self, data, field, value):
+        column = data.columns[field]
+        if isinstance(value, bool):
+            return np.fromiter((item is value for item in column), dtype=bool, count=len(column))
+        if isinstance(value, (int, float)):
+            return data.numeric_columns[field] == value
+        return np.asarray(column == value, dtype=bool)
+
+
+def quantize(vectors, precision):
+    """(quantized vectors, per-row scales or None) of L2-normalized float32 vectors"""
+    if precision == "float16":
+        return vectors.astype(np.float16), None
+    if precision == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Unsupported vector precision: {precision}")
+
+
+def normalize_rows(embeddings, count):
+    """float32 (count, dim) matrix of L2-normalized embeddings, so a dot product is the cosine similarity"""
+    vectors = np.asarray(embeddings, dtype=np.float32).reshape(count, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def get_columns(metadatas):
+    """Metadata stored column by column, None where a record has no value"""
+    metadatas = [metadata or {} for metadata in metadatas]
+    keys = sorted(set().union(*metadatas)) if metadatas else []
+    return {key: [metadata.get(key) for metadata in metadatas] for key in keys}
+
+
+def _read_json(file_path):
+    with open(file_path) as file:
+        return json.load(file)
+
+
+def _write_json(file_path, value):
+    with open(file_path, "w") as file:
+        json.dump(value, file)
+
+
+def _read_delta_records(directory):
+    file_path = os.path.join(directory, DELTA_RECORDS_FILE)
+    return _read_json(file_path) if os.path.exists(file_path) else None
+
+
+@contextmanager
+def _index_lock(path):
+    """Serializes the writers of one index directory, a patch must not miss a concurrent one"""
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, LOCK_FILE), "w") as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+def _get_current_version(path):
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as file:
+            return file.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _publish_version(path, version, keep):
+    """Make version the current one and drop all but the newest keep versions"""
+    pointer = os.path.join(path, CURRENT_FILE + ".tmp")
+    with open(pointer, "w") as file:
+        file.write(version)
+    os.replace(pointer, os.path.join(path, CURRENT_FILE))
+
+    versions = sorted(name for name in os.listdir(path) if name.isdigit())
+    for old_version in versions[:-keep]:
+        shutil.rmtree(os.path.join(path, old_version), ignore_errors=True)
+
+
+def build_numpy_index(path, ids, embeddings, documents, metadatas, keep=2, precision="float32"):
+    """Write a new version of a NumPy index and make it the current one.
+
+    Vectors are L2-normalized so a dot product is the cosine similarity.
+    A precision other than float32 also writes the quantized copy searched
+    in memory. Only the newest `keep` versions are kept on disk.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unsupported vector precision: {precision}")
+    path = str(path)
+    with _index_lock(path):
+        version = str(time.time_ns())
+        directory = os.path.join(path, version)
+        os.makedirs(directory)
+
+        vectors = normalize_rows(embeddings, len(ids))
+        np.save(os.path.join(directory, "vectors.npy"), vectors)
+        if precision != "float32":
+            quantized, scales = quantize(vectors, precision)
+            np.save(os.path.join(directory, "quantized.npy"), quantized)
+            if scales is not None:
+                np.save(os.path.join(directory, "scales.npy"), scales)
+
+        _write_json(os.path.join(directory, "records.json"), {
+            "ids": list(ids),
+            "documents": list(documents),
+            "columns": get_columns(metadatas),
+        })
+        _publish_version(path, version, keep)
+    return version
+
+
+def patch_numpy_index(path, ids, embeddings, documents, metadatas, removed_ids=(), keep=2, max_delta_ratio=None):
+    """Write a new version of a NumPy index with records upserted and removed_ids deleted.
+
+    Only the delta is written: the changed records, plus the ids deleted
+    from the base, next to hard links to the current base files. Returns the
+    new version, or None when there is no current export or the delta would
+    hold more than max_delta_ratio of the base; the caller then exports the
+    collection in full.
+    """
+    max_delta_ratio = settings.RECOMMENDATION_NUMPY_DELTA_MAX_RATIO if max_delta_ratio is None else max_delta_ratio
+    path = str(path)
+    with _index_lock(path):
+        current = _get_current_version(path)
+        if current is None:
+            return None
+        current_directory = os.path.join(path, current)
+        base_vectors = np.load(os.path.join(current_directory, "vectors.npy"), mmap_mode="r")
+        delta_records = _read_delta_records(current_directory) or {
+            "ids": [], "documents": [], "metadatas": [], "deleted": [],
+        }
+
+        changed = set(ids) | set(removed_ids)
+        kept_rows = [row for row, embedding_id in enumerate(delta_records["ids"]) if embedding_id not in changed]
+        if ids:
+            new_vectors = normalize_rows(embeddings, len(ids))
+        else:
+            new_vectors = np.zeros((0, base_vectors.shape[1]), dtype=np.float32)
+        if delta_records["ids"]:
+            delta_vectors = np.load(os.path.join(current_directory, DELTA_VECTORS_FILE))
+            new_vectors = np.concatenate([delta_vectors[kept_rows], new_vectors])
+        records = {
+            "ids": [delta_records["ids"][row] for row in kept_rows] + list(ids),
+            "documents": [delta_records["documents"][row] for row in kept_rows] + list(documents),
+            "metadatas": [delta_records["metadatas"][row] for row in kept_rows] + [metadata or {} for metadata in metadatas],
+            "deleted": sorted(set(delta_records["deleted"]) | set(removed_ids)),
+        }
+        if len(records["ids"]) + len(records["deleted"]) > max_delta_ratio * len(base_vectors):
+            return None
+
+        version = str(time.time_ns())
+        directory = os.path.join(path, version)
+        os.makedirs(directory)
+        for name in BASE_FILES:
+            source = os.path.join(current_directory, name)
+            if os.path.exists(source):
+                try:
+                    os.link(source, os.path.join(directory, name))
+                except OSError:
+                    shutil.copy2(source, os.path.join(directory, name))
+        np.save(os.path.join(directory, DELTA_VECTORS_FILE), new_vectors)
+        _write_json(os.path.join(directory, DELTA_RECORDS_FILE), records)
+        _publish_version(path, version, keep)
+    return version
+
+
+def export_collection(collection, path, precision="float32"):
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    return build_numpy_index(
+        path, data["ids"], data["embeddings"], data["documents"], data["metadatas"], precision=precision
+    )
+
+
+def get_numpy_index_path(name):
+    return os.path.join(settings.RECOMMENDATION_NUMPY_INDEX_ROOT, name)
+
+
+def get_backend(name):
+    return settings.RECOMMENDATION_VECTOR_BACKENDS.get(name, "chroma")
+
+
+def get_precision(name):
+    return settings.RECOMMENDATION_VECTOR_PRECISION.get(name, "float32")
+
+
+def refresh_numpy_index(collection, changed_ids=None, removed_ids=None):
+    """Bring the export of a collection served by the NumPy backend up to date after it was written to.
+
+    With changed_ids/removed_ids only those records are read from Chroma and
+    patched into the export, the collection is re-exported in full when
+    they are not given or the delta has grown too large.
+    """
+    # A blue/green build exports under the name it is served as
+    name = logical_collection_name(collection.name)
+    if get_backend(name) != "numpy":
+        return
+    path = get_numpy_index_path(name)
+    if changed_ids is not None or removed_ids is not None:
+        changed_ids = list(changed_ids or [])
+        data = {"ids": [], "embeddings": [], "documents": [], "metadatas": []}
+        if changed_ids:
+            data = collection.get(ids=changed_ids, include=["embeddings", "documents", "metadatas"])
+        version = patch_numpy_index(
+            path, data["ids"], data["embeddings"], data["documents"], data["metadatas"], removed_ids or []
+        )
+        if version is not None:
+            return
+    export_collection(collection, path, precision=get_precision(name))
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_vector_index(name):
+    """Shared VectorIndex for a collection, using the backend configured for it"""
+    index = _indexes.get(name)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(name)
+            if index is None:
+                if get_backend(name) == "numpy":
+                    index = NumpyVectorIndex(name, get_numpy_index_path(name))
+                else:
+                    index = ChromaVectorIndex(name)
+                _indexes[name] = index
+    return index
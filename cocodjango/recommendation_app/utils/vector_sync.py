@@ -0,0 +1,128 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F, Min
+from django.utils import timezone
+from profile_app.models import UserDetails
+from ..models import VectorIndexBuild, VectorSyncQueue
+from .chromadb_ingest_user_data import DjangoToChromaDBIngest
+from .embedding_service import get_embedding_function
+from .index_builds import logical_collection_name
+from .profile_sections import get_section_collection_name
+
+# Served collection -> (entity type, ingest method, ids argument) of the entities it holds
+COLLECTION_INGESTS = {
+    'researcher_user_documents': (VectorSyncQueue.USER, 'ingest_researcher_user_documents', 'user_ids'),
+    'student_user_documents': (VectorSyncQueue.USER, 'ingest_student_user_documents', 'user_ids'),
+    'program_documents': (VectorSyncQueue.PROGRAM, 'ingest_program_documents', 'program_ids'),
+}
+
+
+def get_building_since():
+    """Start of the oldest full rebuild in progress, None when nothing is being rebuilt"""
+    max_age = timedelta(seconds=settings.RECOMMENDATION_INDEX_BUILD_MAX_AGE)
+    return VectorIndexBuild.objects.filter(
+        status=VectorIndexBuild.BUILDING, created_at__gte=timezone.now() - max_age
+    ).aggregate(Min('created_at'))['created_at__min']
+
+
+def process_vector_sync_queue(embedding_function, limit=500):
+    """Re-embed the entities currently waiting in VectorSyncQueue.
+
+    Rows are only removed after their entities were written, and only if no
+    newer edit moved dirty_at past the start of this drain, so a failure or a
+    concurrent edit leaves the entity queued for the next run. Rows edited
+    after a rebuild in progress started are only marked synced, the rebuild
+    writes them into its new collection before it goes live (see
+    catch_up_index_build) and a later drain removes them.
+    Returns the number of queue rows processed.
+    """
+    started_at = timezone.now()
+    building_since = get_building_since()
+    done = VectorSyncQueue.objects.filter(synced_at__isnull=False, dirty_at__lte=F('synced_at'))
+    if building_since is not None:
+        done = done.filter(dirty_at__lt=building_since)
+    done.delete()
+
+    entries = list(
+        VectorSyncQueue.pending().filter(dirty_at__lte=started_at).order_by('dirty_at')[:limit]
+    )
+    if not entries:
+        return 0
+
+    user_ids = sorted({entry.entity_id for entry in entries if entry.entity_type == VectorSyncQueue.USER})
+    program_ids = sorted({entry.entity_id for entry in entries if entry.entity_type == VectorSyncQueue.PROGRAM})
+    paths = settings.RECOMMENDATION_CHROMADB_PATHS
+
+    if user_ids:
+        DjangoToChromaDBIngest(
+            embedding_function, output_path=paths['researcher_user_documents']
+        ).ingest_researcher_user_documents(user_ids=user_ids)
+        DjangoToChromaDBIngest(
+            embedding_function, output_path=paths['student_user_documents']
+        ).ingest_student_user_documents(user_ids=user_ids)
+
+    if program_ids:
+        DjangoToChromaDBIngest(
+            embedding_function, output_path=paths['program_documents']
+        ).ingest_program_documents(program_ids=program_ids)
+
+    written = VectorSyncQueue.objects.filter(id__in=[entry.id for entry in entries], dirty_at__lte=started_at)
+    if building_since is not None:
+        written.filter(dirty_at__gte=building_since).update(synced_at=started_at)
+        written = written.filter(dirty_at__lt=building_since)
+    written.delete()
+    return len(entries)
+
+
+def get_collection_ingest(name):
+    """(collection whose ingest writes name, entity type, ingest method, ids argument), None for other collections"""
+    for collection_name, ingest in COLLECTION_INGESTS.items():
+        if name in (collection_name, get_section_collection_name(collection_name)):
+            return (collection_name, *ingest)
+    return None
+
+
+def get_changed_entity_ids(entity_type, since):
+    """Entities queued, or for users with a profile edited, since the given time"""
+    entity_ids = set(
+        VectorSyncQueue.objects.filter(entity_type=entity_type, dirty_at__gte=since).values_list('entity_id', flat=True)
+    )
+    if entity_type == VectorSyncQueue.USER:
+        # On-demand embedding (jit_embedding) writes edited profiles without queueing them
+        entity_ids |= set(UserDetails.objects.filter(updated_at__gte=since).values_list('user_id', flat=True))
+    return sorted(entity_ids)
+
+
+def catch_up_index_build(collection, since, embedding_function=None):
+    """Re-ingest into a build collection the entities changed since the build started.
+
+    Edits made meanwhile were only written to the live collection, and the
+    build may have read those entities before. Returns when the catch-up
+    started, edits after it are requeued by requeue_changed_since() once the
+    build is live.
+    """
+    caught_up_at = timezone.now()
+    ingest = get_collection_ingest(logical_collection_name(collection.name))
+    if ingest is None:
+        return caught_up_at
+    collection_name, entity_type, method_name, ids_argument = ingest
+    entity_ids = get_changed_entity_ids(entity_type, since)
+    if entity_ids:
+        print(f"{collection.name}: catching up on {len(entity_ids)} entities changed during the build")
+        ingestor = DjangoToChromaDBIngest(
+            embedding_function or get_embedding_function(),
+            output_path=settings.RECOMMENDATION_CHROMADB_PATHS[collection_name],
+        )
+        # The build is refreshed and versioned when it goes live
+        ingestor.defer_index_refresh = True
+        ingestor.collection_overrides[logical_collection_name(collection.name)] = collection.name
+        getattr(ingestor, method_name)(**{ids_argument: entity_ids})
+    return caught_up_at
+
+
+def requeue_changed_since(since):
+    """Queue again what changed after a build's catch-up, so the next drain writes it into the new live collection"""
+    VectorSyncQueue.objects.filter(dirty_at__gte=since).update(synced_at=None)
+    VectorSyncQueue.mark_dirty(
+        VectorSyncQueue.USER, UserDetails.objects.filter(updated_at__gte=since).values_list('user_id', flat=True)
+    )
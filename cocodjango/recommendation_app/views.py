@@ -1,14 +1,22 @@
 from django.http import JsonResponse
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 # from .user_data_service import UserDataService
-from .utils.chromadb_ingest_user_data import DjangoToChromaDBIngest
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
-from django.shortcuts import render
+from .utils.recommendation_cache import get_recommendation_page, normalize_filters
+from .utils.vector_index import get_vector_index
+from .utils.profile_sections import get_fused_query_vector, get_section_collection_name, rank_by_sections
+from .utils.metadata_schema import PROGRAM_SCHEMA, RESEARCHER_SCHEMA
+from .utils.batch_recommendations import get_eligibility_filters, get_fresh_precomputed
+from .utils.jit_embedding import get_student_vector_record
+from .utils.query_cache import get_search_page
+from .utils.fanout import fan_out
+from .utils.embedding_service import get_embedding_function
+from .utils.ingestion_jobs import create_ingestion_job, get_job_status, requeue_ingestion_job
+from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse
 from rest_framework.response import Response
 from rest_framework import status
-from .models import  Funding
+from .models import  Funding, IngestionJob
 from college_app.models import College
 from django.conf import settings
 import chromadb
@@ -31,296 +39,190 @@ from django.utils.translation import gettext_lazy as _
 
 
 class EmbedUserDataView(APIView):
-    
-    def get(self, request):
-        model_name = "mixedbread-ai/mxbai-embed-large-v1"
-        researcher_user_output_path = "chromadb_data/researcher_users_details_mxbai_embed_cosine"
-        student_user_output_path = "chromadb_data/student_users_details_mxbai_embed_cosine"
-        # faculty_output_path = "chromadb_data/faculty_funding_details_mxbai_embed_cosine"
-        college_output_path = "chromadb_data/college_details_mxbai_embed_cosine"
-        dept_output_path = "chromadb_data/dept_details_mxbai_embed_cosine"
-        program_output_path = "chromadb_data/program_details_mxbai_embed_cosine"
-
-        embedding_function = SentenceTransformerEmbeddingFunction(model_name=model_name)
-        researcher_user_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=researcher_user_output_path)
-        student_user_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=student_user_output_path)
-        # faculty_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=faculty_output_path)
-        # college_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=college_output_path)
-        # dept_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=dept_output_path)
-        program_ingestor = DjangoToChromaDBIngest(embedding_function, output_path=program_output_path)
-        
-        try: 
-            researcher_user_ingestor.ingest_researcher_user_documents()
-            student_user_ingestor.ingest_student_user_documents()
-            # faculty_ingestor.ingest_faculty_documents()
-            # college_ingestor.ingest_college_documents()
-            # dept_ingestor.ingest_dept_documents()
-            program_ingestor.ingest_program_documents()
-            return JsonResponse({'status': 'success', 'message': 'User data embedding done.'})
-        except Exception as e:
-            print(str(e))
-            return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+    """Queue an ingestion of the researcher, student and program collections.
+
+    Ingestion runs in the run_ingestion_jobs worker, follow it with
+    IngestionJobView. Staff only, a job rebuilds every vector of its collections.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        incremental = str(request.data.get('incremental', request.GET.get('incremental', 'false'))).lower() == 'true'
+        collections = request.data.get('collections') or None
+        try:
+            job = create_ingestion_job(
+                incremental=incremental,
+                collections=collections,
+                created_by=request.user,
+            )
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        return JsonResponse(
+            {'status': 'success', 'message': 'Ingestion job queued.', 'data': get_job_status(job)},
+            status=202,
+        )
+
+
+class IngestionJobView(APIView):
+    """Progress of an ingestion job, POST resumes a failed one from its last checkpoint"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, job_id):
+        job = get_object_or_404(IngestionJob, id=job_id)
+        return JsonResponse({'status': 'success', 'data': get_job_status(job)})
+
+    def post(self, request, job_id):
+        job = get_object_or_404(IngestionJob, id=job_id)
+        try:
+            requeue_ingestion_job(job)
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        return JsonResponse({'status': 'success', 'message': 'Ingestion job queued.', 'data': get_job_status(job)})
 
 
 # def get_user_list(request):
 #     users = list(User.objects.values('id', 'name'))
 #     return JsonResponse({'users': users})
 
-def recommend_programs(user, top_n=10, filters={}):
-    client_student = chromadb.PersistentClient(path=os.path.join(settings.BASE_DIR, 'chromadb_data/student_users_details_mxbai_embed_cosine'))
-    client_program = chromadb.PersistentClient(path=os.path.join(settings.BASE_DIR, 'chromadb_data/program_details_mxbai_embed_cosine'))
-    
-    student_user_collection = client_student.get_collection(name="student_user_documents")
-    program_collection = client_program.get_collection(name="program_documents")
+def format_program_result(program_id, metadata, distance):
+    metadata = PROGRAM_SCHEMA.decode(metadata)
+    application_end_date = metadata.get('application_end_date', "")
+    return {
+        'program_id': program_id,
+        'program_title': metadata['program_title'],
+        'organization_name': metadata.get('organization_name', ""),
+        'department_name': metadata.get('department_name', ""),
+        'college_name': metadata.get('college_name', ""),
+        'country_name': metadata.get('country_name', ""),
+        'state_province_name': metadata.get('state_province_name', ""),
+        'city': metadata.get('city', ""),
+        'IELTS': metadata.get('IELTS', ""),
+        'TOEFL': metadata.get('TOEFL', ""),
+        'DUOLINGO': metadata.get('GRE', ""),
+        'GRE': metadata.get('TOEFL', ""),
+        'CGPA': metadata.get('CGPA', ""),
+        'funding_available': metadata.get('funding_available', False),
+        'application_fee': metadata.get('application_fee', ""),
+        'application_end_date': datetime.fromtimestamp(application_end_date).strftime('%Y-%m-%d') if application_end_date != "" else "",
+        'distance': distance  # Similarity distance score
+    }
 
-    # Retrieve the embedding for the student user
-    embedding_id = f"{user.id}"
-    user_embedding_record = student_user_collection.get(embedding_id, include=['embeddings', 'documents', 'metadatas'])
-    user_embedding = user_embedding_record['embeddings'][0]
+def recommend_programs_precomputed(user, top_n=10):
+    """Programs from the batch ranking (see precompute_recommendations), None when it is missing or stale"""
+    rows = get_fresh_precomputed(user, "program_documents", settings.RECOMMENDATION_PRECOMPUTED_MAX_AGE)
+    if rows is None:
+        return None
+    recommended_programs = [format_program_result(row.item_id, row.metadata, row.distance) for row in rows[:top_n]]
+    return user, "", recommended_programs
 
-    # Build the query filter based on the student's scores and additional filters
-    query_filter = {"$and": []}
-    
-    # Academic filters based on test scores and CGPA
-    if filters.get('CGPA'):
-    # if cgpa is not None:
-        query_filter["$and"].append({
-            "$or": [
-                {"CGPA": {"$lte": float(filters['CGPA'])}},  # Program requires less than or equal to student's CGPA
-                {"CGPA": ""}  # Program doesn't have CGPA requirement
-            ]
-        })
-    
-    if filters.get('IELTS'):
-    # if ielts_score is not None:
-        query_filter["$and"].append({
-            "$or": [
-                {"IELTS": {"$lte": float(filters['IELTS'])}},
-                {"IELTS": ""}
-            ]
-        })
-    
-    if filters.get('TOEFL'):
-    # if toefl_score is not None:
-        query_filter["$and"].append({
-            "$or": [
-                {"TOEFL": {"$lte": float(filters['TOEFL'])}},
-                {"TOEFL": ""}
-            ]
-        })
-    
-    if filters.get('GRE'):
-    # if gre_score is not None:
-        query_filter["$and"].append({
-            "$or": [
-                {"GRE": {"$lte": float(filters['GRE'])}},
-                {"GRE": ""}
-            ]
-        })
-    
-   
-    if filters.get('DUOLINGO'):
-    # if gre_score is not None:
-        query_filter["$and"].append({
-            "$or": [
-                {"DUOLINGO": {"$lte": float(filters['DUOLINGO'])}},
-                {"DUOLINGO": ""}
-            ]
-        })
-    if filters.get('application_fee'):
-    # if gre_score is not None:
-        query_filter["$and"].append({
-            "$or": [
-                {"application_fee": {"$lte": float(filters['application_fee'])}},
-                {"application_fee": ""}
-            ]
-        })
+def query_programs(query_embedding, top_n=10, filters={}):
+    """Programs closest to query_embedding that pass the filters, formatted for the response"""
+    program_collection = get_vector_index("program_documents")
 
-    if filters.get('application_end_date'):
-        date_string = filters['application_end_date']
-        timestamp = int(time.mktime(datetime.strptime(date_string, "%Y-%m-%d").timetuple()))
-    # if gre_score is not None: 
-        query_filter["$and"].append({
-            "$or": [
-                {"application_end_date": {"$gt": timestamp}},
-                {"application_end_date": ""}
-            ]
-        })
-    
-    # Additional filters based on user preferences
-    filter_mappings = {
-        'organization_name': 'organization_name',
-        'department_name': 'department_name',
-        'college_name': 'college_name',
-        'country_name': 'country_name',
-        'state_province_name': 'state_province_name',
-        'city': 'city',
-        "funding_available":"funding_available",
-        # "application_fee": "application_fee",
-        # "application_end_date": "application_end_date"
-
-    }
-    
-    # Add exact match filters
-    for user_filter, db_field in filter_mappings.items():
-        if filters.get(user_filter):
-            if isinstance(filters[user_filter], list):
-                # Handle multiple values for a filter using $or
-                query_filter["$and"].append({
-                    "$or": [{db_field:   {"$eq": value}} for value in filters[user_filter]]
-                })
-            else:
-                # Handle single value filters
-                query_filter["$and"].append({db_field:  {"$eq": filters[user_filter]}})
-    
-    
-    # Handle funding type filters if present
-    # if filters.get('funding_type'):
-    #     funding_conditions = []
-    #     for funding_type in filters['funding_type']:
-    #         funding_conditions.append({"funding_type": {"$eq": funding_type}})
-    #     if funding_conditions:
-    #         query_filter["$and"].append({"$or": funding_conditions})
-    
-    # Handle funding opportunity filters if present
-    # if filters.get('funding_opportunity_for'):
-    #     opportunity_conditions = []
-    #     for opportunity in filters['funding_opportunity_for']:
-    #         opportunity_conditions.append({"funding_opportunity_for": {"$eq": opportunity}})
-    #     if opportunity_conditions:
-    #         query_filter["$and"].append({"$or": opportunity_conditions})
-    
- 
-    
-    # If no filters are provided, remove the '$and' key
-    if len(query_filter['$and']) == 0:
-        query_filter = {}
-    elif len(query_filter['$and']) == 1:
-        query_filter = query_filter['$and'][0]
+    # Build the query filter based on the student's scores and additional filters
+    query_filter = PROGRAM_SCHEMA.compile_filters(filters)
 
     print("query_filter: ")
     print(query_filter)
 
-    # Query the vector database with the student's embedding and filters
+    # Query the vector database with the embedding and filters
     results = program_collection.query(
-        query_embeddings=[user_embedding],
+        query_embeddings=[query_embedding],
         n_results=top_n,
         where=query_filter
     )
 
-    recommended_programs = []
-
     # Process the results and structure the recommended programs
-    for idx, program_id in enumerate(results['ids'][0]):
-        program_info = {
-            'program_id': program_id,
-            'program_title': results['metadatas'][0][idx]['program_title'],
-            'organization_name': results['metadatas'][0][idx].get('organization_name', ""),
-            'department_name': results['metadatas'][0][idx].get('department_name', ""),
-            'college_name': results['metadatas'][0][idx].get('college_name', ""),
-            'country_name': results['metadatas'][0][idx].get('country_name', ""),
-            'state_province_name': results['metadatas'][0][idx].get('state_province_name', ""),
-            'city': results['metadatas'][0][idx].get('city', ""),
-            'IELTS': results['metadatas'][0][idx].get('IELTS', ""),
-            'TOEFL': results['metadatas'][0][idx].get('TOEFL', ""),
-            'DUOLINGO': results['metadatas'][0][idx].get('GRE', ""),
-            'GRE': results['metadatas'][0][idx].get('TOEFL', ""),
-            'CGPA': results['metadatas'][0][idx].get('CGPA', ""),
-            'funding_available': results['metadatas'][0][idx].get('funding_available', False),
-            'application_fee': results['metadatas'][0][idx].get('application_fee', ""),
-            'application_end_date': datetime.fromtimestamp(results['metadatas'][0][idx].get('application_end_date', "")).strftime('%Y-%m-%d'),
-            'distance': results['distances'][0][idx]  # Similarity distance score
-        }
-        recommended_programs.append(program_info)
+    return [
+        format_program_result(program_id, results['metadatas'][0][idx], results['distances'][0][idx])
+        for idx, program_id in enumerate(results['ids'][0])
+    ]
+
+def get_student_query(user):
+    """(the student's record, the embedding to query with)"""
+    # Retrieve the embedding for the student user, embedding them now if they are missing or outdated
+    user_embedding_record = get_student_vector_record(user)
+    # The student's sections fused with the current weights, the stored profile vector until sections are indexed
+    user_embedding = get_fused_query_vector("student_user_documents", user.id) or user_embedding_record['embeddings'][0]
+    return user_embedding_record, user_embedding
+
+def recommend_programs(user, top_n=10, filters={}, student_query=None):
+    user_embedding_record, user_embedding = student_query or get_student_query(user)
+
+    recommended_programs = query_programs(user_embedding, top_n=top_n, filters=filters)
     print("recommended_programs: ", recommended_programs)
     
     return user, user_embedding_record['documents'][0], recommended_programs
 
-def recommend_researchers(user, top_n=10, filters={}):
-    # Initialize the clients for accessing vector database collections
-    client_student = chromadb.PersistentClient(path=os.path.join(settings.BASE_DIR, 'chromadb_data/student_users_details_mxbai_embed_cosine'))
-    client_researcher = chromadb.PersistentClient(path=os.path.join(settings.BASE_DIR, 'chromadb_data/researcher_users_details_mxbai_embed_cosine'))
-
-    # Load the student and researcher collections
-    student_user_collection = client_student.get_collection(name="student_user_documents")
-    researcher_collection = client_researcher.get_collection(name="researcher_user_documents")
-
-    # Retrieve the embedding for the student user
-    embedding_id = f"{user.id}"
-    user_embedding_record = student_user_collection.get(embedding_id, include=['embeddings', 'documents', 'metadatas'])
-    user_embedding = user_embedding_record['embeddings'][0]
-
-    # print("researcher record: ")
-    # print(researcher_collection) 
+def query_researchers_by_sections(researcher_collection, user_embedding, top_n, query_filter):
+    """Researchers ranked by their fused section similarities, in the shape of a query() result.
+
+    None when researcher sections are not indexed yet, the caller then
+    queries the profile vectors.
+    """
+    if get_section_collection_name("researcher_user_documents") is None:
+        return None
+    try:
+        ranking = rank_by_sections("researcher_user_documents", user_embedding, top_n=top_n, where=query_filter)
+    except Exception as e:
+        print("Researcher sections unavailable:", e)
+        return None
+    if not ranking:
+        return None
+
+    records = researcher_collection.get([researcher_id for researcher_id, _ in ranking], include=['metadatas'])
+    metadatas = dict(zip(records['ids'], records['metadatas']))
+    ranking = [(researcher_id, similarity) for researcher_id, similarity in ranking if researcher_id in metadatas]
+    return {
+        'ids': [[researcher_id for researcher_id, _ in ranking]],
+        'metadatas': [[metadatas[researcher_id] for researcher_id, _ in ranking]],
+        # Chroma's cosine distance
+        'distances': [[1.0 - similarity for _, similarity in ranking]],
+    }
 
-    # Build the query filter based on user-defined criteria
-    query_filter = {"$and": []}
- 
-    # Add filters for specific fields if provided
-    filter_mappings = {
-        'organization_name': 'organization_name',
-        'department_name': 'department_name',
-        'college_name': 'college_name',
-        'city': 'city',
-        'funding_available': 'funding_available',
-        'funding_type': 'funding_type',
-        'funding_opportunity_for': 'funding_opportunity_for',
+def format_researcher_result(researcher_id, metadata, distance):
+    metadata = RESEARCHER_SCHEMA.decode(metadata)
+    return {
+        'user_id': researcher_id,
+        'name': metadata.get('name', ""),
+        'type': metadata.get('type', ""),
+        'organization_name': metadata.get('organization_name', ""),
+        'department_name': metadata.get('department_name', ""),
+        'college_name': metadata.get('college_name', ""),
+        'city': metadata.get('city', ""),
+        'funding_available': metadata.get('funding_available', False),
+        'funding_type': metadata.get('funding_type', ""),
+        'funding_opportunity_for': metadata.get('funding_opportunity_for', ""),
+        'distance': distance  # Similarity distance score
     }
 
-    # Apply filters based on provided fields in filters dictionary
-    for user_filter, db_field in filter_mappings.items():
-        if filters.get(user_filter):
-            if isinstance(filters[user_filter], list):
-                # Handle multiple values for a filter using $or
-                query_filter["$and"].append({
-                    "$or": [{db_field: {"$eq": value}} for value in filters[user_filter]]
-                })
-            else:
-                # Handle single value filters
-                query_filter["$and"].append({db_field: {"$eq": filters[user_filter]}})
+def query_researchers(query_embedding, top_n=10, filters={}):
+    """Researchers closest to query_embedding that pass the filters, formatted for the response"""
+    researcher_collection = get_vector_index("researcher_user_documents")
 
-    # Remove '$and' if no filters are added to it
-    if len(query_filter['$and']) == 0:
-        query_filter = {}
-    elif len(query_filter['$and']) == 1:
-        query_filter = query_filter['$and'][0]
+    # Build the query filter based on user-defined criteria
+    query_filter = RESEARCHER_SCHEMA.compile_filters(filters)
 
     print("filter query: ", query_filter)
-    # result1 = researcher_collection.query(
-    #     query_texts=["machine learning"],
-    #     n_results=top_n,
-    #     # where=query_filter
-    # )
-    # print(result1)
-    # Query the researcher collection using student's embedding and filters
     print("querying...")
-    results = researcher_collection.query(
-        query_embeddings=[user_embedding],
-        n_results=top_n,
-        where=query_filter
-    ) 
-
-    # print("results: , ", results) 
- 
-    recommended_researchers = []
+    results = query_researchers_by_sections(researcher_collection, query_embedding, top_n, query_filter)
+    if results is None:
+        results = researcher_collection.query(
+            query_embeddings=[query_embedding],
+            n_results=top_n,
+            where=query_filter
+        ) 
 
     # Process and structure the recommendations based on the query results
-    for idx, researcher_id in enumerate(results['ids'][0]):
-        researcher_info = {
-            'user_id': researcher_id,
-            'name': results['metadatas'][0][idx].get('name', ""),
-            'type': results['metadatas'][0][idx].get('type', ""),
-            'organization_name': results['metadatas'][0][idx].get('organization_name', ""),
-            'department_name': results['metadatas'][0][idx].get('department_name', ""),
-            'college_name': results['metadatas'][0][idx].get('college_name', ""),
-            'city': results['metadatas'][0][idx].get('city', ""),
-            'funding_available': results['metadatas'][0][idx].get('funding_available', False),
-            'funding_type': results['metadatas'][0][idx].get('funding_type', ""),
-            'funding_opportunity_for': results['metadatas'][0][idx].get('funding_opportunity_for', ""),
-            'distance': results['distances'][0][idx]  # Similarity distance score
-        }
-        recommended_researchers.append(researcher_info)
+    return [
+        format_researcher_result(researcher_id, results['metadatas'][0][idx], results['distances'][0][idx])
+        for idx, researcher_id in enumerate(results['ids'][0])
+    ]
 
+def recommend_researchers(user, top_n=10, filters={}, student_query=None):
+    user_embedding_record, user_embedding = student_query or get_student_query(user)
+
+    recommended_researchers = query_researchers(user_embedding, top_n=top_n, filters=filters)
     print("recommended_researchers: ", recommended_researchers)
 
     return user, user_embedding_record['documents'][0], recommended_researchers
@@ -393,68 +295,166 @@ def recommend_researchers(user, top_n=10, filters={}):
     
 #     return recommended_unis
 
+def get_funding_available(request):
+    funding_available = request.GET.get('scholarshipAvailability')
+    if funding_available == "null":
+        funding_available = None
+    return funding_available
+
+def get_page_size(request):
+    """page_size of a request, a value outside 1..RECOMMENDATION_RESULTS_CACHE_SIZE is a validation error"""
+    page_size = int(request.GET.get('page_size', 10))
+    if not 1 <= page_size <= settings.RECOMMENDATION_RESULTS_CACHE_SIZE:
+        raise ValueError(f"page_size must be between 1 and {settings.RECOMMENDATION_RESULTS_CACHE_SIZE}.")
+    return page_size
+
+def get_program_filters(request, funding_available):
+    """Program filters of a request, shared by recommendations and search"""
+    return {
+        # 'under_category_name': request.GET.get('under_category_name'),
+        'country_name': request.GET.get('country_name'),
+        'organization_name': request.GET.get('organization_name'),
+        # "application_deadline": request.GET.get('applicationDeadline'),
+        "IELTS": request.GET.get('ielts_score'),
+        "CGPA": request.GET.get('cgpa'),
+        "funding_available": funding_available,
+        "application_end_date": request.GET.get('applicationDeadline'),
+        "state_province_name": request.GET.get('state_province_name'),
+        "department_name": request.GET.get('department_name'),
+        "college_name": request.GET.get('college_name'),
+        "TOEFL": request.GET.get('TOEFL'),
+        "DUOLINGO": request.GET.get('DUOLINGO'),
+        "GRE": request.GET.get('GRE'),
+        "application_fee": request.GET.get('application_fee'),
+    }
+
+def get_researcher_filters(request, funding_available):
+    """Researcher filters of a request, shared by recommendations and search"""
+    return {
+        # 'under_category_name': request.GET.get('under_category_name'),
+        'country_name': request.GET.get('country_name'),
+        'organization_name': request.GET.get('organization_name'),
+        "funding_available": funding_available,
+        "department_name": request.GET.get('department_name'),
+        # "college_name": request.GET.get('college_name'),
+    }
+
+def get_program_recommendation_page(user, filters, cursor=None, page_size=10, student_query=None):
+    """(programs, next_cursor) of one page of the student's program recommendations"""
+    def compute_programs(top_n):
+        # A request without filters of its own is filtered by the student's test scores,
+        # the same eligibility the batch ranking applies, whether or not that one is fresh
+        if not normalize_filters(filters):
+            precomputed = recommend_programs_precomputed(user, top_n=top_n)
+            if precomputed is not None:
+                return precomputed
+            return recommend_programs(
+                user, top_n=top_n, filters=get_eligibility_filters(user.id), student_query=student_query
+            )
+        return recommend_programs(user, top_n=top_n, filters=filters, student_query=student_query)
+
+    _, recommended_programs, next_cursor = get_recommendation_page(
+        user, "program_documents", filters, compute_programs,
+        cursor=cursor, page_size=page_size,
+    )
+    return recommended_programs, next_cursor
+
+def get_researcher_recommendation_page(user, filters, cursor=None, page_size=10, student_query=None):
+    """(student documents, researchers, next_cursor) of one page of the student's researcher recommendations"""
+    return get_recommendation_page(
+        user, "researcher_user_documents", filters,
+        lambda top_n: recommend_researchers(user, top_n=top_n, filters=filters, student_query=student_query),
+        cursor=cursor, page_size=page_size,
+    )
+
 class RecommendUniversitiesView(APIView):
     permission_classes = [IsAuthenticated]
 
+    def get_combined(self, request, user, page_size):
+        """Program and researcher recommendations in one response.
+
+        The student vector is fetched once, then both collections are
+        queried concurrently (see fan_out). Each branch reports its status
+        and timing and pages with its own cursor (universities_cursor,
+        professors_cursor); a branch that fails or times out comes back
+        empty without failing the other.
+        """
+        started = time.perf_counter()
+        student_query = get_student_query(user)
+        student_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        funding_available = get_funding_available(request)
+        program_filters = get_program_filters(request, funding_available)
+        researcher_filters = get_researcher_filters(request, funding_available)
+        outcomes = fan_out({
+            'universities': lambda: get_program_recommendation_page(
+                user, program_filters, request.GET.get('universities_cursor'), page_size, student_query
+            ),
+            'professors': lambda: get_researcher_recommendation_page(
+                user, researcher_filters, request.GET.get('professors_cursor'), page_size, student_query
+            )[1:],
+        }, timeouts=settings.RECOMMENDATION_FANOUT_TIMEOUTS)
+
+        branches = {}
+        for name, outcome in outcomes.items():
+            results, next_cursor = outcome['result'] or ([], None)
+            branches[name] = {
+                'results': results,
+                'next_cursor': next_cursor,
+                'status': outcome['status'],
+                'elapsed_ms': outcome['elapsed_ms'],
+                'error': outcome.get('error'),
+            }
+
+        user_documents = student_query[0]['documents'][0]
+        middle_index = len(user_documents) // 2
+        response_data = get_response_template()
+        response_data.update({
+            'status': 'success',
+            'message': 'Recommendations retrieved successfully.',
+            'data': {
+                'user': {
+                    'id': user.id,
+                    'name': user.first_name + ' ' + user.last_name,
+                },
+                'resume_text': user_documents[:middle_index],
+                'sop_text': user_documents[middle_index:],
+                'universities': branches['universities'],
+                'professors': branches['professors'],
+                'timing': {
+                    'student_vector_ms': student_ms,
+                    'total_ms': round((time.perf_counter() - started) * 1000, 1),
+                },
+            },
+        })
+        return response_data
+
     def get(self, request):
         try:
             response_data = get_response_template()
             user = request.user
             search_type = request.GET.get('search_type', 'professors')  # Default to 'professors'
-            funding_available = request.GET.get('scholarshipAvailability')
-            if funding_available == "null":
-                funding_available = None
+            cursor = request.GET.get('cursor')
+            page_size = get_page_size(request)
+            funding_available = get_funding_available(request)
             
+            if search_type == 'combined':
+                return Response(self.get_combined(request, user, page_size), status=status.HTTP_200_OK)
+
             if search_type == 'universities':
-                
-             
-                filters = {
-                    # 'under_category_name': request.GET.get('under_category_name'),
-                    'country_name': request.GET.get('country_name'),
-                    'organization_name': request.GET.get('organization_name'),
-                    # "application_deadline": request.GET.get('applicationDeadline'),
-                   
-                    "IELTS": request.GET.get('ielts_score'),
-                    "CGPA": request.GET.get('cgpa'),
-                    "funding_available": funding_available,
-                    "application_end_date": request.GET.get('applicationDeadline'),
-                    "state_province_name": request.GET.get('state_province_name'),
-                    "department_name": request.GET.get('department_name'),
-                    "college_name": request.GET.get('college_name'),
-                    "TOEFL": request.GET.get('TOEFL'),
-                    "DUOLINGO": request.GET.get('DUOLINGO'),
-                    "GRE": request.GET.get('GRE'),
-                    "application_fee": request.GET.get('application_fee'),
-                
- 
-                }
-                # print("filter from frontend: ",filters )
-                # recommended_unis = recommend_universities(user, filters)
-                _, _, recommended_unis = recommend_programs(user, filters=filters)
+                filters = get_program_filters(request, funding_available)
+                recommended_unis, next_cursor = get_program_recommendation_page(user, filters, cursor, page_size)
                 user_data = {}  # No user data needed for university search
                 sop_text = ""
                 resume_text = ""
             else:
-                filters = {
-                    # 'under_category_name': request.GET.get('under_category_name'),
-                    'country_name': request.GET.get('country_name'),
-                    'organization_name': request.GET.get('organization_name'),
-                    # "application_deadline": request.GET.get('applicationDeadline'),
-                   
-                    
-                    "funding_available": funding_available,
-                 
-                    
-                    "department_name": request.GET.get('department_name'),
-                    # "college_name": request.GET.get('college_name'),
-                   
-                
- 
-                }
+                filters = get_researcher_filters(request, funding_available)
                 print("professor search")
                 print("filter from frontend: ",filters )
                 
-                user, user_documents, recommended_unis = recommend_researchers(user, filters=filters)
+                user_documents, recommended_unis, next_cursor = get_researcher_recommendation_page(
+                    user, filters, cursor, page_size
+                )
                 
                 middle_index = len(user_documents) // 2
                 resume_text = user_documents[:middle_index]
@@ -468,7 +468,8 @@ class RecommendUniversitiesView(APIView):
                 } if search_type == 'professors' else None,
                 'sop_text': sop_text,
                 'resume_text': resume_text,
-                'universities': recommended_unis
+                'universities': recommended_unis,
+                'next_cursor': next_cursor,
             }
             response_data.update({
                     'status': 'success',
@@ -497,4 +498,58 @@ class RecommendUniversitiesView(APIView):
         #     'sop_text': sop_text,
         #     'resume_text': resume_text,
         #     'universities': recommended_unis
-        # }, status=status.HTTP_200_OK)
\ No newline at end of file
+        # }, status=status.HTTP_200_OK)
+
+
+class SemanticSearchView(APIView):
+    """Programs or researchers matching a free-text query, e.g. "graph neural networks funding in Canada".
+
+    Takes the same search_type, filters, cursor and page_size parameters
+    as RecommendUniversitiesView, plus the query text in q.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            response_data = get_response_template()
+            query = request.GET.get('q', '').strip()
+            if not query:
+                raise ValueError("A search query is required.")
+            search_type = request.GET.get('search_type', 'professors')
+            cursor = request.GET.get('cursor')
+            page_size = get_page_size(request)
+            funding_available = get_funding_available(request)
+
+            if search_type == 'universities':
+                collection_name = "program_documents"
+                filters = get_program_filters(request, funding_available)
+                compute = lambda query_embedding, top_n: query_programs(query_embedding, top_n=top_n, filters=filters)
+            else:
+                collection_name = "researcher_user_documents"
+                filters = get_researcher_filters(request, funding_available)
+                compute = lambda query_embedding, top_n: query_researchers(query_embedding, top_n=top_n, filters=filters)
+
+            results, next_cursor = get_search_page(
+                collection_name, query, filters, compute, get_embedding_function(),
+                cursor=cursor, page_size=page_size,
+            )
+            response_data.update({
+                'status': 'success',
+                'message': 'Search results retrieved successfully.',
+                'data': {
+                    'query': query,
+                    'results': results,
+                    'next_cursor': next_cursor,
+                },
+            })
+            return Response(response_data, status=status.HTTP_200_OK)
+        except Exception as e:
+            response_data = get_response_template()
+            response_data.update({
+                'status': 'error',
+                'message': gettext_lazy('Validation error occurred.'),
+                'error_code': 'VALIDATION_ERROR',
+                'details': str(e)
+            })
+            print(str(e))
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
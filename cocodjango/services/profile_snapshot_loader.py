@@ -0,0 +1,186 @@
+from collections import defaultdict
+from django.core.files.storage import default_storage
+from django.forms.models import model_to_dict
+from profile_app.models import (
+    UserDetails, EducationalBackground, Dissertation, ResearchExperience, Publication, WorkExperience,
+    TrainingWorkshop, AwardGrantScholarship, TestScore, VolunteerActivity, Visa, Citizenship, ResearchInterest
+)
+from profile_app.serializers import (
+    CitizenshipSerializer, VisaSerializer, EducationalBackgroundSerializer, DissertationSerializer,
+    ResearchExperienceSerializer, PublicationSerializer, WorkExperienceSerializer, TrainingWorkshopSerializer,
+    AwardGrantScholarshipSerializer, VolunteerActivitySerializer
+)
+from profile_app.test_score_serializer import TestScoreSerializer
+from common.models import UserDocument
+from funding_app.models import Funding
+from funding_app.serializers import FundingSerializer
+from services.records import FundingRecord, PublicationRecord, UserProfileRecord
+
+# (model, serializer, flat key prefix, relations the serializer reads), in the order get_flat_user_data adds them
+PROFILE_SECTIONS = [
+    (Citizenship, CitizenshipSerializer, 'citizenship_', ['state_province']),
+    (Visa, VisaSerializer, 'visa_', ['state_province']),
+    (EducationalBackground, EducationalBackgroundSerializer, 'academic_', []),
+    (Dissertation, DissertationSerializer, 'dissertation_', []),
+    (ResearchExperience, ResearchExperienceSerializer, 'research_experience_', []),
+    (Publication, PublicationSerializer, 'publication_', []),
+    (WorkExperience, WorkExperienceSerializer, 'work_experience_', []),
+    (TrainingWorkshop, TrainingWorkshopSerializer, 'training_workshop_', []),
+    (AwardGrantScholarship, AwardGrantScholarshipSerializer, 'award_grant_scholarship_', []),
+    (TestScore, TestScoreSerializer, 'test_score_', ['user_document__document']),
+    (VolunteerActivity, VolunteerActivitySerializer, 'volunteer_activity_', []),
+]
+
+# Relations FundingSerializer reads
+FUNDING_RELATED = (
+    'funding_for_faculty_member', 'funding_for_edu_org', 'funding_for_college', 'funding_for_dept',
+    'funding_doc', 'created_by', 'updated_by',
+)
+
+
+def flatten_data(data_list, prefix):
+    flat_data = {}
+    for i, item in enumerate(data_list):
+        for k, v in item.items():
+            flat_data[f"{prefix}{i}_{k}"] = v
+    return flat_data
+
+
+class ProfileSnapshotLoader:
+    """UserProfileRecords for many users, loaded chunk by chunk.
+
+    The records carry the same data as UserDataService/ResearcherDataService
+    get_flat_user_data() (record.as_flat_dict()), plus the names of the
+    user's department, college, campus and organization in details and the
+    publications and fundings as typed records and the research interest
+    topics. A chunk costs a fixed number of queries: the users with their
+    details and groups, one IN query per profile section, one for research
+    interests, one for resumes/SOPs and, with include_funding, one for
+    fundings. Only one chunk is held in memory at a time.
+
+    Users without UserDetails are skipped, they have nothing to embed.
+    """
+
+    def __init__(self, users, include_funding=False, chunk_size=200):
+        self.users = users
+        self.include_funding = include_funding
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        for chunk in self.iter_chunks():
+            yield from chunk
+
+    def iter_chunks(self):
+        last_id = 0
+        while True:
+            user_ids = list(
+                self.users.filter(id__gt=last_id).order_by('id').values_list('id', flat=True).distinct()[:self.chunk_size]
+            )
+            if not user_ids:
+                return
+            last_id = user_ids[-1]
+            yield self.load_chunk(user_ids)
+
+    def load_chunk(self, user_ids):
+        details_list = list(
+            UserDetails.objects.filter(user_id__in=user_ids)
+            .select_related('user', 'department', 'college', 'campus', 'organization')
+            .prefetch_related('custom_groups', 'user__groups')
+            .order_by('user_id')
+        )
+        details_ids = [details.id for details in details_list]
+
+        sections = []
+        publications = {}
+        for model, serializer_class, prefix, related in PROFILE_SECTIONS:
+            rows_by_details = defaultdict(list)
+            for row in model.objects.filter(user_details_id__in=details_ids).select_related(*related):
+                rows_by_details[row.user_details_id].append(row)
+            sections.append((serializer_class, prefix, rows_by_details))
+            if model is Publication:
+                publications = rows_by_details
+
+        research_interests = defaultdict(list)
+        interest_rows = (
+            ResearchInterest.objects.filter(user_details_id__in=details_ids)
+            .select_related('research_interests_option')
+            .order_by('id')
+        )
+        for interest in interest_rows:
+            research_interests[interest.user_details_id].append(interest.research_interests_option.topic)
+
+        documents = self.get_latest_documents(user_ids)
+        fundings = self.get_fundings(user_ids) if self.include_funding else {}
+
+        records = []
+        for details in details_list:
+            user = details.user
+            flat_data = {}
+            for serializer_class, prefix, rows_by_details in sections:
+                data = serializer_class(rows_by_details.get(details.id, []), many=True).data
+                flat_data.update(flatten_data(data, prefix))
+            funding_rows = []
+            if self.include_funding:
+                # Same rule as ResearcherDataService.get_funding_data
+                funding_rows = fundings.get(user.id, []) if details.department_id else []
+                flat_data.update(flatten_data(FundingSerializer(funding_rows, many=True).data, 'funding_'))
+
+            user_details = model_to_dict(details)
+            user_details.update({
+                'department_name': details.department.name if details.department else None,
+                'college_name': details.college.name if details.college else None,
+                'campus_name': details.campus.campus_name if details.campus else None,
+                'organization_name': details.organization.name if details.organization else None,
+            })
+            records.append(UserProfileRecord(
+                user_id=user.id,
+                username=user.username,
+                first_name=user.first_name,
+                last_name=user.last_name,
+                email=user.email,
+                date_joined=user.date_joined,
+                groups=[group.name for group in user.groups.all()],
+                details=user_details,
+                resume=documents.get((user.id, UserDocument.RESUME), []),
+                sop=documents.get((user.id, UserDocument.SOP), []),
+                sections=flat_data,
+                publications=[
+                    PublicationRecord(title=publication.title, abstract=publication.abstract)
+                    for publication in publications.get(details.id, [])
+                ],
+                fundings=[FundingRecord.from_funding(funding) for funding in funding_rows],
+                research_interests=research_interests.get(details.id, []),
+            ))
+        return records
+
+    def get_latest_documents(self, user_ids):
+        """{(user id, use): [document entry]} for each user's latest resume and SOP"""
+        latest = {}
+        user_documents = (
+            UserDocument.objects.filter(user_id__in=user_ids, use__in=[UserDocument.RESUME, UserDocument.SOP])
+            .select_related('document')
+            .order_by('created_at')
+        )
+        for user_document in user_documents:
+            latest[(user_document.user_id, user_document.use)] = user_document
+
+        documents = {}
+        for key, user_document in latest.items():
+            if user_document.document.file_name:
+                documents[key] = [{
+                    'document_id': user_document.document.id,
+                    'file_name': user_document.document.file_name,
+                    'url': default_storage.url(user_document.document.file_name_system),
+                }]
+        return documents
+
+    def get_fundings(self, user_ids):
+        fundings = defaultdict(list)
+        funding_rows = (
+            Funding.objects.filter(funding_for_faculty_member_id__in=user_ids)
+            .select_related(*FUNDING_RELATED)
+            .prefetch_related('benefits')
+        )
+        for funding in funding_rows:
+            fundings[funding.funding_for_faculty_member_id].append(funding)
+        return fundings
@@ -10,10 +10,24 @@ from campus_app.serializers import CampusSerializer
 from educational_organizations_app.serializers import EducationalOrganizationsSerializer
 from funding_app.serializers import FundingSerializer
 from funding_app.models import Funding
+from services.profile_snapshot_loader import FUNDING_RELATED
+from services.records import FundingRecord, ProgramRecord
+
+# Everything the program, department, college, campus and organization serializers read, in one join
+PROGRAM_RELATED = (
+    'department__state_province',
+    'department__college__state_province',
+    'department__college__campus__state_province',
+    'department__college__campus__educational_organization__under_category',
+    'department__college__campus__educational_organization__division',
+)
+
 
 class ProgramDataService:
-    def __init__(self, program_id):
-        self.program = self._get_program_by_id(program_id)
+    def __init__(self, program_id, program=None, funding_data=None):
+        """program and funding_data can be passed in when they were loaded in bulk"""
+        self.program = program if program is not None else self._get_program_by_id(program_id)
+        self.funding_data = funding_data
 
     def _get_program_by_id(self, program_id):
         try:
@@ -29,7 +43,6 @@ class ProgramDataService:
     def get_department_data(self):
         if not self.program or not self.program.department:
             return None
-        department = Department.objects.filter(id=self.program.department.id)[0]
         department_data = DepartmentSerializer(self.program.department).data
 
         # for i, department in enumerate(departments):
@@ -52,7 +65,8 @@ class ProgramDataService:
         """Fetch all fundings related to the department"""
         if not  self.program.department:
             return []
-        print(self.program.department)
+        if self.funding_data is not None:
+            return self.funding_data
         funding_data = Funding.objects.filter(funding_for_dept=self.program.department)
         return FundingSerializer(funding_data, many=True ).data
 
@@ -110,7 +124,6 @@ class ProgramDataService:
     def get_flat_program_data(self):
         """Flattened version of the full program data with dynamic prefixes"""
         full_data = self.get_full_program_data()
-        print("full data:", full_data)
         flat_data = {}
 
         # Flatten the program data with a unique prefix based on program ID
@@ -170,10 +183,86 @@ class ProgramDataService:
 
         return flat_data
 
+    @staticmethod
+    def get_program_snapshots(program_ids=None, chunk_size=200):
+        """Lazy flattened data of all (or the given) programs, see ProgramSnapshotLoader"""
+        programs = Program.objects.all()
+        if program_ids is not None:
+            programs = programs.filter(id__in=program_ids)
+        return ProgramSnapshotLoader(programs, chunk_size=chunk_size)
+
     @staticmethod
     def get_all_flat_programs_data():
         """Returns flattened data for all programs"""
-        return [
-            ProgramDataService(program.id).get_flat_program_data()
-            for program in Program.objects.all()
-        ]
+        return list(ProgramDataService.get_program_snapshots())
+
+
+class ProgramSnapshotLoader:
+    """Program data for many programs, loaded chunk by chunk.
+
+    A chunk of programs comes with its whole department/college/campus/
+    organization hierarchy and its parsed requirements from one joined query. Fundings are fetched once
+    per department, so programs sharing a department share them. Only one
+    chunk of programs is held in memory at a time.
+    """
+
+    def __init__(self, programs, chunk_size=200):
+        self.programs = programs
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        for _, flat_data in self.iter_programs():
+            yield flat_data
+
+    def iter_programs(self):
+        """(program, flattened data) pairs, fundings are serialized once per department"""
+        funding_data = {}
+        for program, fundings in self.iter_with_fundings():
+            if program.department_id not in funding_data:
+                funding_data[program.department_id] = FundingSerializer(fundings, many=True).data
+            service = ProgramDataService(
+                program.id, program=program, funding_data=funding_data[program.department_id]
+            )
+            yield program, service.get_flat_program_data()
+
+    def iter_records(self):
+        """(program, ProgramRecord) pairs, built from the models without serializers"""
+        funding_records = {}
+        for program, fundings in self.iter_with_fundings():
+            if program.department_id not in funding_records:
+                funding_records[program.department_id] = [FundingRecord.from_funding(funding) for funding in fundings]
+            yield program, ProgramRecord.from_program(program, funding_records[program.department_id])
+
+    def iter_with_fundings(self):
+        """(program, fundings of its department) pairs"""
+        fundings = {}
+        last_id = 0
+        while True:
+            chunk = list(
+                self.programs.filter(id__gt=last_id).order_by('id')
+                .select_related(*PROGRAM_RELATED, 'requirements')
+                .prefetch_related('required_documents')[:self.chunk_size]
+            )
+            if not chunk:
+                return
+            last_id = chunk[-1].id
+
+            new_department_ids = {program.department_id for program in chunk if program.department_id} - fundings.keys()
+            fundings.update(self.get_fundings(new_department_ids))
+
+            for program in chunk:
+                yield program, fundings.get(program.department_id, [])
+
+    def get_fundings(self, department_ids):
+        """{department id: fundings} with one query"""
+        if not department_ids:
+            return {}
+        fundings = {department_id: [] for department_id in department_ids}
+        funding_rows = (
+            Funding.objects.filter(funding_for_dept_id__in=department_ids)
+            .select_related(*FUNDING_RELATED)
+            .prefetch_related('benefits')
+        )
+        for funding in funding_rows:
+            fundings[funding.funding_for_dept_id].append(funding)
+        return fundings
@@ -0,0 +1,136 @@
+"""
+Typed records handed from the data services to the vector ingestion.
+
+The flat dicts of get_flat_*_data() key every value by position
+(funding_0_title_of_funding, publication_2_abstract, ...), so reading a
+field back means scanning all keys. These records hold exactly what the
+ingestion reads, as attributes, built straight from the loaded models.
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from django_countries import countries
+from program_app.models import ProgramRequirement
+
+
+@dataclass(slots=True)
+class FundingRecord:
+    funding_id: int
+    funding_for: str
+    funding_type: str
+    funding_opportunity_for: str
+    title_of_funding: str
+    description: str
+
+    @classmethod
+    def from_funding(cls, funding):
+        return cls(
+            funding_id=funding.id,
+            funding_for=funding.funding_for,
+            funding_type=funding.funding_type,
+            funding_opportunity_for=funding.funding_opportunity_for,
+            title_of_funding=funding.title_of_funding,
+            description=funding.description,
+        )
+
+
+@dataclass(slots=True)
+class PublicationRecord:
+    title: str
+    abstract: str
+
+
+@dataclass(slots=True)
+class ProgramRecord:
+    program_id: int
+    title: str
+    description: str
+    application_fee: float
+    application_end_date: date
+    department_id: int = None
+    department_name: str = None
+    college_id: int = None
+    college_name: str = None
+    campus_id: int = None
+    campus_name: str = None
+    organization_id: int = None
+    organization_name: str = None
+    # Location of the department, as the flat data reported it
+    country_code: str = None
+    country_name: str = None
+    state_province_name: str = None
+    city: str = None
+    # Minimum scores keyed like the vector metadata (IELTS, TOEFL, ...), "" where none is stated
+    requirements: dict = field(default_factory=dict)
+    fundings: list = field(default_factory=list)
+
+    @classmethod
+    def from_program(cls, program, fundings=()):
+        """Record for a program loaded with its department/college/campus/organization and requirements"""
+        department = program.department
+        college = department.college if department else None
+        campus = college.campus if college else None
+        organization = campus.educational_organization if campus else None
+        return cls(
+            program_id=program.id,
+            title=program.title,
+            description=program.description,
+            application_fee=float(program.application_fee),
+            application_end_date=program.application_end_date,
+            department_id=department.id if department else None,
+            department_name=department.name if department else None,
+            college_id=college.id if college else None,
+            college_name=college.name if college else None,
+            campus_id=campus.id if campus else None,
+            campus_name=campus.campus_name if campus else None,
+            organization_id=organization.id if organization else None,
+            organization_name=organization.name if organization else None,
+            country_code=department.country_code if department else None,
+            country_name=countries.name(department.country_code) if department and department.country_code else None,
+            state_province_name=department.state_province.name if department and department.state_province else None,
+            city=department.city if department else None,
+            requirements=ProgramRequirement.for_program(program).as_criteria(),
+            fundings=list(fundings),
+        )
+
+
+@dataclass(slots=True)
+class UserProfileRecord:
+    user_id: int
+    username: str
+    first_name: str
+    last_name: str
+    email: str
+    date_joined: datetime
+    groups: list
+    # model_to_dict(UserDetails) plus department_name, college_name, campus_name, organization_name
+    details: dict
+    resume: list
+    sop: list
+    # Flattened profile sections, e.g. academic_0_degree, as in get_flat_user_data()
+    sections: dict
+    publications: list = field(default_factory=list)
+    fundings: list = field(default_factory=list)
+    # Topics of the user's research interests
+    research_interests: list = field(default_factory=list)
+
+    def user_main(self):
+        return {
+            'user_id': self.user_id,
+            'username': self.username,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'email': self.email,
+            'date_joined': self.date_joined,
+            'groups': self.groups,
+        }
+
+    def as_flat_dict(self):
+        """The legacy get_flat_user_data() shape"""
+        flat_data = dict(self.sections)
+        flat_data.update({
+            'user_main': [self.user_main()],
+            'user_details': self.details,
+            'resume': self.resume,
+            'sop': self.sop,
+        })
+        return flat_data
@@ -12,6 +12,7 @@ from common.models import UserDocument
 from django.core.files.storage import default_storage
 from django.contrib.auth.models import User
 from django.contrib.auth.models import Group
+from services.profile_snapshot_loader import ProfileSnapshotLoader
 
 
 class UserDataService:
@@ -178,6 +179,7 @@ class UserDataService:
                 latest_resume = resume_query.latest('created_at')
                 if latest_resume.document.file_name:
                     response_data = {
+                        'document_id': latest_resume.document.id,
                         'file_name': latest_resume.document.file_name,
                         'url': default_storage.url(latest_resume.document.file_name_system)
                     }
@@ -195,6 +197,7 @@ class UserDataService:
                 latest_sop = sop_query.latest('created_at')
                 if latest_sop.document.file_name:
                     response_data = {
+                        'document_id': latest_sop.document.id,
                         'file_name': latest_sop.document.file_name,
                         'url': default_storage.url(latest_sop.document.file_name_system)  
                     }
@@ -319,21 +322,23 @@ class UserDataService:
         return flat_data
 
     @staticmethod
-    def get_all_flat_users_data(user_types=[], group_name=None):
+    def get_profile_snapshots(user_types=[], group_name=None, user_ids=None, chunk_size=200):
+        """Lazy UserProfileRecords of the matching users, see ProfileSnapshotLoader"""
         all_users = User.objects.all()
-       
+
+        if user_ids is not None:
+            all_users = all_users.filter(id__in=user_ids)
         if user_types:
             # Filter based on user_type if provided
             all_users = all_users.filter(userdetails__user_type__in=user_types)
         if group_name:
             all_users = all_users.filter(groups__name=group_name)
 
-        all_users_data = []
-        for user in all_users:
-            user_data_service = UserDataService(
-                user.id, user_types)  # Pass user_type
-            all_users_data.append(user_data_service.get_flat_user_data())
-        return all_users_data
+        return ProfileSnapshotLoader(all_users, chunk_size=chunk_size)
+
+    @staticmethod
+    def get_all_flat_users_data(user_types=[], group_name=None, user_ids=None):
+        return [record.as_flat_dict() for record in UserDataService.get_profile_snapshots(user_types, group_name, user_ids)]
 
 
 
@@ -10,6 +10,7 @@ from django.utils.translation import gettext_lazy as _
 # from profile_app.serializers import TestScoreSerializer
 from profile_app.models import UserDocument
 from .utils.text_data_extractionv2 import DataExtractor
+from common.document_text import get_document_text
 from common.common_imports import * 
 
 import environ
@@ -51,7 +52,8 @@ class ResumeProcessView(APIView):
         print(resume_file_path)
         data_extractor = DataExtractor()
         json_file_path = JSON_SCHEMA_PATH # Specify the path to your JSON schema file
-        extracted_data = data_extractor.extract_applicant_data(resume_file_path, json_file_path)
+        resume_text = get_document_text(user_document.document).text
+        extracted_data = data_extractor.extract_applicant_data(resume_file_path, json_file_path, text=resume_text)
 
         # Map extracted data to the database
         # self.map_extracted_data_to_db(extracted_data, user)